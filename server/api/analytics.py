@@ -0,0 +1,226 @@
+# server/api/analytics.py
+"""
+Account analytics: inflow, outflow, spend and balances by day or month.
+
+Served from the DailyBalance and MonthlyBalance rollups that api.rollups
+keeps current as money moves, so a response reads one summary row per
+active bucket and the last one before the range, never the ledger.
+`manage.py rebuild_summaries` recomputes both tables from the ledger with
+rebuild() below.
+"""
+from datetime import date, timedelta
+from fractions import Fraction
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round, TruncDate
+from django.utils import timezone
+
+from . import money, replicas, rollups, sharding
+from .models import Account, DailyBalance, MonthlyBalance, Transaction
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAX_MONTHS = 120
+MAX_DAYS = 366
+LEDGER_BATCH_SIZE = 20000
+
+
+def month_starts(since, until):
+    """The first day of every month from since's to until's"""
+    first = since.replace(day=1)
+    while first <= until:
+        yield first
+        first = (first + timedelta(days=31)).replace(day=1)
+
+
+def _average(row, today):
+    """Average end-of-day balance of a month row in minor units, up to today in the current month"""
+    length = rollups.days_in_month(row.month)
+    if (row.month.year, row.month.month) != (today.year, today.month):
+        total, days = row.balance_days, length
+    else:
+        # balance_days counts the closing balance through the end of the month
+        total, days = row.balance_days - row.closing_balance * (length - today.day), today.day
+    return round(Fraction(total) * money.MINOR_UNITS / days)
+
+
+def months(account_id, since, until):
+    """
+    Month buckets from since's month to until's, as the API returns them.
+    Months without postings carry the balance over.
+    """
+    db = replicas.for_read(sharding.locate(account_id))
+    summaries = MonthlyBalance.objects.using(db).filter(account_id=account_id)
+    balance = (
+        summaries.filter(month__lt=since.replace(day=1)).order_by('-month')
+        .values_list('closing_balance', flat=True).first()
+    )
+    balance = money.to_minor(balance) if balance is not None else 0
+    rows = {row.month: row for row in summaries.filter(month__range=(since.replace(day=1), until))}
+    today = timezone.localdate()
+
+    buckets = []
+    for first in month_starts(since, until):
+        row = rows.get(first)
+        if row is None:
+            inflow = outflow = spend = count = 0
+            opening = closing = average = balance
+        else:
+            inflow, outflow, spend = money.to_minor(row.credits), money.to_minor(row.debits), money.to_minor(row.spend)
+            opening, closing = money.to_minor(row.opening_balance), money.to_minor(row.closing_balance)
+            count, average = row.entry_count, _average(row, today)
+        balance = closing
+        buckets.append({
+            'period': f'{first:%Y-%m}',
+            'inflow': money.to_string(inflow),
+            'outflow': money.to_string(outflow),
+            'spend': money.to_string(spend),
+            'net': money.to_string(inflow - outflow),
+            'entry_count': count,
+            'opening_balance': money.to_string(opening),
+            'closing_balance': money.to_string(closing),
+            'average_balance': money.to_string(average),
+        })
+    return buckets
+
+
+def days(account_id, since, until):
+    """Day buckets from since to until, as the API returns them"""
+    db = replicas.for_read(sharding.locate(account_id))
+    summaries = DailyBalance.objects.using(db).filter(account_id=account_id)
+    balance = summaries.filter(date__lt=since).order_by('-date').values_list('closing_balance', flat=True).first()
+    balance = money.to_minor(balance) if balance is not None else 0
+    rows = {row.date: row for row in summaries.filter(date__range=(since, until))}
+
+    buckets = []
+    day = since
+    while day <= until:
+        row = rows.get(day)
+        opening = balance
+        if row is None:
+            inflow = outflow = count = 0
+        else:
+            inflow, outflow, count = money.to_minor(row.credits), money.to_minor(row.debits), row.entry_count
+            balance = money.to_minor(row.closing_balance)
+        buckets.append({
+            'period': day.isoformat(),
+            'inflow': money.to_string(inflow),
+            'outflow': money.to_string(outflow),
+            'net': money.to_string(inflow - outflow),
+            'entry_count': count,
+            'opening_balance': money.to_string(opening),
+            'closing_balance': money.to_string(balance),
+        })
+        day += timedelta(days=1)
+    return buckets
+
+
+def _runs(*keys):
+    """Where each run of equal keys starts in arrays sorted by them"""
+    change = numpy.zeros(len(keys[0]), dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return numpy.flatnonzero(change)
+
+
+def _load(account_ids, using):
+    """
+    The accounts' ledger rows in posting order as NumPy arrays: account
+    position in account_ids, day, amount and balance after in minor units,
+    and whether each is spend. Read in batches, so only the arrays and one
+    batch of rows are in memory.
+    """
+    rows = (
+        Transaction.objects.using(using).filter(account_id__in=account_ids)
+        .order_by('account_id', 'created_at', 'id')
+        .annotate(
+            day=TruncDate('created_at'),
+            cents=Cast(Round(F('amount') * 100), BigIntegerField()),
+            balance_cents=Cast(Round(F('balance_after') * 100), BigIntegerField()),
+        )
+        .values_list('account_id', 'day', 'cents', 'balance_cents', 'transaction_type')
+        .iterator(chunk_size=LEDGER_BATCH_SIZE)
+    )
+    index = {account_id: i for i, account_id in enumerate(account_ids)}
+    epoch = date(1970, 1, 1).toordinal()
+    columns = [[], [], [], [], []]
+    while batch := list(islice(rows, LEDGER_BATCH_SIZE)):
+        size = len(batch)
+        columns[0].append(numpy.fromiter((index[row[0]] for row in batch), numpy.int64, size))
+        columns[1].append(numpy.fromiter((row[1].toordinal() - epoch for row in batch), numpy.int64, size))
+        columns[2].append(numpy.fromiter((row[2] for row in batch), numpy.int64, size))
+        columns[3].append(numpy.fromiter((row[3] for row in batch), numpy.int64, size))
+        columns[4].append(numpy.fromiter((row[4] in rollups.SPEND_TYPES for row in batch), bool, size))
+    if not columns[0]:
+        return None
+    account, day, amount, balance, spend = (numpy.concatenate(column) for column in columns)
+    return account, day.astype('datetime64[D]'), amount, balance, spend
+
+
+def rebuild(account_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute all daily and monthly rollups of some accounts on one
+    database from their ledgers and return (days, months) written.
+
+    The ledger is loaded into NumPy arrays sorted by account and posting
+    order, and each bucket is a run of equal (account, day) or (account,
+    month) keys in them; totals are np.add.reduceat() over the runs and
+    closing balances the balance after each run's last row. Postings to
+    the accounts wait until their rollups are replaced.
+    """
+    with transaction.atomic(using=using):
+        # Postings lock the account row, so none can slip in between
+        # reading the ledger and writing the rollups
+        list(Account.objects.using(using).select_for_update().filter(pk__in=account_ids).values_list('pk'))
+        loaded = _load(account_ids, using)
+        daily, monthly = [], []
+        if loaded is not None:
+            account, day, amount, balance, spend = loaded
+            size = len(amount)
+            credits = numpy.where(amount > 0, amount, 0)
+            debits = numpy.where(amount < 0, -amount, 0)
+
+            starts = _runs(account, day)
+            ends = numpy.append(starts[1:], size) - 1
+            for a, d, c, e, n, closing in zip(
+                account[starts].tolist(), day[starts].astype(object),
+                numpy.add.reduceat(credits, starts).tolist(), numpy.add.reduceat(debits, starts).tolist(),
+                numpy.diff(numpy.append(starts, size)).tolist(), balance[ends].tolist(),
+            ):
+                daily.append(DailyBalance(
+                    account_id=account_ids[a], date=d, credits=money.to_decimal(c), debits=money.to_decimal(e),
+                    entry_count=n, closing_balance=money.to_decimal(closing),
+                ))
+
+            month = day.astype('datetime64[M]')
+            first = month.astype('datetime64[D]')
+            length = ((month + 1).astype('datetime64[D]') - first).astype(numpy.int64)
+            # Days from each posting to the end of its month, both included
+            left = length - (day - first).astype(numpy.int64)
+            starts = _runs(account, month)
+            ends = numpy.append(starts[1:], size) - 1
+            opening = balance[starts] - amount[starts]
+            for a, m, c, e, s, n, o, closing, weighted in zip(
+                account[starts].tolist(), first[starts].astype(object),
+                numpy.add.reduceat(credits, starts).tolist(), numpy.add.reduceat(debits, starts).tolist(),
+                numpy.add.reduceat(numpy.where(spend, debits, 0), starts).tolist(),
+                numpy.diff(numpy.append(starts, size)).tolist(), opening.tolist(), balance[ends].tolist(),
+                (opening * length[starts] + numpy.add.reduceat(amount * left, starts)).tolist(),
+            ):
+                monthly.append(MonthlyBalance(
+                    account_id=account_ids[a], month=m, credits=money.to_decimal(c), debits=money.to_decimal(e),
+                    spend=money.to_decimal(s), entry_count=n, opening_balance=money.to_decimal(o),
+                    closing_balance=money.to_decimal(closing), balance_days=money.to_decimal(weighted),
+                ))
+
+        DailyBalance.objects.using(using).filter(account_id__in=account_ids).delete()
+        MonthlyBalance.objects.using(using).filter(account_id__in=account_ids).delete()
+        DailyBalance.objects.using(using).bulk_create(daily, batch_size=500)
+        MonthlyBalance.objects.using(using).bulk_create(monthly, batch_size=500)
+    return len(daily), len(monthly)
@@ -0,0 +1,197 @@
+# server/api/async_views.py
+"""
+Async-native versions of the read-heavy and long-lived endpoints.
+
+Served when ASYNC_VIEWS is enabled and the project runs under an ASGI server
+(see server/asgi.py). They use the async ORM and cache APIs end to end, so a
+request never takes a thread from the sync pool.
+"""
+import functools
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.settings import api_settings
+
+from . import events, money, replicas, sharding, snapshots
+from .authentication import ClaimsJWTAuthentication
+from .models import Account
+from .pagination import InvalidCursor, akeyset_page
+from .fast_serializers import user_payload
+from .serializers import TransactionSerializer
+from .views import HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+
+authenticator = ClaimsJWTAuthentication()
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    content = api_settings.DEFAULT_RENDERER_CLASSES[0]().render(data)
+    return HttpResponse(content, status=status, content_type='application/json')
+
+
+def _unauthorized(request, detail):
+    response = json_response(
+        detail if isinstance(detail, dict) else {'detail': detail},
+        status=status.HTTP_401_UNAUTHORIZED
+    )
+    response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+    return response
+
+
+def _throttled(request):
+    """
+    Run the default throttles as DRF's check_throttles() does and return
+    its 429 response, or None to let the request through. The bucket
+    stores are in memory or a cache, so they are called directly.
+    """
+    waits = []
+    for throttle in (throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES):
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait())
+    if not waits:
+        return None
+    exc = Throttled(max((wait for wait in waits if wait is not None), default=None))
+    response = json_response({'detail': exc.detail}, status=exc.status_code)
+    if exc.wait is not None:
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def async_api_view(methods, authenticated=True):
+    """
+    Minimal async stand-in for @api_view/@permission_classes.
+
+    Rejects other methods with 405 and, for authenticated views, resolves
+    request.user from the bearer token or answers 401 the way DRF does.
+    Then the default throttles run, answering 429 with Retry-After.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = json_response(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+                response['Allow'] = ', '.join(methods)
+                return response
+            if authenticated:
+                try:
+                    result = await authenticator.aauthenticate(request)
+                except AuthenticationFailed as e:
+                    return _unauthorized(request, e.detail)
+                if result is None:
+                    return _unauthorized(request, 'Authentication credentials were not provided.')
+                request.user, request.auth = result
+            else:
+                # As DRF sees it; loading the session user would need a thread
+                request.user = AnonymousUser()
+            response = _throttled(request)
+            if response is not None:
+                return response
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def _account_id(request):
+    account_id = getattr(request.user, 'account_id', None)
+    if account_id is None:
+        account_id = await snapshots.aget_account_id(request.user.pk)
+    return account_id
+
+
+@async_api_view(['GET'], authenticated=False)
+async def health_check(request):
+    """Simple health check endpoint"""
+    return json_response({
+        'status': 'healthy',
+        'message': 'NeoBank API is running'
+    })
+
+
+@async_api_view(['GET'])
+@replicas.replica_reads
+async def get_user_profile(request):
+    """Get current user's profile"""
+    user = await request.user.aget_user()
+    return json_response(user_payload(user))
+
+
+@async_api_view(['GET'])
+@replicas.replica_reads
+async def get_user_account(request):
+    """Get current user's bank account details"""
+    try:
+        payload = await snapshots.aget(await _account_id(request))
+    except Account.DoesNotExist:
+        return json_response(
+            {'error': 'Account not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return HttpResponse(payload, content_type='application/json')
+
+
+@async_api_view(['GET'])
+@replicas.replica_reads
+async def get_transaction_history(request):
+    """Get one page of the user's transaction history, newest first"""
+    try:
+        account_id = await _account_id(request)
+    except Account.DoesNotExist:
+        return json_response(
+            {'error': 'Account not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        limit = min(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return json_response(
+            {'error': 'Invalid limit'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        transactions, next_cursor = await akeyset_page(
+            await sharding.atransactions(account_id),
+            cursor=request.GET.get('cursor'),
+            limit=limit
+        )
+    except InvalidCursor:
+        return json_response(
+            {'error': 'Invalid cursor'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return json_response({
+        'transactions': TransactionSerializer(transactions, many=True).data,
+        'next_cursor': next_cursor
+    })
+
+
+@async_api_view(['GET'])
+async def balance_events(request):
+    """Stream the user's balance changes as server-sent events"""
+    try:
+        account_id = await _account_id(request)
+    except Account.DoesNotExist:
+        return json_response(
+            {'error': 'Account not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Subscribe before reading the balance so no change can slip between
+    subscription = events.get_broker().subscribe(events.balance_channel(account_id))
+    db = await sharding.alocate(account_id)
+    balance = await Account.objects.using(db).values_list('balance', flat=True).aget(pk=account_id)
+    response = StreamingHttpResponse(
+        events.astream(subscription, {'account_id': str(account_id), 'balance': money.to_string(balance)}),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,9 +1,29 @@
 # server/api/authentication.py
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.cache import caches
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import sharding
+from .checks import is_process_local
+from .hashers import get_hash_pool
+from .models import Account
+from .tokens import FastRefreshToken
 
 User = get_user_model()
 
+
+def _revocation_cache():
+    return getattr(settings, 'REVOKED_USERS_CACHE', 'default')
+
+
 class EmailBackend(ModelBackend):
     """
     Custom authentication backend that allows users to log in using their email
@@ -17,18 +37,32 @@ class EmailBackend(ModelBackend):
         # Both username (email) and password are required
         if username is None or password is None:
             return None
+        
+        # Hashing runs on a bounded pool so login bursts can't starve
+        # other requests of CPU
+        pool = get_hash_pool()
             
         try:
-            # Try to find user by email
-            user = User.objects.get(email=username)
+            # Try to find user by email, with the account needed for token
+            # claims unless it is on a shard, where it can't be joined
+            users = User.objects if sharding.is_sharded() else User.objects.select_related('account')
+            user = users.get(email=username)
         except User.DoesNotExist:
             # Run the default password hasher once to reduce the timing
             # difference between an existing and a nonexistent user (#20760)
-            User().set_password(password)
+            pool.run(make_password, password)
             return None
         
         # Check if password is correct and user can authenticate
-        if user.check_password(password) and self.user_can_authenticate(user):
+        is_correct, must_update = pool.run(verify_password, password, user.password)
+        if not is_correct:
+            return None
+        if must_update:
+            # Upgrade hashes made under an older policy (e.g. PBKDF2) now
+            # that we have the raw password
+            user.password = pool.run(make_password, password)
+            user.save(update_fields=['password'])
+        if self.user_can_authenticate(user):
             return user
         return None
 
@@ -36,4 +70,156 @@ class EmailBackend(ModelBackend):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+
+def tokens_for_user(user):
+    """
+    Issue a refresh/access pair for a user.
+
+    The account id and number are embedded at issue time so authenticated
+    requests can reach the account without a user or account query.
+    """
+    refresh = FastRefreshToken.for_user(user)
+    try:
+        account = user.account
+    except Account.DoesNotExist:
+        account = None
+    if account is not None:
+        refresh['account_id'] = str(account.pk)
+        refresh['account_number'] = account.account_number
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+def _revoked_key(user_id):
+    return f'revoked-user:{user_id}'
+
+
+def revoke_user(user_id):
+    revoke_users([user_id])
+
+
+def revoke_users(user_ids):
+    """
+    Reject every outstanding access token of some users.
+
+    Entries only need to outlive the access tokens issued before the
+    revocation, so they expire with ACCESS_TOKEN_LIFETIME.
+    """
+    ttl = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    caches[_revocation_cache()].set_many({_revoked_key(user_id): True for user_id in user_ids}, ttl)
+
+
+def restore_users(user_ids):
+    """Let reactivated users' tokens authenticate again"""
+    caches[_revocation_cache()].delete_many([_revoked_key(user_id) for user_id in user_ids])
+
+
+def is_revoked(user_id):
+    """
+    Whether a user's access tokens are rejected. A revocation in a
+    process-local cache would not reach the other workers, so with one the
+    user row is checked instead.
+    """
+    alias = _revocation_cache()
+    if is_process_local(alias):
+        return not User.objects.filter(pk=user_id, is_active=True).exists()
+    return caches[alias].get(_revoked_key(user_id), False)
+
+
+async def ais_revoked(user_id):
+    alias = _revocation_cache()
+    if is_process_local(alias):
+        return not await User.objects.filter(pk=user_id, is_active=True).aexists()
+    return await caches[alias].aget(_revoked_key(user_id), False)
+
+
+class ClaimsUser:
+    """
+    Lightweight authenticated user built from access token claims.
+
+    Identity and account ids come straight from the token; any other
+    attribute loads the real User row on first access, so views only pay
+    for a query when they need mutable fields.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = uuid.UUID(str(token[api_settings.USER_ID_CLAIM]))
+        account_id = token.get('account_id')
+        self.account_id = uuid.UUID(account_id) if account_id else None
+        self.account_number = token.get('account_number')
+        self._user = None
+
+    def get_user(self):
+        """Return the full User instance, loading it once"""
+        if self._user is None:
+            self._user = User.objects.get(pk=self.pk)
+        return self._user
+
+    async def aget_user(self):
+        """Async version of get_user(), for async views"""
+        if self._user is None:
+            self._user = await User.objects.aget(pk=self.pk)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __eq__(self, other):
+        return getattr(other, 'pk', None) == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return f"ClaimsUser {self.pk}"
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the token claims instead of loading the
+    user on every request. Deactivated users are rejected through the
+    revocation cache rather than an is_active lookup, as long as that cache
+    is shared by all workers; see is_revoked().
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if is_revoked(user_id):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return ClaimsUser(validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate() for plain Django async views.
+
+        Token validation is pure CPU work and the revocation check goes
+        through the cache's async API, so nothing here needs a thread.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        if await ais_revoked(user_id):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return ClaimsUser(validated_token), validated_token
@@ -0,0 +1,226 @@
+# server/api/batching.py
+"""
+Group commit for deposits and withdrawals.
+
+When LEDGER_BATCHING is enabled, postings made outside a transaction are
+queued to one writer thread per process instead of each committing on its
+own. The writer waits up to WINDOW seconds or for MAX_BATCH postings, then
+applies the whole batch in a single transaction per account shard: one
+locking read of the accounts, one UPDATE of their balances and one bulk
+INSERT of the ledger rows. Each request blocks on a future until its batch has committed.
+"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import BigIntegerField, Case, Value, When
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import ledger, money, rollups, sharding
+from .models import Account, Transaction
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Seconds the writer waits for more postings after the first arrives
+    'WINDOW': 0.005,
+    'MAX_BATCH': 100,
+    # Seconds a request waits for its batch to start before answering 503.
+    # A posting still queued then is dropped; one already being applied is
+    # waited for, so a 503 always means nothing was posted
+    'TIMEOUT': 10,
+}
+
+
+class BatchTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The posting did not complete in time, try again later.'
+    default_code = 'batch_timeout'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LEDGER_BATCHING', {})}
+
+
+class GroupCommitter:
+    def __init__(self, window=DEFAULTS['WINDOW'], max_batch=DEFAULTS['MAX_BATCH']):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='ledger-group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, account_id, amount, transaction_type):
+        """Queue a signed posting and return a future for its ledger entry"""
+        future = Future()
+        with self._condition:
+            self._pending.append((account_id, amount, transaction_type, future))
+            self._condition.notify()
+        return future
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._stopped:
+                self._condition.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    return
+                # Postings whose request timed out while queued are dropped
+                batch = [posting for posting in batch if posting[3].set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                try:
+                    outcomes = apply_batch([posting[:3] for posting in batch])
+                except Exception as e:
+                    # The transaction rolled back; start over on fresh connections
+                    connections.close_all()
+                    outcomes = [e] * len(batch)
+                for (*_, future), outcome in zip(batch, outcomes):
+                    if isinstance(outcome, Exception):
+                        future.set_exception(outcome)
+                    else:
+                        future.set_result(outcome)
+        finally:
+            connections.close_all()
+
+
+def apply_batch(postings):
+    """
+    Apply (account_id, signed minor units, type) postings in arrival order,
+    in one transaction per shard. Returns the ledger entry, or the
+    exception, for each.
+    """
+    outcomes = [None] * len(postings)
+    grouped = sharding.group({account_id for account_id, _, _ in postings})
+    shard_of = {account_id: db for db, account_ids in grouped.items() for account_id in account_ids}
+    by_shard = {}
+    for index, posting in enumerate(postings):
+        by_shard.setdefault(shard_of[posting[0]], []).append((index, posting))
+    for db, indexed in by_shard.items():
+        try:
+            results = _apply(db, [posting for _, posting in indexed])
+        except Exception as e:
+            # Only this shard's transaction rolled back; the others committed
+            connections[db].close()
+            results = [e] * len(indexed)
+        for (index, posting), outcome in zip(indexed, results):
+            if isinstance(outcome, Account.DoesNotExist):
+                # As ledger._post() does, follow an account rebalance_shards moved
+                try:
+                    outcome = ledger.post_moved(db, *posting)
+                except Exception as e:
+                    outcome = e
+            outcomes[index] = outcome
+    return outcomes
+
+
+def _apply(db, postings):
+    outcomes = [None] * len(postings)
+    with transaction.atomic(using=db):
+        rows = (
+            Account.objects.using(db).select_for_update()
+            .filter(pk__in={account_id for account_id, _, _ in postings})
+            .order_by('pk')
+            .values_list('id', 'balance', 'frozen')
+        )
+        balances, frozen = {}, set()
+        for account_id, balance, is_frozen in rows:
+            balances[account_id] = balance
+            if is_frozen:
+                frozen.add(account_id)
+        entries = []
+        for index, (account_id, amount, transaction_type) in enumerate(postings):
+            if account_id not in balances:
+                outcomes[index] = Account.DoesNotExist()
+                continue
+            if account_id in frozen:
+                outcomes[index] = ledger.AccountFrozen()
+                continue
+            if balances[account_id] + amount < 0:
+                outcomes[index] = ledger.InsufficientFunds()
+                continue
+            balances[account_id] += amount
+            entry = Transaction(
+                account_id=account_id,
+                transaction_type=transaction_type,
+                amount=money.to_decimal(amount),
+                balance_after=money.to_decimal(balances[account_id]),
+            )
+            entries.append(entry)
+            outcomes[index] = entry
+
+        if entries:
+            touched = {entry.account_id for entry in entries}
+            Account.objects.using(db).filter(pk__in=touched).update(balance=Case(
+                *[When(pk=pk, then=Value(balances[pk])) for pk in touched],
+                output_field=BigIntegerField(),
+            ))
+            Transaction.objects.using(db).bulk_create(entries)
+            rollups.record(entries)
+            latest = {entry.account_id: entry for entry in entries}
+            for entry in latest.values():
+                transaction.on_commit(partial(ledger.after_commit, entry), using=db)
+    return outcomes
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Return this process's committer, starting it on first use"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                config = get_config()
+                _batcher = GroupCommitter(config['WINDOW'], config['MAX_BATCH'])
+    return _batcher
+
+
+def reset():
+    """Stop the committer so the next posting starts one with the current settings"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is not None:
+            _batcher.stop()
+            _batcher = None
+
+
+def post(account_id, amount, transaction_type):
+    """Post through the committer and wait for the ledger entry; raises BatchTimeout"""
+    future = get_batcher().submit(account_id, amount, transaction_type)
+    try:
+        return future.result(get_config()['TIMEOUT'])
+    except TimeoutError:
+        if future.cancel():
+            raise BatchTimeout()
+        # The writer has taken it up and it may commit; answering 503 would
+        # invite a retry that posts it again
+        return future.result()
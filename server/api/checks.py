@@ -0,0 +1,36 @@
+# server/api/checks.py
+"""
+Caches that state written by one worker process must reach the others
+through. A process-local alias still works with several workers, but
+degrades: revocations are checked against the database instead, and
+account snapshots are only kept for a second.
+`manage.py check --deploy` warns about it.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(alias):
+    """Whether a cache alias keeps its entries in one process, or nowhere"""
+    return isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    warnings = []
+    shared = [
+        ('REVOKED_USERS_CACHE', 'every authenticated request checks is_active in the database', 'api.W001'),
+        ('ACCOUNT_SNAPSHOT_CACHE', 'account snapshots are kept for a second at most', 'api.W002'),
+    ]
+    for setting, consequence, id in shared:
+        alias = getattr(settings, setting, 'default')
+        if is_process_local(alias):
+            warnings.append(checks.Warning(
+                f"{setting} points at the process-local cache {alias!r}, so {consequence}.",
+                hint='Point it at a cache shared by all workers, such as Redis.',
+                id=id,
+            ))
+    return warnings
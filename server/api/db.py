@@ -0,0 +1,17 @@
+# server/api/db.py
+from django.conf import settings
+
+# Pragmas that do not apply to in-memory databases
+FILE_ONLY_PRAGMAS = {'journal_mode', 'mmap_size'}
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS to new connections"""
+    if connection.vendor != 'sqlite':
+        return
+    in_memory = connection.is_in_memory_db()
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        if in_memory and name in FILE_ONLY_PRAGMAS:
+            continue
+        # Straight on the DB-API connection, so no execute wrappers run
+        connection.connection.execute(f'PRAGMA {name} = {value}')
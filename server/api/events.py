@@ -0,0 +1,235 @@
+# server/api/events.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'api.events.LocalBroker',
+    'OPTIONS': {},
+    # Events kept per subscriber; a slow client only misses stale balances
+    'SUBSCRIBER_BUFFER': 32,
+    'KEEPALIVE_INTERVAL': 15,
+    # Streams end after this many seconds and the client reconnects
+    'STREAM_TIMEOUT': 300,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'BALANCE_EVENTS', {})}
+
+
+def balance_channel(account_id):
+    return f'balance:{account_id}'
+
+
+class Subscription:
+    """
+    Buffer of events for one listener.
+
+    Brokers push from any thread; the listener waits either synchronously
+    or on the event loop it subscribed from.
+    """
+
+    def __init__(self, broker, channel, size):
+        self.broker = broker
+        self.channel = channel
+        self._events = deque(maxlen=size)
+        self._condition = threading.Condition()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        except RuntimeError:
+            self._loop = self._wakeup = None
+
+    def push(self, event):
+        with self._condition:
+            self._events.append(event)
+            self._condition.notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop(self):
+        with self._condition:
+            return self._events.popleft() if self._events else None
+
+    def get(self, timeout):
+        """Return the next event, or None after timeout seconds"""
+        with self._condition:
+            if not self._events:
+                self._condition.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+    async def aget(self, timeout):
+        """Async version of get(), for subscriptions made on an event loop"""
+        # Clear before checking so a push racing with us still wakes us up
+        self._wakeup.clear()
+        event = self._pop()
+        if event is not None:
+            return event
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._pop()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process publish/subscribe; events reach subscribers in this process only"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, get_config()['SUBSCRIBER_BUFFER'])
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+
+class UnixSocketBroker(LocalBroker):
+    """
+    Fans events out to every worker process on this host.
+
+    Each process binds a datagram socket in a shared directory and publishes
+    by sending to all sockets found there. Good enough as a local stand-in
+    for a real message broker in development and tests, not across hosts.
+    """
+
+    def __init__(self, path='/tmp/webbank-events'):
+        super().__init__()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.address = os.path.join(path, f'{os.getpid()}-{time.monotonic_ns()}.sock')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.address)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        threading.Thread(target=self._listen, name='balance-events', daemon=True).start()
+
+    def publish(self, channel, event):
+        message = json.dumps({'channel': channel, 'event': event}).encode()
+        for name in os.listdir(self.path):
+            peer = os.path.join(self.path, name)
+            try:
+                self._sender.sendto(message, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The process that owned this socket has exited
+                try:
+                    os.unlink(peer)
+                except FileNotFoundError:
+                    pass
+            except OSError:
+                logger.warning('Could not deliver balance event to %s', peer, exc_info=True)
+
+    def _listen(self):
+        while True:
+            data = self._socket.recv(65536)
+            try:
+                message = json.loads(data)
+                self.deliver(message['channel'], message['event'])
+            except (ValueError, KeyError):
+                logger.warning('Discarding malformed balance event')
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = get_config()
+                _broker = import_string(config['BACKEND'])(**config['OPTIONS'])
+    return _broker
+
+
+def publish_balance(account_id, balance, entry=None):
+    """Announce an account's new balance to its listeners"""
+    event = {'account_id': str(account_id), 'balance': str(balance)}
+    if entry is not None:
+        event.update({
+            'transaction_id': entry.pk,
+            'transaction_type': entry.transaction_type,
+            'amount': str(entry.amount),
+            'created_at': entry.created_at.isoformat(),
+        })
+    get_broker().publish(balance_channel(account_id), event)
+
+
+def format_sse(event, name='balance'):
+    lines = [f'event: {name}']
+    if 'transaction_id' in event:
+        lines.append(f"id: {event['transaction_id']}")
+    lines.append(f'data: {json.dumps(event)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+KEEPALIVE = ': keepalive\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate text/event-stream; only error bodies pass through it"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+def stream(subscription, initial):
+    """Yield SSE frames for a WSGI response until STREAM_TIMEOUT"""
+    config = get_config()
+    deadline = time.monotonic() + config['STREAM_TIMEOUT']
+    try:
+        yield 'retry: 3000\n\n' + format_sse(initial)
+        while time.monotonic() < deadline:
+            event = subscription.get(config['KEEPALIVE_INTERVAL'])
+            yield format_sse(event) if event is not None else KEEPALIVE
+    finally:
+        subscription.close()
+
+
+async def astream(subscription, initial):
+    """Async version of stream(), holding no thread while idle"""
+    config = get_config()
+    deadline = time.monotonic() + config['STREAM_TIMEOUT']
+    try:
+        yield 'retry: 3000\n\n' + format_sse(initial)
+        while time.monotonic() < deadline:
+            event = await subscription.aget(config['KEEPALIVE_INTERVAL'])
+            yield format_sse(event) if event is not None else KEEPALIVE
+    finally:
+        subscription.close()
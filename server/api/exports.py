@@ -0,0 +1,49 @@
+# server/api/exports.py
+import csv
+import json
+
+EXPORT_FIELDS = ['id', 'entry_id', 'transaction_type', 'amount', 'balance_after', 'created_at']
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def _rows(queryset):
+    # A server-side iterator keeps memory flat however long the history is
+    return (
+        queryset.order_by('created_at', 'entry_id')
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def stream_csv(queryset):
+    """Yield the ledger rows of a queryset as CSV lines"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for pk, entry_id, transaction_type, amount, balance_after, created_at in _rows(queryset):
+        yield writer.writerow([pk, entry_id, transaction_type, amount, balance_after, created_at.isoformat()])
+
+
+def stream_ndjson(queryset):
+    """Yield the ledger rows of a queryset as newline-delimited JSON"""
+    for pk, entry_id, transaction_type, amount, balance_after, created_at in _rows(queryset):
+        yield json.dumps({
+            'id': pk,
+            'entry_id': str(entry_id),
+            'transaction_type': transaction_type,
+            'amount': str(amount),
+            'balance_after': str(balance_after),
+            'created_at': created_at.isoformat(),
+        }) + '\n'
+
+
+FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
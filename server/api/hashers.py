@@ -0,0 +1,84 @@
+# server/api/hashers.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+from rest_framework.exceptions import Throttled
+
+DEFAULT_POLICY = {
+    # OWASP baseline for Argon2id: 19 MiB, 2 passes, 1 lane
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 19456,
+    'ARGON2_PARALLELISM': 1,
+    # 2**15 * 8 * 128 bytes = 32 MiB per hash, single lane
+    'SCRYPT_WORK_FACTOR': 2 ** 15,
+    'SCRYPT_BLOCK_SIZE': 8,
+    'SCRYPT_PARALLELISM': 1,
+    # Threads that may hash at once, and logins allowed to queue behind them
+    'WORKERS': 2,
+    'BACKLOG': 16,
+}
+
+
+def get_policy():
+    return {**DEFAULT_POLICY, **getattr(settings, 'PASSWORD_HASH_POLICY', {})}
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2 with cost parameters taken from PASSWORD_HASH_POLICY"""
+
+    def __init__(self):
+        policy = get_policy()
+        self.time_cost = policy['ARGON2_TIME_COST']
+        self.memory_cost = policy['ARGON2_MEMORY_COST']
+        self.parallelism = policy['ARGON2_PARALLELISM']
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """Scrypt with cost parameters taken from PASSWORD_HASH_POLICY"""
+
+    def __init__(self):
+        policy = get_policy()
+        self.work_factor = policy['SCRYPT_WORK_FACTOR']
+        self.block_size = policy['SCRYPT_BLOCK_SIZE']
+        self.parallelism = policy['SCRYPT_PARALLELISM']
+        # Leave headroom over the 128 * n * r bytes scrypt needs
+        self.maxmem = 256 * self.work_factor * self.block_size
+
+
+class HashPool:
+    """
+    Bounded thread pool for password hashing.
+
+    The hash functions release the GIL, so capping the threads that may hash
+    at once keeps a burst of logins from taking every core away from the
+    other requests on the same worker. Work beyond the backlog is rejected
+    straight away instead of queueing without limit.
+    """
+
+    def __init__(self, workers, backlog):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise Throttled(detail='Too many login attempts in progress, please retry shortly')
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                policy = get_policy()
+                _pool = HashPool(policy['WORKERS'], policy['BACKLOG'])
+    return _pool
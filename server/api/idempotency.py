@@ -0,0 +1,202 @@
+# server/api/idempotency.py
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+DEFAULTS = {
+    'BACKEND': 'api.idempotency.LocMemStore',
+    'OPTIONS': {},
+    'TTL': 24 * 60 * 60,
+    'WAIT_TIMEOUT': 10,
+    # Seconds a key stays claimed by a request that never finishes, such as
+    # one whose worker died
+    'LOCK_TTL': 60,
+}
+
+
+class LocMemStore:
+    """Bounded in-process LRU of finished responses with TTL eviction"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def claim(self, key, ttl):
+        # Duplicates can only arrive in this process, where idempotent()
+        # already holds them back
+        return True
+
+    def release(self, key):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CacheStore:
+    """Store backed by a Django cache alias, shared between worker processes"""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def claim(self, key, ttl):
+        """Take the key for one request across all workers; False if another has it"""
+        return self.cache.add(f'{key}:lock', True, ttl)
+
+    def release(self, key):
+        self.cache.delete(f'{key}:lock')
+
+    def clear(self):
+        self.cache.clear()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the configured store, building it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_config()
+                _store = import_string(config['BACKEND'])(**config['OPTIONS'])
+    return _store
+
+
+# Keys whose first request is still running in this process; duplicates
+# wait on the event instead of executing the view a second time
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _reused():
+    return Response(
+        {'error': 'Idempotency-Key was already used with a different request'},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+
+def _in_progress():
+    return Response(
+        {'error': 'A request with this Idempotency-Key is still in progress'},
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+def _replay(stored):
+    response = Response(stored['data'], status=stored['status'])
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a DRF function view safe to retry with an Idempotency-Key header.
+
+    The finished response is stored under the key and the user id; a replay
+    returns it without running the view. Duplicates arriving while the first
+    request runs wait for it in the same process and get 409 in another,
+    where the store's claim() turns them away. Requests without the header
+    are handled normally. Apply it below @api_view so request.user is
+    resolved.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        idempotency_key = request.META.get(HEADER)
+        if not idempotency_key:
+            return view(request, *args, **kwargs)
+
+        config = get_config()
+        store = get_store()
+        key = f'idempotency:{request.user.pk}:{request.path}:{idempotency_key}'
+        fingerprint = _fingerprint(request)
+
+        while True:
+            stored = store.get(key)
+            if stored is not None:
+                return _replay(stored) if stored['fingerprint'] == fingerprint else _reused()
+
+            with _in_flight_lock:
+                event = _in_flight.get(key)
+                if event is None:
+                    event = _in_flight[key] = threading.Event()
+                    break
+            if not event.wait(config['WAIT_TIMEOUT']):
+                return _in_progress()
+
+        try:
+            if not store.claim(key, config['LOCK_TTL']):
+                return _in_progress()
+            try:
+                # Another worker may have finished it between our lookup
+                # and the claim
+                stored = store.get(key)
+                if stored is not None:
+                    return _replay(stored) if stored['fingerprint'] == fingerprint else _reused()
+                response = view(request, *args, **kwargs)
+                # Server errors are not stored so the client can retry them
+                if response.status_code < 500:
+                    store.set(key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, config['TTL'])
+                return response
+            finally:
+                store.release(key)
+        finally:
+            with _in_flight_lock:
+                del _in_flight[key]
+            event.set()
+
+    return wrapper
@@ -0,0 +1,152 @@
+# server/api/identifiers.py
+import re
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import models
+
+ACCOUNT_NUMBER_PREFIX = 'NB'
+ACCOUNT_NUMBER_SEQUENCE = 'account_number'
+# Nine-digit serials plus a check digit fill the ten digits after the prefix
+ACCOUNT_SERIAL_OFFSET = 100_000_000
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+USERNAME_BASE_MAX_LENGTH = 130
+
+
+def advance(name, step=1):
+    """
+    Add step to a named sequence and return its new value.
+
+    The first allocation creates the row; a concurrent creator losing the
+    insert race falls back to the UPDATE, so no caller ever probes first.
+    """
+    with transaction.atomic():
+        sequences = models.IdentifierSequence.objects.filter(name=name)
+        if not sequences.update(value=F('value') + step):
+            try:
+                with transaction.atomic():
+                    models.IdentifierSequence.objects.create(name=name, value=step)
+                return step
+            except IntegrityError:
+                sequences.update(value=F('value') + step)
+        return sequences.values_list('value', flat=True).get()
+
+
+def username_base(first_name, last_name):
+    """Lowercased alphanumeric base username built from a person's name"""
+    base = re.sub(r'[^a-zA-Z0-9]', '', f"{first_name.lower()}{last_name.lower()}")
+    return base[:USERNAME_BASE_MAX_LENGTH] or 'user'
+
+
+def next_username(first_name, last_name):
+    """
+    Allocate the next username for a name in constant queries.
+
+    The first "John Smith" gets johnsmith, the next johnsmith1, and so on,
+    counted by a per-base sequence row instead of probing existing users.
+    """
+    base = username_base(first_name, last_name)
+    count = advance(f'username:{base}')
+    return base if count == 1 else f"{base}{count - 1}"
+
+
+def allocate_usernames(names):
+    """
+    Allocate usernames for many (first_name, last_name) pairs at once.
+
+    Each distinct base advances its sequence a single time by the number of
+    people sharing it, so a batch costs one round trip per distinct name.
+    """
+    bases = [username_base(first_name, last_name) for first_name, last_name in names]
+    counts = {}
+    for base in bases:
+        counts[base] = counts.get(base, 0) + 1
+    # Next count to hand out for each base
+    cursors = {base: advance(f'username:{base}', count) - count + 1 for base, count in counts.items()}
+    usernames = []
+    for base in bases:
+        count = cursors[base]
+        cursors[base] += 1
+        usernames.append(base if count == 1 else f"{base}{count - 1}")
+    return usernames
+
+
+def luhn_check_digit(digits):
+    """Return the Luhn check digit for a string of digits"""
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        digit = int(char)
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(account_number):
+    digits = account_number[len(ACCOUNT_NUMBER_PREFIX):]
+    return (
+        account_number.startswith(ACCOUNT_NUMBER_PREFIX)
+        and digits.isdigit()
+        and luhn_check_digit(digits[:-1]) == digits[-1]
+    )
+
+
+class BlockAllocator:
+    """
+    Hands out values of a named sequence from blocks reserved in one query.
+
+    Values left in a block when the process exits are never reused, so the
+    sequence may have gaps but never repeats.
+    """
+
+    def __init__(self, name, block_size):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def next(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._end = advance(self.name, self.block_size)
+                self._next = self._end - self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+
+_account_serials = BlockAllocator(ACCOUNT_NUMBER_SEQUENCE, ACCOUNT_NUMBER_BLOCK_SIZE)
+
+
+def next_account_number():
+    """Allocate an account number: prefix, nine-digit serial, check digit"""
+    serial = str(ACCOUNT_SERIAL_OFFSET + _account_serials.next())
+    return f"{ACCOUNT_NUMBER_PREFIX}{serial}{luhn_check_digit(serial)}"
+
+
+def save_with_unique(instance, field, generate, save, using=None):
+    """
+    Fill field from generate() and save, retrying on a unique violation.
+
+    Collisions are only possible with identifiers created before the
+    sequences existed, so the common path is a single INSERT. A violation
+    on any other constraint is re-raised.
+    """
+    model = type(instance)
+    while True:
+        setattr(instance, field, generate())
+        try:
+            with transaction.atomic(using=using):
+                save()
+            return
+        except IntegrityError:
+            taken = model._default_manager.using(using).filter(
+                **{field: getattr(instance, field)}
+            ).exists()
+            if not taken:
+                setattr(instance, field, '')
+                raise
@@ -0,0 +1,141 @@
+# server/api/jobs.py
+"""
+Bulk account changes requested from the admin, run in the background.
+
+An admin action only records an AccountJob naming its selection, either
+the accounts ticked or the search and filter whose every match was
+chosen; once that commits, a daemon thread in the same process applies it
+CHUNK_SIZE accounts per transaction, walking them in primary key order
+and checkpointing after each chunk. A job whose process died is picked up
+where it stopped by `manage.py run_account_jobs`.
+
+Jobs only reach accounts on the default database. With shards configured,
+a job that may name accounts elsewhere fails before changing any.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import search, sharding, snapshots
+from .models import Account, AccountJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Accounts updated per transaction
+    'CHUNK_SIZE': 1000,
+    # Seconds to sleep between chunks, leaving the database to live traffic
+    'PAUSE': 0,
+    # Run queued jobs in a thread; off, they run in the queuing request
+    'BACKGROUND': True,
+}
+
+# A running job that made no progress for this long is taken to be dead
+STALE_AFTER = timedelta(minutes=5)
+
+FROZEN = {AccountJob.FREEZE: True, AccountJob.UNFREEZE: False}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ACCOUNT_JOBS', {})}
+
+
+def queue(action, selection, user=None):
+    """Record a job changing the accounts a selection names and start it after commit"""
+    job = AccountJob.objects.create(action=action, selection=selection, requested_by=user)
+    transaction.on_commit(partial(start, job.pk))
+    return job
+
+
+def select(selection):
+    """
+    The accounts a job selection names: {'ids': [...]}, or {'search': ...,
+    'frozen': True, False or None} for every match of an admin search
+    """
+    if 'ids' in selection:
+        return Account.objects.filter(pk__in=selection['ids'])
+    accounts = search.accounts(Account.objects.all(), selection['search'])
+    if selection.get('frozen') is not None:
+        accounts = accounts.filter(frozen=selection['frozen'])
+    return accounts
+
+
+def check_reachable(selection):
+    """Raise ValueError if a selection may name accounts off the default database"""
+    if not sharding.is_sharded():
+        return
+    if 'ids' not in selection:
+        raise ValueError('Searches only reach accounts on the default database; with shards, select accounts by id')
+    found = {str(pk) for pk in Account.objects.filter(pk__in=selection['ids']).values_list('pk', flat=True)}
+    missing = [pk for pk in selection['ids'] if pk not in found]
+    if missing:
+        raise ValueError(f"{len(missing)} selected accounts are not on the default database: {', '.join(missing)}")
+
+
+def _invalidate(account_ids):
+    for account_id in account_ids:
+        snapshots.invalidate(account_id)
+
+
+def start(job_id):
+    if get_config()['BACKGROUND']:
+        threading.Thread(target=_run_in_thread, args=(job_id,), name=f'account-job-{job_id}', daemon=True).start()
+    else:
+        run(job_id)
+
+
+def _run_in_thread(job_id):
+    try:
+        run(job_id)
+    finally:
+        connections.close_all()
+
+
+def claim(job_id):
+    """Mark a pending or stale job running; False if another runner has it"""
+    stale = timezone.now() - STALE_AFTER
+    return bool(
+        AccountJob.objects.filter(
+            Q(status=AccountJob.PENDING) | Q(status=AccountJob.RUNNING, updated_at__lt=stale),
+            pk=job_id,
+        ).update(status=AccountJob.RUNNING, updated_at=timezone.now())
+    )
+
+
+def run(job_id):
+    """Claim a job and apply it from its checkpoint; returns whether it ran"""
+    if not claim(job_id):
+        return False
+    job = AccountJob.objects.get(pk=job_id)
+    config = get_config()
+    last = job.last_account
+    try:
+        check_reachable(job.selection)
+        ids = select(job.selection).order_by('pk').values_list('pk', flat=True)
+        while True:
+            chunk = list((ids.filter(pk__gt=last) if last else ids)[:config['CHUNK_SIZE']])
+            if not chunk:
+                break
+            last = chunk[-1]
+            with transaction.atomic():
+                Account.objects.filter(pk__in=chunk).update(frozen=FROZEN[job.action])
+                # Cached account payloads show the frozen flag
+                transaction.on_commit(partial(_invalidate, chunk))
+                AccountJob.objects.filter(pk=job.pk).update(
+                    last_account=last, done=F('done') + len(chunk), updated_at=timezone.now()
+                )
+            if config['PAUSE']:
+                time.sleep(config['PAUSE'])
+    except Exception as e:
+        logger.exception('Account job %s failed', job.pk)
+        AccountJob.objects.filter(pk=job.pk).update(status=AccountJob.FAILED, error=str(e), updated_at=timezone.now())
+        return True
+    AccountJob.objects.filter(pk=job.pk).update(status=AccountJob.DONE, updated_at=timezone.now())
+    return True
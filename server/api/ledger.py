@@ -0,0 +1,148 @@
+# server/api/ledger.py
+from functools import partial
+from operator import index
+
+from django.db import transaction
+from django.db.models import F
+
+from . import events, money, rollups, sharding, snapshots
+from .models import Account, Transaction
+
+
+class InsufficientFunds(Exception):
+    """Raised when a debit would take an account below zero"""
+
+
+class AccountFrozen(Exception):
+    """Raised when the holder of a frozen account tries to move money"""
+
+
+def after_commit(entry):
+    """Retire cached snapshots and notify listeners once a posting is durable"""
+    snapshots.invalidate(entry.account_id)
+    events.publish_balance(entry.account_id, entry.balance_after, entry)
+
+
+def post_to(db, account_id, amount, transaction_type, **fields):
+    """
+    Apply a signed amount in minor units to an account on a database and
+    append the ledger row, with any extra `fields` for it.
+
+    The balance is changed with a single conditional UPDATE using an F()
+    expression, so concurrent postings never read-modify-write the row and
+    debits can't overdraw it. The ledger row is written in the same short
+    transaction. Only transfers from other accounts reach a frozen one.
+    """
+    with transaction.atomic(using=db):
+        accounts = Account.objects.using(db).filter(pk=account_id)
+        if amount < 0:
+            accounts = accounts.filter(balance__gte=-amount)
+        if transaction_type != Transaction.TRANSFER_IN:
+            accounts = accounts.filter(frozen=False)
+        updated = accounts.update(balance=F('balance') + amount)
+        if not updated:
+            frozen = Account.objects.using(db).filter(pk=account_id).values_list('frozen', flat=True).first()
+            if frozen is None:
+                raise Account.DoesNotExist()
+            if frozen and transaction_type != Transaction.TRANSFER_IN:
+                raise AccountFrozen()
+            raise InsufficientFunds()
+
+        # The row is write-locked by the UPDATE above until commit, so this
+        # read sees exactly the balance our posting produced
+        balance = Account.objects.using(db).filter(pk=account_id).values_list('balance', flat=True).get()
+        entry = Transaction.objects.using(db).create(
+            account_id=account_id,
+            transaction_type=transaction_type,
+            amount=money.to_decimal(amount),
+            balance_after=money.to_decimal(balance),
+            **fields,
+        )
+        rollups.record([entry])
+        transaction.on_commit(partial(after_commit, entry), using=db)
+        return entry
+
+
+def post_moved(db, account_id, amount, transaction_type, **fields):
+    """
+    post_to() an account that was not found on db after all, because
+    rebalance_shards moved it while we waited for its lock. Raises
+    Account.DoesNotExist if it is still located there.
+    """
+    moved_to = sharding.locate(account_id)
+    if moved_to == db:
+        raise Account.DoesNotExist()
+    return post_to(moved_to, account_id, amount, transaction_type, **fields)
+
+
+def _post(account_id, amount, transaction_type, **fields):
+    """post_to() the account's shard"""
+    db = sharding.locate(account_id)
+    try:
+        return post_to(db, account_id, amount, transaction_type, **fields)
+    except Account.DoesNotExist:
+        return post_moved(db, account_id, amount, transaction_type, **fields)
+
+
+def _submit(account_id, amount, transaction_type):
+    """
+    Post through the group committer when it is enabled. Callers already
+    inside a transaction post directly, so the posting stays part of it.
+    """
+    from . import batching
+
+    if batching.get_config()['ENABLED'] and not any(
+        transaction.get_connection(db).in_atomic_block for db in sharding.databases()
+    ):
+        return batching.post(account_id, amount, transaction_type)
+    return _post(account_id, amount, transaction_type)
+
+
+# Amounts below are ints in minor units; index() turns away a Decimal or
+# float passed in major units by mistake
+
+
+def deposit(account_id, amount):
+    """Credit an account and return the ledger entry"""
+    return _submit(account_id, index(amount), Transaction.DEPOSIT)
+
+
+def withdraw(account_id, amount):
+    """Debit an account and return the ledger entry, or raise InsufficientFunds"""
+    return _submit(account_id, -index(amount), Transaction.WITHDRAWAL)
+
+
+def credit_transfer(account_id, amount, source_account_id, reference):
+    """
+    Credit the receiving side of a transfer from another shard. Raises
+    IntegrityError if the credit with this reference was already applied.
+    """
+    return _post(
+        account_id, index(amount), Transaction.TRANSFER_IN,
+        counterparty_id=source_account_id, reference=reference,
+    )
+
+
+def set_balance(account_id, balance):
+    """Set an account balance outright, recording the difference as an adjustment"""
+    balance = index(balance)
+    db = sharding.locate(account_id)
+    with transaction.atomic(using=db):
+        current, frozen = (
+            Account.objects.using(db).select_for_update()
+            .filter(pk=account_id)
+            .values_list('balance', 'frozen')
+            .get()
+        )
+        if frozen:
+            raise AccountFrozen()
+        Account.objects.using(db).filter(pk=account_id).update(balance=balance)
+        entry = Transaction.objects.using(db).create(
+            account_id=account_id,
+            transaction_type=Transaction.ADJUSTMENT,
+            amount=money.to_decimal(balance - current),
+            balance_after=money.to_decimal(balance),
+        )
+        rollups.record([entry])
+        transaction.on_commit(partial(after_commit, entry), using=db)
+        return entry
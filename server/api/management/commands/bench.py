@@ -0,0 +1,66 @@
+# server/api/management/commands/bench.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import api_load
+from benchmarks.database import temporary_database
+
+
+class Command(BaseCommand):
+    help = 'Load-test the API on a throwaway database and compare against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=[*api_load.MODES, 'both'], default='both')
+        parser.add_argument(
+            '--ops', default=','.join(api_load.OPERATIONS),
+            help=f"Comma-separated subset of {', '.join(api_load.OPERATIONS)}"
+        )
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per thread per operation')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Results file from an earlier run to compare against')
+        parser.add_argument(
+            '--threshold', type=float, default=10.0,
+            help='Percent change counted as a regression when comparing'
+        )
+
+    def handle(self, *args, **options):
+        operations = [op.strip() for op in options['ops'].split(',') if op.strip()]
+        unknown = set(operations) - set(api_load.OPERATIONS)
+        if unknown:
+            raise CommandError(f"Unknown operations: {', '.join(sorted(unknown))}")
+        modes = api_load.MODES if options['mode'] == 'both' else [options['mode']]
+
+        with temporary_database():
+            report = api_load.run(modes, operations, options['concurrency'], options['requests'])
+
+        for mode, results in report['results'].items():
+            self.stdout.write(f"\n{mode} mode, {options['concurrency']} threads")
+            self.stdout.write(
+                f"{'operation':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}"
+            )
+            for operation, m in results.items():
+                self.stdout.write(
+                    f"{operation:<10} {m['rps']:8.1f} {m['p50_ms']:8.1f} {m['p95_ms']:8.1f} "
+                    f"{m['p99_ms']:8.1f} {m['queries_per_request']:8.1f} {m['errors']:7d}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"\nResults written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = 0
+            self.stdout.write(f"\nCompared with {options['baseline']}")
+            for mode, operation, metric, before, after, change, regressed in api_load.compare(
+                report, baseline, options['threshold']
+            ):
+                regressions += regressed
+                flag = '  REGRESSION' if regressed else ''
+                self.stdout.write(f"{mode:<7} {operation:<10} {metric:<20} {before:10.2f} -> {after:10.2f} ({change:+.1f}%){flag}")
+            if regressions:
+                raise CommandError(f"{regressions} metric(s) regressed by more than {options['threshold']}%")
@@ -0,0 +1,254 @@
+# server/api/management/commands/import_customers.py
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+
+from api import identifiers, money, rollups, sharding
+from api.models import User, Account, Transaction
+
+REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
+
+
+def _init_worker(settings_module):
+    """Configure Django in hashing processes started with spawn"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+@contextmanager
+def atomic_everywhere():
+    """One transaction on default and one on each shard, rolled back together"""
+    with ExitStack() as stack:
+        for db in dict.fromkeys([DEFAULT_DB_ALIAS, *sharding.shards()]):
+            stack.enter_context(transaction.atomic(using=db))
+        yield
+
+
+def read_rows(path, fmt):
+    """Yield (line_number, row) pairs from a CSV or NDJSON file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row
+
+
+def clean_row(row):
+    """Return a normalized row, or raise ValueError describing the problem"""
+    if not isinstance(row, dict):
+        raise ValueError('not a JSON object')
+    # NDJSON rows may hold numbers, nulls or objects where text is expected
+    wrong = [field for field in [*REQUIRED_FIELDS, 'password'] if not isinstance(row.get(field) or '', str)]
+    if wrong:
+        raise ValueError(f"{', '.join(wrong)} must be text")
+    missing = [field for field in REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    email = User.objects.normalize_email(row['email'].strip())
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError(f"invalid email {email!r}")
+
+    try:
+        balance = money.to_minor(row.get('balance') or 0)
+    except ValueError:
+        raise ValueError(f"invalid balance {row.get('balance')!r}")
+    if balance < 0:
+        raise ValueError('balance cannot be negative')
+
+    return {
+        'email': email,
+        'first_name': row['first_name'].strip(),
+        'last_name': row['last_name'].strip(),
+        'password': row.get('password') or None,
+        'balance': balance,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Bulk import customers and their accounts from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Password hashing processes')
+        parser.add_argument('--checkpoint', help='Defaults to <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+
+        state = {'line': 0, 'imported': 0, 'skipped': 0}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as f:
+                state = json.load(f)
+            self.stdout.write(f"Resuming after line {state['line']} ({state['imported']} already imported)")
+
+        self.workers = options['workers'] or 1
+        rows = ((n, row) for n, row in read_rows(path, fmt) if n > state['line'])
+        started = time.perf_counter()
+        imported_this_run = 0
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(os.environ['DJANGO_SETTINGS_MODULE'],),
+        ) as pool:
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                imported, skipped = self.import_chunk(chunk, pool)
+                imported_this_run += imported
+                state = {
+                    'line': chunk[-1][0],
+                    'imported': state['imported'] + imported,
+                    'skipped': state['skipped'] + skipped,
+                }
+                self.save_checkpoint(checkpoint_path, state)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"line {state['line']}: {state['imported']} imported, "
+                    f"{state['skipped']} skipped, {imported_this_run / elapsed:.0f} rows/sec"
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {state['imported']} imported, {state['skipped']} skipped "
+            f"({imported_this_run / elapsed if elapsed else 0:.0f} rows/sec this run)"
+        ))
+
+    def import_chunk(self, chunk, pool):
+        """Validate, hash and insert one chunk; return (imported, skipped)"""
+        valid = []
+        for line_number, row in chunk:
+            try:
+                valid.append(clean_row(row))
+            except ValueError as e:
+                self.stderr.write(f"line {line_number}: {e}")
+
+        # Drop emails that are repeated in the chunk or already registered
+        seen = set(
+            User.objects.filter(email__in=[row['email'] for row in valid])
+            .values_list('email', flat=True)
+        )
+        unique = []
+        for row in valid:
+            if row['email'] in seen:
+                self.stderr.write(f"{row['email']}: already exists")
+                continue
+            seen.add(row['email'])
+            unique.append(row)
+
+        hashes = list(pool.map(
+            make_password, [row['password'] for row in unique],
+            chunksize=max(1, len(unique) // (4 * self.workers))
+        ))
+        users = [
+            User(
+                email=row['email'],
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                password=password,
+            )
+            for row, password in zip(unique, hashes)
+        ]
+
+        try:
+            with atomic_everywhere():
+                self.bulk_insert(users, unique)
+        except IntegrityError:
+            # A pre-existing username or account number collided with a
+            # generated one, or an email was registered since the check
+            # above. Retry row by row, each in its own savepoint, and skip
+            # the rows that still conflict
+            imported = 0
+            with atomic_everywhere():
+                for user, row in zip(users, unique):
+                    try:
+                        with atomic_everywhere():
+                            self.insert_row(user, row)
+                    except IntegrityError:
+                        self.stderr.write(f"{row['email']}: already exists")
+                    else:
+                        imported += 1
+            return imported, len(chunk) - imported
+        return len(users), len(chunk) - len(users)
+
+    def insert_row(self, user, row):
+        user.pk = None
+        user.username = ''
+        user._state.adding = True
+        user.save()
+        account = Account(user=user, balance=row['balance'])
+        account.save()
+        if row['balance']:
+            entry = Transaction.objects.using(account._state.db).create(
+                account=account,
+                transaction_type=Transaction.DEPOSIT,
+                amount=money.to_decimal(row['balance']),
+                balance_after=money.to_decimal(row['balance']),
+            )
+            rollups.record([entry])
+
+    def bulk_insert(self, users, rows):
+        usernames = identifiers.allocate_usernames([(user.first_name, user.last_name) for user in users])
+        for user, username in zip(users, usernames):
+            user.username = username
+        User.objects.bulk_create(users)
+
+        accounts = [
+            Account(user=user, balance=row['balance'], account_number=identifiers.next_account_number())
+            for user, row in zip(users, rows)
+        ]
+        by_shard = {}
+        for account in accounts:
+            by_shard.setdefault(sharding.shard_for(account.pk), []).append(account)
+        for db, group in by_shard.items():
+            Account.objects.using(db).bulk_create(group)
+            # Opening balances are posted to the ledger so it keeps summing
+            # to each account's balance, and rolled up like any posting
+            entries = Transaction.objects.using(db).bulk_create([
+                Transaction(
+                    account=account,
+                    transaction_type=Transaction.DEPOSIT,
+                    amount=money.to_decimal(account.balance),
+                    balance_after=money.to_decimal(account.balance),
+                )
+                for account in group if account.balance
+            ])
+            if entries:
+                rollups.record(entries)
+
+    def save_checkpoint(self, path, state):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
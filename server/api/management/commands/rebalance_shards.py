@@ -0,0 +1,50 @@
+# server/api/management/commands/rebalance_shards.py
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api import sharding
+from api.models import Account
+
+
+class Command(BaseCommand):
+    help = 'Move accounts and their ledgers to their home shards after ACCOUNT_SHARDING changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Accounts moved per transaction')
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, leaving the write locks to other work'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only count the accounts that would move')
+
+    def handle(self, *args, **options):
+        moved = 0
+        started = time.perf_counter()
+        for source in sharding.databases():
+            accounts = Account.objects.using(source).order_by('pk').values_list('pk', flat=True)
+            last = None
+            while True:
+                ids = list((accounts.filter(pk__gt=last) if last else accounts)[:options['chunk_size']])
+                if not ids:
+                    break
+                last = ids[-1]
+                targets = defaultdict(list)
+                for account_id in ids:
+                    target = sharding.shard_for(account_id)
+                    if target != source:
+                        targets[target].append(account_id)
+                for target, account_ids in targets.items():
+                    # One short transaction per chunk and target, so postings
+                    # to the accounts being moved only wait for that chunk
+                    moved += len(account_ids) if options['dry_run'] else sharding.move_accounts(
+                        account_ids, source, target
+                    )
+                if targets:
+                    self.stdout.write(f"{moved} accounts moved ({time.perf_counter() - started:.1f}s)")
+                    if options['pause']:
+                        time.sleep(options['pause'])
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} accounts to their home shards"))
@@ -0,0 +1,87 @@
+# server/api/management/commands/reconcile.py
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import reconciliation, sharding
+
+REPORT_FIELDS = ['account_id', 'account_number', 'balance', 'ledger_total', 'difference']
+
+
+def _init_worker(settings_module, databases):
+    """
+    Configure Django in reconciliation processes, connecting with the
+    settings the parent's connections use rather than rereading them
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    # Forked workers must not share the parent's connections
+    connections.close_all()
+    for alias, settings_dict in databases.items():
+        connections[alias].settings_dict.update(settings_dict)
+
+
+class Command(BaseCommand):
+    help = 'Check that every account balance equals the sum of its ledger entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=reconciliation.METHODS, default=reconciliation.METHODS[0])
+        parser.add_argument('--shards', type=int, help='Account id ranges to split the work into; defaults to --workers')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes; 1 runs inline')
+        parser.add_argument('--chunk-size', type=int, default=reconciliation.ACCOUNT_CHUNK_SIZE, help='Accounts per query')
+        parser.add_argument('--output', help='Write the discrepancy report to this CSV file')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or 1
+        shards = options['shards'] or workers
+        jobs = [
+            (index, shards, options['method'], options['chunk_size'], database)
+            for database in sharding.databases()
+            for index in range(shards)
+        ]
+        started = time.perf_counter()
+
+        if workers == 1:
+            results = [reconciliation.reconcile_shard(*job) for job in jobs]
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(
+                    os.environ['DJANGO_SETTINGS_MODULE'],
+                    {alias: connections[alias].settings_dict for alias in sharding.databases()},
+                ),
+            ) as pool:
+                results = list(pool.map(reconciliation.reconcile_shard, *zip(*jobs)))
+        elapsed = time.perf_counter() - started
+
+        accounts = sum(result['accounts'] for result in results)
+        rows = sum(result['rows'] for result in results)
+        discrepancies = [d for result in results for d in result['discrepancies']]
+        self.write_report(discrepancies, options['output'])
+        self.stdout.write(
+            f"{accounts} accounts, {rows} ledger rows in {elapsed:.2f}s "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/sec, {options['method']}, "
+            f"{shards} shards on {workers} workers)"
+        )
+        if discrepancies:
+            raise CommandError(f"{len(discrepancies)} accounts do not match their ledger")
+        self.stdout.write(self.style.SUCCESS('All balances match the ledger'))
+
+    def write_report(self, discrepancies, path):
+        if not discrepancies and not path:
+            return
+        f = open(path, 'w', newline='') if path else self.stdout
+        try:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(discrepancies)
+        finally:
+            if path:
+                f.close()
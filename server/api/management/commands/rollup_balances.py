@@ -0,0 +1,84 @@
+# server/api/management/commands/rollup_balances.py
+import json
+import os
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import rollups, sharding
+from api.models import Account
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily balance rollups from the ledger for completed days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', type=date.fromisoformat, help='Last day to roll up; defaults to yesterday')
+        parser.add_argument('--since', type=date.fromisoformat, help='First day to roll up; defaults to --until')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Accounts per transaction; memory grows with this times the number of days'
+        )
+        parser.add_argument('--checkpoint', default='rollup_balances.checkpoint')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        until = options['until'] or today - timedelta(days=1)
+        since = options['since'] or until
+        if until >= today:
+            raise CommandError('Only completed days can be rolled up')
+        if since > until:
+            raise CommandError('--since is after --until')
+        checkpoint_path = options['checkpoint']
+
+        window = {'since': since.isoformat(), 'until': until.isoformat()}
+        state = {**window, 'database': None, 'account': None, 'accounts': 0, 'days': 0}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as f:
+                saved = json.load(f)
+            # A checkpoint for another window is stale
+            if saved['since'] == window['since'] and saved['until'] == window['until']:
+                state = saved
+                self.stdout.write(f"Resuming after account {state['account']} ({state['accounts']} done)")
+
+        databases = sharding.databases()
+        if state.get('database') in databases:
+            databases = databases[databases.index(state['database']):]
+        started = time.perf_counter()
+        for database in databases:
+            if state.get('database') != database:
+                state = {**state, 'database': database, 'account': None}
+            accounts = Account.objects.using(database).order_by('pk').values_list('pk', flat=True)
+            while True:
+                chunk = accounts.filter(pk__gt=state['account']) if state['account'] else accounts
+                ids = list(chunk[:options['chunk_size']])
+                if not ids:
+                    break
+                days = rollups.rebuild(ids, since, until, using=database)
+                state = {
+                    **window,
+                    'database': database,
+                    'account': str(ids[-1]),
+                    'accounts': state['accounts'] + len(ids),
+                    'days': state['days'] + days,
+                }
+                self.save_checkpoint(checkpoint_path, state)
+                self.stdout.write(
+                    f"{state['accounts']} accounts, {state['days']} account-days "
+                    f"({time.perf_counter() - started:.1f}s)"
+                )
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {since} to {until}: {state['accounts']} accounts, {state['days']} account-days"
+        ))
+
+    def save_checkpoint(self, path, state):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
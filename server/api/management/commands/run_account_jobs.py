@@ -0,0 +1,24 @@
+# server/api/management/commands/run_account_jobs.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api import jobs
+from api.models import AccountJob
+
+
+class Command(BaseCommand):
+    help = 'Run admin account jobs that are queued, or were left running by a process that died'
+
+    def handle(self, *args, **options):
+        stale = timezone.now() - jobs.STALE_AFTER
+        waiting = (
+            AccountJob.objects.filter(
+                Q(status=AccountJob.PENDING) | Q(status=AccountJob.RUNNING, updated_at__lt=stale)
+            )
+            .order_by('created_at')
+            .values_list('pk', flat=True)
+        )
+        ran = sum(jobs.run(job_id) for job_id in list(waiting))
+        failed = AccountJob.objects.filter(status=AccountJob.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} account jobs; {failed} have failed"))
@@ -0,0 +1,16 @@
+# server/api/management/commands/settle_transfers.py
+from django.core.management.base import BaseCommand
+
+from api import sharding, transfers
+from api.models import PendingCredit
+
+
+class Command(BaseCommand):
+    help = 'Apply cross-shard transfer credits left pending by a crash or an unavailable shard'
+
+    def handle(self, *args, **options):
+        applied = 0
+        for db in sharding.databases():
+            applied += transfers.settle(db)
+        remaining = sum(PendingCredit.objects.using(db).count() for db in sharding.databases())
+        self.stdout.write(self.style.SUCCESS(f"Applied {applied} pending credits, {remaining} left"))
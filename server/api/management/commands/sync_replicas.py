@@ -0,0 +1,29 @@
+# server/api/management/commands/sync_replicas.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import replicas
+
+
+class Command(BaseCommand):
+    help = 'Stamp the replication heartbeat on primaries and refresh SQLite copies standing in for replicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep going, once every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            replicas.beat()
+            copied = 0
+            for primary, aliases in replicas.get_config()['REPLICAS'].items():
+                for alias in aliases:
+                    # Real replicas pick the heartbeat up through replication
+                    if connections[alias].vendor == 'sqlite':
+                        replicas.copy_sqlite(primary, alias)
+                        copied += 1
+            if options['interval'] is None:
+                self.stdout.write(self.style.SUCCESS(f"Heartbeat stamped, {copied} SQLite replicas refreshed"))
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,260 @@
+# server/api/metrics.py
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger('api.slow_requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+DEFAULTS = {
+    # Requests slower than this many seconds are logged with their SQL
+    'SLOW_REQUEST_THRESHOLD': 1.0,
+    'MAX_CAPTURED_QUERIES': 50,
+    # Clients allowed to scrape /api/metrics/
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.responses = {}
+
+
+class Registry:
+    """
+    In-process store of per-view request metrics.
+
+    Observations take one short lock per request; everything is kept as
+    plain counters and rendered only when scraped.
+    """
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, method, status, duration, stats):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.latency.observe(duration)
+            metrics.queries.observe(stats.queries)
+            metrics.db_time += stats.db_time
+            metrics.serializer_time += stats.serializer_time
+            key = (method, status)
+            metrics.responses[key] = metrics.responses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                '# HELP http_requests_total Requests handled, by view, method and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for view, metrics in views:
+                for (method, status), count in sorted(metrics.responses.items()):
+                    lines.append(f'http_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+            lines += [
+                '# HELP http_request_duration_seconds Request latency by view.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for view, metrics in views:
+                lines += metrics.latency.render('http_request_duration_seconds', f'view="{view}"')
+            lines += [
+                '# HELP db_queries_per_request Database queries issued per request.',
+                '# TYPE db_queries_per_request histogram',
+            ]
+            for view, metrics in views:
+                lines += metrics.queries.render('db_queries_per_request', f'view="{view}"')
+            lines += [
+                '# HELP db_query_duration_seconds_total Time spent executing database queries.',
+                '# TYPE db_query_duration_seconds_total counter',
+            ]
+            for view, metrics in views:
+                lines.append(f'db_query_duration_seconds_total{{view="{view}"}} {metrics.db_time}')
+            lines += [
+                '# HELP serializer_duration_seconds_total Time spent in DRF serializers.',
+                '# TYPE serializer_duration_seconds_total counter',
+            ]
+            for view, metrics in views:
+                lines.append(f'serializer_duration_seconds_total{{view="{view}"}} {metrics.serializer_time}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    """Per-request counters, filled in through the current context"""
+
+    def __init__(self, max_captured):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.captured = []
+        self.max_captured = max_captured
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if len(self.captured) < self.max_captured:
+            self.captured.append((duration, sql))
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection when it opens.
+
+    It reports to whichever request is current in the calling context. The
+    async ORM copies the context into its worker thread, so queries made
+    from async views are attributed correctly as well.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_queries to new connections"""
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+def timed_serializer(render, instance):
+    """
+    render(instance), adding the time it takes to the current request's
+    serializer time. Nested serializers are only counted through their
+    outermost parent.
+    """
+    stats = _current.get()
+    if stats is None:
+        return render(instance)
+    stats.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        return render(instance)
+    finally:
+        stats.serializer_depth -= 1
+        if not stats.serializer_depth:
+            stats.serializer_time += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """Adds the time spent rendering this serializer to the current request's stats"""
+
+    def to_representation(self, instance):
+        return timed_serializer(super().to_representation, instance)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, query count, DB time and serializer time per view.
+
+    Works natively in both WSGI and ASGI stacks, so async views are not
+    pushed through a thread just to be measured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_config()
+        self.slow_threshold = config['SLOW_REQUEST_THRESHOLD']
+        self.max_captured = config['MAX_CAPTURED_QUERIES']
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats(self.max_captured)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats(self.max_captured)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def observe(self, request, response, duration, stats):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, request.method, response.status_code, duration, stats)
+        if duration >= self.slow_threshold:
+            self.log_slow_request(request, view, duration, stats)
+
+    def log_slow_request(self, request, view, duration, stats):
+        lines = [
+            f"Slow request {request.method} {request.path} ({view}): {duration * 1000:.1f} ms, "
+            f"{stats.queries} queries in {stats.db_time * 1000:.1f} ms, "
+            f"serializers {stats.serializer_time * 1000:.1f} ms"
+        ]
+        lines += [f"  {query_time * 1000:8.2f} ms  {sql}" for query_time, sql in stats.captured]
+        if stats.queries > len(stats.captured):
+            lines.append(f"  ... {stats.queries - len(stats.captured)} more queries not captured")
+        logger.warning('\n'.join(lines))
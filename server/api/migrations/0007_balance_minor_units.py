@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Cast, Round
+
+
+def to_minor_units(apps, schema_editor):
+    Account = apps.get_model('api', 'Account')
+    Account.objects.using(schema_editor.connection.alias).update(balance_minor=Cast(Round(F('balance') * 100), models.BigIntegerField()))
+
+
+def to_major_units(apps, schema_editor):
+    Account = apps.get_model('api', 'Account')
+    # Multiplying by a decimal keeps SQLite from dividing as integers
+    Account.objects.using(schema_editor.connection.alias).update(balance=ExpressionWrapper(
+        F('balance_minor') * Decimal('0.01'), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_daily_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='balance_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(to_minor_units, to_major_units),
+        migrations.RemoveField(
+            model_name='account',
+            name='balance',
+        ),
+        migrations.RenameField(
+            model_name='account',
+            old_name='balance_minor',
+            new_name='balance',
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+from django.db import migrations
+
+# Admin searches match these by prefix, and on PostgreSQL anywhere in the
+# value once a term has a trigram. They are expression indexes matching
+# the SQL Django writes for istartswith/icontains on each database, which
+# models.Index can't express per vendor
+SEARCH_COLUMNS = [
+    ('api_user', 'email'),
+    ('api_user', 'first_name'),
+    ('api_user', 'last_name'),
+    ('api_account', 'account_number'),
+]
+
+
+def _index_sql(vendor, table, column):
+    name = f'{table}_{column}_search'
+    if vendor == 'postgresql':
+        # Not in a transaction, so tables with millions of rows stay writable
+        return f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+    if vendor == 'sqlite':
+        # SQLite's LIKE ignores ASCII case, and only uses a NOCASE index
+        return f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)'
+    return None
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in SEARCH_COLUMNS:
+        sql = _index_sql(vendor, table, column)
+        if sql:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for table, column in SEARCH_COLUMNS:
+        if _index_sql(schema_editor.connection.vendor, table, column):
+            schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS {table}_{column}_search')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('api', '0011_account_freeze_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+import uuid
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def fill_entry_ids(apps, schema_editor):
+    Transaction = apps.get_model('api', 'Transaction')
+    rows = Transaction.objects.using(schema_editor.connection.alias).filter(entry_id__isnull=True).only('pk')
+    while batch := list(rows[:BATCH_SIZE]):
+        for row in batch:
+            row.entry_id = uuid.uuid4()
+        Transaction.objects.using(schema_editor.connection.alias).bulk_update(batch, ['entry_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_admin_search_indexes'),
+    ]
+
+    operations = [
+        # Nullable first, so existing rows each get their own id below
+        migrations.AddField(
+            model_name='transaction',
+            name='entry_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_entry_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='transaction',
+            name='entry_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='api_txn_account_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'created_at', 'entry_id'], name='api_txn_account_entry_idx'),
+        ),
+    ]
@@ -1,11 +1,27 @@
 # server/api/models.py
-from django.db import models
+from django.db import models, router
 from django.contrib.auth.models import AbstractUser, UserManager
+from django.utils import timezone
 import uuid
-import re
 
+from . import identifiers
 
-class CustomUserManager(UserManager):
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Also revoke or restore the tokens of users (de)activated in bulk, as post_save does for one"""
+        if kwargs.get('is_active') is False:
+            from .authentication import revoke_users
+
+            revoke_users(list(self.values_list('pk', flat=True)))
+        elif kwargs.get('is_active') is True:
+            from .authentication import restore_users
+
+            restore_users(list(self.values_list('pk', flat=True)))
+        return super().update(**kwargs)
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
     """Custom UserManager that handles auto-generated usernames"""
     
     def create_user(self, email, first_name, last_name, password=None, **extra_fields):
@@ -19,12 +35,9 @@ class CustomUserManager(UserManager):
             
         email = self.normalize_email(email)
         
-        # Auto-generate username from first and last name
-        username = self._generate_username(first_name, last_name)
-        
-        # Create user without calling parent create_user to avoid username requirement
+        # Create user without calling parent create_user to avoid username
+        # requirement; User.save allocates the username from the name
         user = self.model(
-            username=username,
             email=email,
             first_name=first_name,
             last_name=last_name,
@@ -45,21 +58,6 @@ class CustomUserManager(UserManager):
             raise ValueError('Superuser must have is_superuser=True.')
             
         return self.create_user(email, first_name, last_name, password, **extra_fields)
-    
-    def _generate_username(self, first_name, last_name):
-        """Generate a unique username from first and last name"""
-        # Create base username from first and last name
-        base_username = f"{first_name.lower()}{last_name.lower()}"
-        # Remove spaces and special characters
-        base_username = re.sub(r'[^a-zA-Z0-9]', '', base_username)
-        
-        # Ensure uniqueness by adding a number if needed
-        username = base_username
-        counter = 1
-        while self.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        return username
 
 
 class User(AbstractUser):
@@ -77,20 +75,15 @@ class User(AbstractUser):
     objects = CustomUserManager()
     
     def save(self, *args, **kwargs):
-        if not self.username:
-            # Auto-generate username from first and last name
-            base_username = f"{self.first_name.lower()}{self.last_name.lower()}"
-            # Remove spaces and special characters
-            base_username = re.sub(r'[^a-zA-Z0-9]', '', base_username)
-            
-            # Ensure uniqueness by adding a number if needed
-            username = base_username
-            counter = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
-            self.username = username
-        super().save(*args, **kwargs)
+        if self.username:
+            return super().save(*args, **kwargs)
+        # Auto-generate username from first and last name
+        identifiers.save_with_unique(
+            self, 'username',
+            lambda: identifiers.next_username(self.first_name, self.last_name),
+            lambda: super(User, self).save(*args, **kwargs),
+            using=kwargs.get('using'),
+        )
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.email}"
@@ -99,18 +92,218 @@ class User(AbstractUser):
 class Account(models.Model):
     """Bank Account model linked to User"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='account')
-    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Accounts may be on a shard away from their users (see api.sharding),
+    # so the database can't check this reference
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='account', db_constraint=False)
+    # In minor units (cents), see api.money
+    balance = models.BigIntegerField(default=0)
     account_number = models.CharField(max_length=12, unique=True)
     account_type = models.CharField(max_length=50, default='Premium Elite')
+    # Set by support staff; the holder can't move money until it is cleared
+    frozen = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} - {self.account_number}"
     
     def save(self, *args, **kwargs):
-        if not self.account_number:
-            # Generate account number (you can customize this logic)
-            import random
-            self.account_number = f"NB{random.randint(1000000000, 9999999999)}"
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # Resolve the shard up front so the savepoint below is taken there too
+        kwargs['using'] = kwargs.get('using') or router.db_for_write(Account, instance=self)
+        if self.account_number:
+            return super().save(*args, **kwargs)
+        identifiers.save_with_unique(
+            self, 'account_number',
+            identifiers.next_account_number,
+            lambda: super(Account, self).save(*args, **kwargs),
+            using=kwargs['using'],
+        )
+
+class IdentifierSequence(models.Model):
+    """Named counter backing username and account number allocation"""
+    name = models.CharField(max_length=200, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class Transaction(models.Model):
+    """Append-only ledger entry recording a single balance change"""
+    DEPOSIT = 'deposit'
+    WITHDRAWAL = 'withdrawal'
+    ADJUSTMENT = 'adjustment'
+    TRANSFER_IN = 'transfer_in'
+    TRANSFER_OUT = 'transfer_out'
+    TYPE_CHOICES = [
+        (DEPOSIT, 'Deposit'),
+        (WITHDRAWAL, 'Withdrawal'),
+        (ADJUSTMENT, 'Adjustment'),
+        (TRANSFER_IN, 'Transfer in'),
+        (TRANSFER_OUT, 'Transfer out'),
+    ]
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='transactions')
+    transaction_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    # The other side of a transfer, which may be on another shard
+    counterparty = models.ForeignKey(
+        Account, on_delete=models.DO_NOTHING, null=True, blank=True, related_name='+', db_constraint=False
+    )
+    # Signed amount: credits are positive, debits negative, so the ledger
+    # for an account always sums to its balance
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Shared by both sides of a transfer between shards
+    reference = models.UUIDField(null=True, blank=True)
+    # Kept when rebalance_shards moves the account, which gives its rows new
+    # primary keys on the target shard; cursors and clients refer to this
+    entry_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Serves history pages: equality on account, then keyset range
+            # scans over (created_at, entry_id)
+            models.Index(fields=['account', 'created_at', 'entry_id'], name='api_txn_account_entry_idx'),
+        ]
+        constraints = [
+            # A cross-shard credit is applied at most once
+            models.UniqueConstraint(
+                fields=['reference'],
+                condition=models.Q(transaction_type='transfer_in'),
+                name='api_txn_transfer_in_reference',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} {self.amount} - {self.account_id}"
+
+
+class DailyBalance(models.Model):
+    """
+    Per-account rollup of one day's postings.
+
+    Rows exist only for days with activity. They are kept current as money
+    moves and rebuilt from the ledger by `manage.py rollup_balances`.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_balances')
+    date = models.DateField()
+    credits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    debits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    closing_balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            # Also the index for "latest day on or before X" lookups
+            models.UniqueConstraint(fields=['account', 'date'], name='api_dailybalance_account_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.date}: {self.closing_balance}"
+
+
+class MonthlyBalance(models.Model):
+    """
+    Per-account rollup of one month's postings, kept alongside
+    DailyBalance. Amounts are decimals, like the ledger rows both sum; see
+    api.money.
+
+    balance_days sums the month's end-of-day balances, counting the
+    closing balance for every day left in the month, so an average daily
+    balance is read off one row.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='monthly_balances')
+    # The first day of the month
+    month = models.DateField()
+    credits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    debits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Withdrawals and transfers out, the debits the holder made
+    spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    closing_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_days = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'month'], name='api_monthlybalance_account_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.month:%Y-%m}: {self.closing_balance}"
+
+
+class PendingCredit(models.Model):
+    """
+    Credit owed to an account on another shard by a transfer out of `source`.
+
+    Written on the source's shard in the transaction that debits it, and
+    deleted once the destination's shard has applied it; see
+    api.transfers.settle().
+    """
+    reference = models.UUIDField(unique=True)
+    source = models.UUIDField(db_index=True)
+    destination = models.UUIDField()
+    # In minor units
+    amount = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.amount} {self.source} -> {self.destination}"
+
+
+class ReplicationHeartbeat(models.Model):
+    """
+    Time last stamped on a primary database. Replicas receive it through
+    replication, so its age there is their lag; see api.replicas.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    beat_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} {self.beat_at}"
+
+
+class AccountJob(models.Model):
+    """
+    A bulk change to accounts queued from the admin and applied in chunks
+    in the background; see api.jobs.
+    """
+    FREEZE = 'freeze'
+    UNFREEZE = 'unfreeze'
+    ACTION_CHOICES = [
+        (FREEZE, 'Freeze'),
+        (UNFREEZE, 'Unfreeze'),
+    ]
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    # The accounts ticked, or the admin search and filter whose matches
+    # were all chosen, so selecting them never lists them in the request;
+    # see api.jobs.select()
+    selection = models.JSONField(default=dict)
+    # Accounts are walked in primary key order; the last one done
+    last_account = models.UUIDField(null=True, blank=True)
+    done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='api_accountjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} #{self.pk}: {self.status}, {self.done} done"
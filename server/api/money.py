@@ -0,0 +1,121 @@
+# server/api/money.py
+"""
+Money as integer minor units (cents).
+
+Balances are stored and compared as ints, so arithmetic on them is exact
+and needs no Decimal context. Amounts from clients are parsed straight
+from their text; Decimal is only used for the unusual inputs, such as
+more than two decimal places or exponents, and rounds them the way the
+ledger always has. Ledger rows and the DailyBalance and MonthlyBalance
+rollups summing them keep DecimalField columns, so to_decimal() and
+to_minor() convert at that boundary.
+"""
+from decimal import Decimal, InvalidOperation
+
+CENT = Decimal('0.01')
+MINOR_UNITS = 100
+# The ledger's DecimalField(max_digits=12, decimal_places=2) columns hold
+# at most this many minor units
+MAX_MINOR = 10 ** 12 - 1
+MAX_DIGITS = len(str(MAX_MINOR))
+
+
+def _plain(text):
+    """
+    Parse plain decimal text with at most two decimal places, such as
+    '-12.5', straight to minor units. Returns None for anything else.
+    """
+    unsigned = text[1:] if text.startswith('-') else text
+    whole, _, fraction = unsigned.partition('.')
+    digits = whole + fraction.ljust(2, '0')
+    if ((whole or fraction) and len(fraction) <= 2 and len(digits) <= MAX_DIGITS
+            and digits.isascii() and digits.isdigit()):
+        return int(digits) if unsigned is text else -int(digits)
+    return None
+
+
+def to_minor(value):
+    """
+    Convert a number or numeric string in major units to minor units,
+    rounding half to even. Raises ValueError if it is not a finite amount
+    the ledger can hold.
+    """
+    if isinstance(value, bool):
+        raise ValueError('Invalid amount')
+    if isinstance(value, int):
+        minor = value * MINOR_UNITS
+    elif isinstance(value, str) and (minor := _plain(value)) is not None:
+        pass
+    else:
+        try:
+            minor = int(Decimal(str(value)).quantize(CENT).scaleb(2))
+        except (InvalidOperation, ValueError):
+            # int() refuses NaN, which quantize() lets through
+            raise ValueError('Invalid amount')
+    if abs(minor) > MAX_MINOR:
+        raise ValueError('Invalid amount')
+    return minor
+
+
+def to_decimal(minor):
+    """Minor units as a two-place Decimal, for ledger columns"""
+    return Decimal(minor).scaleb(-2)
+
+
+def to_string(minor):
+    """Minor units as the two-place decimal string the API returns"""
+    whole, cents = divmod(abs(minor), MINOR_UNITS)
+    return f"{'-' if minor < 0 else ''}{whole}.{cents:02d}"
+
+
+def parse_amount(value):
+    """
+    Parse an amount sent by a client into positive minor units, raising
+    ValueError with the message to return to it.
+    """
+    if not value:
+        raise ValueError('Amount is required')
+    minor = to_minor(value)
+    if minor <= 0:
+        raise ValueError('Amount must be positive')
+    return minor
+
+
+def parse_balance(value):
+    """Like parse_amount(), but for a balance, which may be zero"""
+    if value is None:
+        raise ValueError('Balance is required')
+    try:
+        minor = to_minor(value)
+    except ValueError:
+        raise ValueError('Invalid balance')
+    if minor < 0:
+        raise ValueError('Balance cannot be negative')
+    return minor
+
+
+def _parse_or_error(value):
+    try:
+        return parse_amount(value)
+    except ValueError as e:
+        return e
+
+
+def parse_amounts(values):
+    """
+    parse_amount() over a batch, returning the amount or the ValueError for
+    each value.
+
+    A batch made only of plain positive amounts, the usual case, is
+    checked with a few passes over all of it at once instead of value by
+    value. Otherwise each value is parsed on its own.
+    """
+    parts = [(value if type(value) is str else str(value)).partition('.') for value in values]
+    if max((len(fraction) for _, _, fraction in parts), default=0) <= 2:
+        digits = [whole + fraction.ljust(2, '0') for whole, _, fraction in parts]
+        joined = ''.join(digits)
+        if joined.isascii() and joined.isdigit() and max(map(len, digits), default=0) <= MAX_DIGITS:
+            amounts = list(map(int, digits))
+            if all(amounts):
+                return amounts
+    return [_parse_or_error(value) for value in values]
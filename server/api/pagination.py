@@ -0,0 +1,62 @@
+# server/api/pagination.py
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def encode_cursor(created_at, entry_id):
+    raw = f"{created_at.isoformat()}|{entry_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, entry_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor()
+
+
+def _seek(queryset, cursor, limit):
+    queryset = queryset.order_by('-created_at', '-entry_id')
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, entry_id__lt=entry_id)
+        )
+    # Fetch one extra row to learn whether another page exists
+    return queryset[:limit + 1]
+
+
+def _split(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].entry_id)
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor=None, limit=50):
+    """
+    Return one newest-first page of ledger rows and the cursor for the next.
+
+    Rows are located by seeking past the last (created_at, entry_id) seen
+    rather than with OFFSET, so with the (account, created_at, entry_id)
+    index every page costs the same as the first one. entry_id rather than
+    the primary key, which changes when rebalance_shards moves an account,
+    so cursors already handed out stay valid.
+    """
+    return _split(list(_seek(queryset, cursor, limit)), limit)
+
+
+async def akeyset_page(queryset, cursor=None, limit=50):
+    """Async version of keyset_page()"""
+    return _split([row async for row in _seek(queryset, cursor, limit).aiterator()], limit)
@@ -0,0 +1,127 @@
+# server/api/reconciliation.py
+import uuid
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast, Round
+
+from . import money
+from .models import Account, Transaction
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The database aggregates far faster than rows can be streamed into NumPy,
+# so GROUP BY is the default. NumPy moves the summing off a busy database
+# server at the cost of shipping every row
+METHODS = ['sql', 'numpy'] if numpy is not None else ['sql']
+ACCOUNT_CHUNK_SIZE = 1000
+LEDGER_BATCH_SIZE = 20000
+
+
+def shard_range(index, count):
+    """The [low, high) account id range of one of `count` equal shards; high is None for the last"""
+    size = (1 << 128) // count
+    high = uuid.UUID(int=(index + 1) * size) if index < count - 1 else None
+    return uuid.UUID(int=index * size), high
+
+
+def _cents(amount):
+    # SQLite sums decimals as floats, so round rather than truncate
+    return int((amount * 100).quantize(1))
+
+
+def _sum_numpy(account_ids, using):
+    """Return ({account_id: cents}, rows) by streaming the ledger through NumPy"""
+    rows = (
+        Transaction.objects.using(using).filter(account_id__in=account_ids)
+        # Whole cents, so the sums are exact int64 arithmetic
+        .annotate(cents=Cast(Round(F('amount') * 100), BigIntegerField()))
+        .values_list('account_id', 'cents')
+        .iterator(chunk_size=LEDGER_BATCH_SIZE)
+    )
+    index = {account_id: i for i, account_id in enumerate(account_ids)}
+    totals = numpy.zeros(len(account_ids), dtype=numpy.int64)
+    count = 0
+    while batch := list(islice(rows, LEDGER_BATCH_SIZE)):
+        positions = numpy.fromiter((index[account_id] for account_id, _ in batch), numpy.intp, len(batch))
+        cents = numpy.fromiter((cents for _, cents in batch), numpy.int64, len(batch))
+        numpy.add.at(totals, positions, cents)
+        count += len(batch)
+    return dict(zip(account_ids, totals.tolist())), count
+
+
+def _sum_sql(account_ids, using):
+    """Return ({account_id: cents}, rows) using a GROUP BY in the database"""
+    sums = (
+        Transaction.objects.using(using).filter(account_id__in=account_ids)
+        .values('account_id')
+        .annotate(total=Sum('amount'), rows=Count('id'))
+        .order_by()
+    )
+    totals, count = {}, 0
+    for row in sums:
+        totals[row['account_id']] = _cents(row['total'])
+        count += row['rows']
+    return totals, count
+
+
+def _confirm(account_id, using):
+    """
+    Recheck one account with its row locked, so a posting that landed
+    between reading the balance and summing the ledger is not reported.
+    Returns the discrepancy, or None if the account balances.
+    """
+    with transaction.atomic(using=using):
+        account = (
+            Account.objects.using(using).select_for_update()
+            .values('account_number', 'balance')
+            .get(pk=account_id)
+        )
+        total = _cents(Transaction.objects.using(using).filter(account_id=account_id).aggregate(
+            total=Sum('amount', default=0)
+        )['total'])
+    if account['balance'] == total:
+        return None
+    return {
+        'account_id': str(account_id),
+        'account_number': account['account_number'],
+        'balance': money.to_string(account['balance']),
+        'ledger_total': money.to_string(total),
+        'difference': money.to_string(account['balance'] - total),
+    }
+
+
+def reconcile_shard(index, count, method='sql', chunk_size=ACCOUNT_CHUNK_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Compare balance against ledger total for every account in one shard of
+    the account id space on one database.
+
+    Accounts are taken in primary key chunks and each chunk's ledger rows
+    are read through the account index, so every ledger row is read once
+    and memory stays bounded by the chunk.
+    """
+    summarize = _sum_numpy if method == 'numpy' else _sum_sql
+    low, high = shard_range(index, count)
+    accounts = Account.objects.using(using).filter(pk__gte=low).order_by('pk').values_list('pk', 'balance')
+    if high is not None:
+        accounts = accounts.filter(pk__lt=high)
+
+    result = {'accounts': 0, 'rows': 0, 'discrepancies': []}
+    last = None
+    while True:
+        chunk = list((accounts.filter(pk__gt=last) if last else accounts)[:chunk_size])
+        if not chunk:
+            return result
+        last = chunk[-1][0]
+        totals, rows = summarize([pk for pk, _ in chunk], using)
+        result['accounts'] += len(chunk)
+        result['rows'] += rows
+        for pk, balance in chunk:
+            if balance != totals.get(pk, 0):
+                discrepancy = _confirm(pk, using)
+                if discrepancy:
+                    result['discrepancies'].append(discrepancy)
@@ -0,0 +1,258 @@
+# server/api/replicas.py
+"""
+Read replicas for GET endpoints.
+
+Views decorated with @replica_reads may read from the replicas listed for
+a database in READ_REPLICAS['REPLICAS']: ReplicaRouter sends their
+queries there, and the sharding helpers ask for_read() which copy of an
+account's shard to use. Everything else, and every write, stays on the
+primary.
+
+Read-your-writes: after a user changes their balance, pin() keeps that
+user's reads on the primary for STICKY_SECONDS. The pin is kept in this
+process and in a signed cookie, so it holds when the next request lands
+on another worker too, as long as the client keeps cookies.
+
+Lag: the primary stamps a heartbeat row that reaches replicas through
+replication (`manage.py sync_replicas`, which also refreshes SQLite
+copies standing in for replicas). A replica whose heartbeat is more than
+MAX_LAG seconds old, or missing, is skipped until it catches up.
+"""
+import asyncio
+import functools
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+DEFAULTS = {
+    # {primary alias: [replica aliases]}; empty reads everything from primaries
+    'REPLICAS': {},
+    'STICKY_SECONDS': 5,
+    # Seconds a replica's heartbeat may trail the primary's clock
+    'MAX_LAG': 2,
+    # Seconds a replica's measured lag is trusted before it is measured again
+    'CHECK_INTERVAL': 1,
+    'COOKIE': 'read_primary',
+    # Users pinned in this process at once; the oldest pins go first
+    'MAX_PINNED': 100_000,
+}
+
+HEARTBEAT = 'primary'
+
+# Set while a @replica_reads view runs for a user who may use replicas
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'READ_REPLICAS', {})}
+
+
+class Pins:
+    """Users whose reads stay on the primary, until a deadline each"""
+
+    def __init__(self):
+        self._until = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, user_id, seconds, limit):
+        now = time.monotonic()
+        with self._lock:
+            # Every pin lasts as long, so the oldest is always at the front
+            self._until.pop(user_id, None)
+            self._until[user_id] = now + seconds
+            while self._until and (len(self._until) > limit or next(iter(self._until.values())) <= now):
+                self._until.popitem(last=False)
+
+    def __contains__(self, user_id):
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+_pins = Pins()
+# {replica alias: (monotonic time checked, usable)}
+_health = {}
+
+
+def reset():
+    """Forget pins and measured lag; for tests"""
+    _pins.clear()
+    _health.clear()
+
+
+def pin(response, user_id):
+    """Keep a user's reads on the primary for a while after a write"""
+    config = get_config()
+    if not config['REPLICAS'] or user_id is None:
+        return response
+    _pins.add(user_id, config['STICKY_SECONDS'], config['MAX_PINNED'])
+    response.set_signed_cookie(
+        config['COOKIE'], str(user_id), salt=config['COOKIE'],
+        max_age=config['STICKY_SECONDS'], httponly=True, samesite='Lax',
+    )
+    return response
+
+
+def is_pinned(request):
+    config = get_config()
+    user_id = getattr(request.user, 'pk', None)
+    if user_id is None:
+        return False
+    if user_id in _pins:
+        return True
+    try:
+        cookie = request.get_signed_cookie(config['COOKIE'], salt=config['COOKIE'], max_age=config['STICKY_SECONDS'])
+    except (KeyError, signing.BadSignature):
+        return False
+    return cookie == str(user_id)
+
+
+def replica_reads(view):
+    """
+    Let a GET view read from replicas, unless its user was pinned to the
+    primary by a recent write. Put it below the decorators that
+    authenticate the request.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(bool(get_config()['REPLICAS']) and not is_pinned(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(bool(get_config()['REPLICAS']) and not is_pinned(request))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+    return wrapper
+
+
+def lag(alias):
+    """Seconds a replica trails the primary by its heartbeat; None if it can't tell"""
+    from .models import ReplicationHeartbeat
+
+    try:
+        beat_at = ReplicationHeartbeat.objects.using(alias).values_list('beat_at', flat=True).get(name=HEARTBEAT)
+    except (ReplicationHeartbeat.DoesNotExist, DatabaseError):
+        return None
+    return (timezone.now() - beat_at).total_seconds()
+
+
+async def alag(alias):
+    """Async version of lag()"""
+    from .models import ReplicationHeartbeat
+
+    try:
+        beat_at = await ReplicationHeartbeat.objects.using(alias).values_list('beat_at', flat=True).aget(
+            name=HEARTBEAT
+        )
+    except (ReplicationHeartbeat.DoesNotExist, DatabaseError):
+        return None
+    return (timezone.now() - beat_at).total_seconds()
+
+
+def _known_health(alias, config):
+    """Whether a replica is usable, or None when it is due to be measured"""
+    checked = _health.get(alias)
+    if checked is None or time.monotonic() - checked[0] >= config['CHECK_INTERVAL']:
+        return None
+    return checked[1]
+
+
+def _record_health(alias, seconds, config):
+    usable = seconds is not None and seconds <= config['MAX_LAG']
+    _health[alias] = (time.monotonic(), usable)
+    return usable
+
+
+def for_read(db=DEFAULT_DB_ALIAS):
+    """The alias to read `db` data from: a usable replica inside @replica_reads, else db"""
+    if not _replica_reads.get():
+        return db
+    config = get_config()
+    usable = []
+    for alias in config['REPLICAS'].get(db, ()):
+        healthy = _known_health(alias, config)
+        if healthy is None:
+            healthy = _record_health(alias, lag(alias), config)
+        if healthy:
+            usable.append(alias)
+    return random.choice(usable) if usable else db
+
+
+async def afor_read(db=DEFAULT_DB_ALIAS):
+    """Async version of for_read()"""
+    if not _replica_reads.get():
+        return db
+    config = get_config()
+    usable = []
+    for alias in config['REPLICAS'].get(db, ()):
+        healthy = _known_health(alias, config)
+        if healthy is None:
+            healthy = _record_health(alias, await alag(alias), config)
+        if healthy:
+            usable.append(alias)
+    return random.choice(usable) if usable else db
+
+
+def primary_of(alias):
+    """The database a replica copies; a primary is its own"""
+    for primary, aliases in get_config()['REPLICAS'].items():
+        if alias in aliases:
+            return primary
+    return alias
+
+
+def beat():
+    """Stamp the heartbeat on every primary that has replicas"""
+    from .models import ReplicationHeartbeat
+
+    now = timezone.now()
+    for primary in get_config()['REPLICAS']:
+        ReplicationHeartbeat.objects.using(primary).update_or_create(name=HEARTBEAT, defaults={'beat_at': now})
+
+
+def copy_sqlite(primary, replica):
+    """Overwrite a SQLite stand-in replica with a consistent copy of its primary"""
+    source, target = connections[primary], connections[replica]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+class ReplicaRouter:
+    """
+    Sends reads made inside @replica_reads to a replica of default.
+
+    Account data is left to AccountShardRouter and the sharding helpers,
+    and reads following a relation from an instance stay with it.
+    """
+
+    def db_for_read(self, model, **hints):
+        from .sharding import SHARD_KEYS
+
+        if not _replica_reads.get() or hints.get('instance') is not None or model._meta.label_lower in SHARD_KEYS:
+            return None
+        db = for_read(DEFAULT_DB_ALIAS)
+        return None if db == DEFAULT_DB_ALIAS else db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A replica holds the same rows as its primary
+        if primary_of(obj1._state.db) == primary_of(obj2._state.db):
+            return True
+        return None
@@ -0,0 +1,206 @@
+# server/api/rollups.py
+import calendar
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import replicas, sharding
+from .models import DailyBalance, MonthlyBalance, Transaction
+
+ZERO = Decimal('0.00')
+# Debits the account holder made, as opposed to adjustments
+SPEND_TYPES = (Transaction.WITHDRAWAL, Transaction.TRANSFER_OUT)
+
+
+def day_start(day):
+    """The first instant of a calendar day in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def days_in_month(day):
+    return calendar.monthrange(day.year, day.month)[1]
+
+
+def days_left(day):
+    """Days from `day` to the end of its month, both included"""
+    return days_in_month(day) - day.day + 1
+
+
+def record(entries):
+    """
+    Fold freshly written ledger entries into their accounts' daily and
+    monthly rollups.
+
+    Call it inside the posting transaction, after the balance UPDATE: the
+    account row is locked until commit, so the rollup rows of one account
+    are never written concurrently. The entries must all have been saved
+    to the same shard; the rollups go there too.
+    """
+    daily = DailyBalance.objects.using(entries[0]._state.db)
+    days = {}
+    for entry in entries:
+        key = (entry.account_id, timezone.localdate(entry.created_at))
+        credits, debits, count, _ = days.get(key, (ZERO, ZERO, 0, None))
+        if entry.amount > 0:
+            credits += entry.amount
+        else:
+            debits -= entry.amount
+        days[key] = (credits, debits, count + 1, entry.balance_after)
+
+    for (account_id, day), (credits, debits, count, closing) in days.items():
+        updated = daily.filter(account_id=account_id, date=day).update(
+            credits=F('credits') + credits,
+            debits=F('debits') + debits,
+            entry_count=F('entry_count') + count,
+            closing_balance=closing,
+        )
+        if not updated:
+            daily.create(
+                account_id=account_id,
+                date=day,
+                credits=credits,
+                debits=debits,
+                entry_count=count,
+                closing_balance=closing,
+            )
+    _record_months(entries)
+
+
+def _record_months(entries):
+    """
+    record() for MonthlyBalance. A posting moves the end-of-day balance
+    of its day and of every later day in the month by its amount, so it
+    adds amount * days_left() to balance_days.
+    """
+    monthly = MonthlyBalance.objects.using(entries[0]._state.db)
+    months = {}
+    for entry in entries:
+        day = timezone.localdate(entry.created_at)
+        key = (entry.account_id, day.replace(day=1))
+        amount = entry.amount
+        if key not in months:
+            opening = entry.balance_after - amount
+            months[key] = {
+                'credits': ZERO, 'debits': ZERO, 'spend': ZERO, 'count': 0, 'opening': opening, 'weighted': ZERO,
+            }
+        month = months[key]
+        if amount > 0:
+            month['credits'] += amount
+        else:
+            month['debits'] -= amount
+            if entry.transaction_type in SPEND_TYPES:
+                month['spend'] -= amount
+        month['count'] += 1
+        month['weighted'] += amount * days_left(day)
+        month['closing'] = entry.balance_after
+
+    for (account_id, first), month in months.items():
+        updated = monthly.filter(account_id=account_id, month=first).update(
+            credits=F('credits') + month['credits'],
+            debits=F('debits') + month['debits'],
+            spend=F('spend') + month['spend'],
+            entry_count=F('entry_count') + month['count'],
+            closing_balance=month['closing'],
+            balance_days=F('balance_days') + month['weighted'],
+        )
+        if not updated:
+            monthly.create(
+                account_id=account_id,
+                month=first,
+                credits=month['credits'],
+                debits=month['debits'],
+                spend=month['spend'],
+                entry_count=month['count'],
+                opening_balance=month['opening'],
+                closing_balance=month['closing'],
+                # Until the first posting the balance sat at the opening one
+                balance_days=month['opening'] * days_in_month(first) + month['weighted'],
+            )
+
+
+def rebuild(account_ids, since, until, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute the rollups of some accounts on one database for the days
+    since..until from the ledger and return the number of rows written.
+
+    A day's closing balance is the balance_after of its last entry, so no
+    earlier history is read. Only run it for completed days; today's rows
+    are still being maintained by record().
+    """
+    days = list(
+        Transaction.objects.using(using)
+        .filter(
+            account_id__in=account_ids,
+            created_at__gte=day_start(since),
+            created_at__lt=day_start(until + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate('created_at'))
+        .values('account_id', 'day')
+        .annotate(
+            credits=Sum('amount', filter=Q(amount__gt=0), default=ZERO),
+            debits=Sum('amount', filter=Q(amount__lt=0), default=ZERO),
+            entry_count=Count('id'),
+            # Postings to an account are serialized by its row lock, so the
+            # highest id is the latest one
+            last_id=Max('id'),
+        )
+        .order_by()
+    )
+    closing = dict(
+        Transaction.objects.using(using).filter(pk__in=[day['last_id'] for day in days])
+        .values_list('id', 'balance_after')
+    )
+    rows = [
+        DailyBalance(
+            account_id=day['account_id'],
+            date=day['day'],
+            credits=day['credits'],
+            debits=-day['debits'],
+            entry_count=day['entry_count'],
+            closing_balance=closing[day['last_id']],
+        )
+        for day in days
+    ]
+
+    with transaction.atomic(using=using):
+        DailyBalance.objects.using(using).filter(account_id__in=account_ids, date__range=(since, until)).delete()
+        DailyBalance.objects.using(using).bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def _balance(account_id, day, before):
+    """
+    Closing balance of the latest rolled-up day before `day`, plus the
+    ledger rows matching `before` posted after that day.
+
+    While rollups are current the days in between had no activity, so the
+    tail only spans `day` itself.
+    """
+    db = replicas.for_read(sharding.locate(account_id))
+    snapshot = (
+        DailyBalance.objects.using(db).filter(account_id=account_id, date__lt=day)
+        .order_by('-date')
+        .values_list('date', 'closing_balance')
+        .first()
+    )
+    tail = Transaction.objects.using(db).filter(before, account_id=account_id)
+    balance = ZERO
+    if snapshot:
+        last_day, balance = snapshot
+        tail = tail.filter(created_at__gte=day_start(last_day + timedelta(days=1)))
+    return balance + tail.aggregate(total=Sum('amount', default=ZERO))['total']
+
+
+def opening_balance(account_id, day):
+    """An account's balance at the start of a day"""
+    return _balance(account_id, day, Q(created_at__lt=day_start(day)))
+
+
+def balance_as_of(account_id, moment):
+    """An account's balance just after `moment`, counting postings made at it"""
+    day = timezone.localdate(moment)
+    return _balance(account_id, day, Q(created_at__lte=moment))
@@ -0,0 +1,46 @@
+# server/api/search.py
+"""
+Searches for users and accounts as support staff type them in the admin.
+
+They only match in ways the indexes from migration 0012 serve: by prefix
+everywhere, and anywhere in the value on PostgreSQL, whose trigram
+indexes take terms of three characters or more. Account jobs replay an
+admin search through these too, so a job selects what the list showed.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from . import identifiers
+from .models import User
+
+# Trigram indexes only narrow a search for terms this long
+TRIGRAM_MIN_LENGTH = 3
+USER_FIELDS = ('email', 'first_name', 'last_name')
+
+
+def _lookup(terms):
+    if connection.vendor == 'postgresql' and terms and min(map(len, terms)) >= TRIGRAM_MIN_LENGTH:
+        return 'icontains'
+    return 'istartswith'
+
+
+def users(queryset, search_term):
+    """Users matching every word of a search in their email or name"""
+    terms = search_term.split()
+    lookup = _lookup(terms)
+    for term in terms:
+        queryset = queryset.filter(Q.create([(f'{field}__{lookup}', term) for field in USER_FIELDS], connector=Q.OR))
+    return queryset
+
+
+def accounts(queryset, search_term):
+    """Account numbers, with or without their prefix; anything else finds the accounts of matching users"""
+    if not search_term.strip():
+        return queryset
+    prefix = identifiers.ACCOUNT_NUMBER_PREFIX
+    term = search_term.strip().upper()
+    if term.isdigit():
+        term = prefix + term
+    if term.startswith(prefix) and term[len(prefix):].isdigit():
+        return queryset.filter(**{f'account_number__{_lookup([term])}': term})
+    return queryset.filter(user__in=users(User.objects.all(), search_term).values('pk'))
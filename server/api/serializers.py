@@ -2,7 +2,23 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from .models import User, Account
+from . import money
+from .metrics import TimedSerializerMixin
+from .models import User, Account, Transaction
+
+
+class MoneyField(serializers.Field):
+    """Minor units on the model, a two-place decimal string in the API"""
+    default_error_messages = {'invalid': 'A valid amount is required.'}
+
+    def to_representation(self, value):
+        return money.to_string(value)
+
+    def to_internal_value(self, data):
+        try:
+            return money.to_minor(data)
+        except ValueError:
+            self.fail('invalid')
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -28,8 +44,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             password=validated_data['password']
         )
         
-        # Create associated account
-        Account.objects.create(user=user)
+        # Create associated account; saving it this way lets the router
+        # place it on its shard
+        Account(user=user).save()
         return user
 
 class UserLoginSerializer(serializers.Serializer):
@@ -52,16 +69,23 @@ class UserLoginSerializer(serializers.Serializer):
         else:
             raise serializers.ValidationError('Must include email and password')
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'date_joined']
         read_only_fields = ['id', 'date_joined']
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    balance = MoneyField()
     
     class Meta:
         model = Account
-        fields = ['id', 'user', 'balance', 'account_number', 'account_type', 'created_at']
-        read_only_fields = ['id', 'user', 'account_number', 'created_at']
\ No newline at end of file
+        fields = ['id', 'user', 'balance', 'account_number', 'account_type', 'frozen', 'created_at']
+        read_only_fields = ['id', 'user', 'account_number', 'frozen', 'created_at']
+
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Transaction
+        fields = ['id', 'entry_id', 'transaction_type', 'amount', 'balance_after', 'created_at']
+        read_only_fields = fields
\ No newline at end of file
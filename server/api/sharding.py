@@ -0,0 +1,303 @@
+# server/api/sharding.py
+"""
+Account sharding.
+
+Accounts live on one of the databases listed in ACCOUNT_SHARDING['SHARDS'],
+picked by a jump consistent hash of the account id, together with
+everything keyed by it: ledger rows, daily and monthly rollups and pending
+cross-shard credits. Users, tokens and the rest stay on the default
+database. With no shards configured every account is on default and none
+of this costs a query.
+
+Code reading or writing account data names the database with .using();
+the helpers below work it out. AccountShardRouter covers what remains,
+such as saving a new account or following a relation from an instance.
+
+To add shards, append them to SHARDS and move the old list to
+PREVIOUS_SHARDS, deploy, run `manage.py rebalance_shards`, then drop
+PREVIOUS_SHARDS. Jump hashing only moves accounts onto the new shards.
+Until then an account is looked for on its new home first and on its
+previous one after that.
+"""
+import hashlib
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import replicas
+
+DEFAULTS = {
+    # Database aliases holding accounts; empty keeps them on default
+    'SHARDS': [],
+    # The SHARDS of the previous layout while accounts are being moved off it
+    'PREVIOUS_SHARDS': [],
+}
+
+# Models stored on account shards, with the attribute holding the account id
+SHARD_KEYS = {
+    'api.account': 'pk',
+    'api.transaction': 'account_id',
+    'api.dailybalance': 'account_id',
+    'api.monthlybalance': 'account_id',
+    'api.pendingcredit': 'source',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ACCOUNT_SHARDING', {})}
+
+
+def shards(config=None):
+    """The databases accounts are spread across"""
+    return (config or get_config())['SHARDS'] or [DEFAULT_DB_ALIAS]
+
+
+def databases():
+    """Every database that may hold accounts right now"""
+    config = get_config()
+    return list(dict.fromkeys([*shards(config), *config['PREVIOUS_SHARDS']]))
+
+
+def is_sharded():
+    """Whether accounts may be anywhere but on default"""
+    return databases() != [DEFAULT_DB_ALIAS]
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping and Veach): a bucket in range(buckets) for a 64-bit key"""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(account_id, layout=None):
+    """The database an account belongs on in a layout, the current one by default"""
+    layout = layout or shards()
+    if len(layout) == 1:
+        return layout[0]
+    if not isinstance(account_id, uuid.UUID):
+        account_id = uuid.UUID(str(account_id))
+    key = int.from_bytes(hashlib.blake2b(account_id.bytes, digest_size=8).digest(), 'big')
+    return layout[jump_hash(key, len(layout))]
+
+
+def _homes(account_id):
+    """(current home, previous home or None if it has not changed)"""
+    config = get_config()
+    home = shard_for(account_id, shards(config))
+    if not config['PREVIOUS_SHARDS']:
+        return home, None
+    previous = shard_for(account_id, config['PREVIOUS_SHARDS'])
+    return home, None if previous == home else previous
+
+
+def locate(account_id):
+    """The database holding an account"""
+    from .models import Account
+
+    home, previous = _homes(account_id)
+    if previous is None or Account.objects.using(home).filter(pk=account_id).exists():
+        return home
+    return previous
+
+
+async def alocate(account_id):
+    """Async version of locate()"""
+    from .models import Account
+
+    home, previous = _homes(account_id)
+    if previous is None or await Account.objects.using(home).filter(pk=account_id).aexists():
+        return home
+    return previous
+
+
+def group(account_ids):
+    """{database: [account ids]} for accounts spread over the shards"""
+    grouped = defaultdict(list)
+    for account_id in account_ids:
+        grouped[locate(account_id)].append(account_id)
+    return grouped
+
+
+def get_account(account_id):
+    """An account and its user, each from its own database or a replica of it"""
+    from .models import Account, User
+
+    db = replicas.for_read(locate(account_id))
+    if replicas.primary_of(db) == DEFAULT_DB_ALIAS:
+        return Account.objects.using(db).select_related('user').get(pk=account_id)
+    account = Account.objects.using(db).get(pk=account_id)
+    account.user = User.objects.get(pk=account.user_id)
+    return account
+
+
+async def aget_account(account_id):
+    """Async version of get_account()"""
+    from .models import Account, User
+
+    db = await replicas.afor_read(await alocate(account_id))
+    if replicas.primary_of(db) == DEFAULT_DB_ALIAS:
+        return await Account.objects.using(db).select_related('user').aget(pk=account_id)
+    account = await Account.objects.using(db).aget(pk=account_id)
+    account.user = await User.objects.aget(pk=account.user_id)
+    return account
+
+
+def account_id_for_user(user_id):
+    """The id of a user's account, searching every shard. Raises Account.DoesNotExist"""
+    from .models import Account
+
+    for db in databases():
+        account_id = Account.objects.using(db).filter(user_id=user_id).values_list('id', flat=True).first()
+        if account_id is not None:
+            return account_id
+    raise Account.DoesNotExist()
+
+
+async def aaccount_id_for_user(user_id):
+    """Async version of account_id_for_user()"""
+    from .models import Account
+
+    for db in databases():
+        account_id = await Account.objects.using(db).filter(user_id=user_id).values_list('id', flat=True).afirst()
+        if account_id is not None:
+            return account_id
+    raise Account.DoesNotExist()
+
+
+def find_accounts(numbers):
+    """{account number: account id} for the numbers that exist on any shard"""
+    from .models import Account
+
+    found = {}
+    for db in databases():
+        missing = set(numbers) - found.keys()
+        if not missing:
+            break
+        found.update(
+            Account.objects.using(db).filter(account_number__in=missing).values_list('account_number', 'id')
+        )
+    return found
+
+
+def transactions(account_id):
+    """Ledger rows of an account, on its shard or a replica of it"""
+    from .models import Transaction
+
+    return Transaction.objects.using(replicas.for_read(locate(account_id))).filter(account_id=account_id)
+
+
+async def atransactions(account_id):
+    """Async version of transactions()"""
+    from .models import Transaction
+
+    return Transaction.objects.using(await replicas.afor_read(await alocate(account_id))).filter(account_id=account_id)
+
+
+def _copy(queryset, target, batch_size=1000):
+    """
+    Insert the rows of a queryset into another database under fresh ids.
+    Primary keys are only unique per database, so the source's could
+    already be taken on the target.
+    """
+    rows = []
+    for row in queryset.iterator(chunk_size=batch_size):
+        row.pk = None
+        row._state.adding = True
+        rows.append(row)
+        if len(rows) == batch_size:
+            queryset.model.objects.using(target).bulk_create(rows)
+            rows = []
+    queryset.model.objects.using(target).bulk_create(rows)
+
+
+def move_accounts(account_ids, source, target):
+    """
+    Move accounts, with their ledgers, rollups and pending credits, from
+    one database to another and return how many moved.
+
+    The accounts stay locked on the source until their rows are committed
+    on the target and deleted from the source, so a posting that found an
+    account on the source waits, misses it and retries on the target (see
+    api.ledger). Accounts already on the target, copied by a run that
+    was interrupted before deleting them, are only deleted from the source.
+    """
+    from .models import Account, DailyBalance, MonthlyBalance, PendingCredit, Transaction
+
+    with transaction.atomic(using=source):
+        accounts = list(
+            Account.objects.using(source).select_for_update().filter(pk__in=account_ids).order_by('pk')
+        )
+        ids = [account.pk for account in accounts]
+        with transaction.atomic(using=target):
+            copied = set(Account.objects.using(target).filter(pk__in=ids).values_list('pk', flat=True))
+            fresh = [pk for pk in ids if pk not in copied]
+            for account in accounts:
+                account._state.adding = True
+            Account.objects.using(target).bulk_create([account for account in accounts if account.pk in fresh])
+            # Ledger rows get new ids in ledger order; their entry_id, which
+            # history cursors and clients refer to, is copied unchanged
+            _copy(Transaction.objects.using(source).filter(account_id__in=fresh).order_by('created_at', 'id'), target)
+            _copy(DailyBalance.objects.using(source).filter(account_id__in=fresh).order_by('id'), target)
+            _copy(MonthlyBalance.objects.using(source).filter(account_id__in=fresh).order_by('id'), target)
+            _copy(PendingCredit.objects.using(source).filter(source__in=fresh).order_by('id'), target)
+
+        PendingCredit.objects.using(source).filter(source__in=ids).delete()
+        DailyBalance.objects.using(source).filter(account_id__in=ids).delete()
+        MonthlyBalance.objects.using(source).filter(account_id__in=ids).delete()
+        Transaction.objects.using(source).filter(account_id__in=ids).delete()
+        Account.objects.using(source).filter(pk__in=ids).delete()
+    return len(ids)
+
+
+class AccountShardRouter:
+    """
+    Sends account data to its shard when a query does not say where to go.
+
+    Only decides when given an instance: the one being saved, or the one a
+    related object is being read from. Queries without one fall through to
+    default, so anything reading account data on its own uses .using().
+    """
+
+    def _db_for(self, model, instance):
+        if instance is None or not is_sharded():
+            return None
+        instance_key = SHARD_KEYS.get(instance._meta.label_lower)
+        model_key = SHARD_KEYS.get(model._meta.label_lower)
+        if model_key is None:
+            # Such as account.user: never follow the account onto its shard
+            return DEFAULT_DB_ALIAS if instance_key else None
+        if instance_key is None:
+            # The reverse accessor user.account
+            from .models import Account, User
+
+            if not isinstance(instance, User):
+                return None
+            try:
+                return locate(account_id_for_user(instance.pk))
+            except Account.DoesNotExist:
+                return None
+        if instance_key == 'pk' and instance._state.adding:
+            # A new account goes to its home, whichever database assigning
+            # its user left in _state.db
+            return shard_for(instance.pk)
+        if instance._state.db:
+            return instance._state.db
+        return locate(getattr(instance, instance_key))
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Accounts reference users on another database by id
+        if obj1._meta.label_lower in SHARD_KEYS or obj2._meta.label_lower in SHARD_KEYS:
+            return True
+        return None
@@ -0,0 +1,23 @@
+# server/api/signals.py
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .authentication import restore_users, revoke_user
+from .db import apply_sqlite_pragmas
+from .metrics import install_query_recorder
+from .models import User
+
+connection_created.connect(apply_sqlite_pragmas, dispatch_uid='api.db.apply_sqlite_pragmas')
+connection_created.connect(install_query_recorder, dispatch_uid='api.metrics.install_query_recorder')
+
+
+@receiver(post_save, sender=User)
+def revoke_deactivated_user(sender, instance, update_fields=None, **kwargs):
+    """Stop stateless tokens of a deactivated user from authenticating, and restore them on reactivation"""
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    if not instance.is_active:
+        revoke_user(instance.pk)
+    else:
+        restore_users([instance.pk])
@@ -0,0 +1,139 @@
+# server/api/snapshots.py
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+
+from . import replicas, sharding
+from .checks import is_process_local
+from .fast_serializers import account_payload
+
+# Seconds a snapshot is kept in a process-local cache, which invalidations
+# made by the other workers never reach
+PROCESS_LOCAL_TTL = 1
+
+
+def _alias():
+    return getattr(settings, 'ACCOUNT_SNAPSHOT_CACHE', 'default')
+
+
+def _cache():
+    return caches[_alias()]
+
+
+def _ttl():
+    ttl = getattr(settings, 'ACCOUNT_SNAPSHOT_TTL', 300)
+    if is_process_local(_alias()):
+        return min(ttl, PROCESS_LOCAL_TTL)
+    return ttl
+
+
+def _ttl_for(account):
+    """
+    How long to keep a snapshot. One read from a replica may predate a
+    posting whose invalidation it then outlives, so it is kept no longer
+    than a usable replica can lag.
+    """
+    if replicas.primary_of(account._state.db) != account._state.db:
+        return min(_ttl(), replicas.get_config()['MAX_LAG'])
+    return _ttl()
+
+
+def _account_id_key(user_id):
+    return f'account-id:{user_id}'
+
+
+def _version_key(account_id):
+    return f'account-snapshot-version:{account_id}'
+
+
+def _snapshot_key(account_id, version):
+    return f'account-snapshot:{account_id}:v{version}'
+
+
+def render(account):
+    """Render an account exactly as GET /api/account/ returns it"""
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]().render(account_payload(account))
+
+
+def get_account_id(user_id):
+    """Map a user to their account id; the link never changes once created"""
+    cache = _cache()
+    key = _account_id_key(user_id)
+    account_id = cache.get(key)
+    if account_id is None:
+        account_id = sharding.account_id_for_user(user_id)
+        cache.set(key, account_id, None)
+    return account_id
+
+
+async def aget_account_id(user_id):
+    """Async version of get_account_id()"""
+    cache = _cache()
+    key = _account_id_key(user_id)
+    account_id = await cache.aget(key)
+    if account_id is None:
+        account_id = await sharding.aaccount_id_for_user(user_id)
+        await cache.aset(key, account_id, None)
+    return account_id
+
+
+def _current_version(cache, account_id):
+    key = _version_key(account_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed evicted or new counters from the clock so a version number is
+        # never reused while an older snapshot under it may still be cached
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get(account_id):
+    """
+    Return the pre-rendered JSON bytes for an account.
+
+    The version is read before the database, so a snapshot built while a
+    posting commits is stored under the old version and never served after
+    invalidate() bumps it. Raises Account.DoesNotExist.
+    """
+    cache = _cache()
+    key = _snapshot_key(account_id, _current_version(cache, account_id))
+    payload = cache.get(key)
+    if payload is None:
+        account = sharding.get_account(account_id)
+        payload = render(account)
+        cache.set(key, payload, _ttl_for(account))
+    return payload
+
+
+async def _acurrent_version(cache, account_id):
+    key = _version_key(account_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+async def aget(account_id):
+    """Async version of get(); only builds the snapshot through the ORM on a miss"""
+    cache = _cache()
+    key = _snapshot_key(account_id, await _acurrent_version(cache, account_id))
+    payload = await cache.aget(key)
+    if payload is None:
+        account = await sharding.aget_account(account_id)
+        payload = render(account)
+        await cache.aset(key, payload, _ttl_for(account))
+    return payload
+
+
+def invalidate(account_id):
+    """Retire the current snapshot of an account after its balance changed"""
+    cache = _cache()
+    key = _version_key(account_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
@@ -0,0 +1,179 @@
+# server/api/statements.py
+import csv
+from datetime import date, timedelta
+
+from . import rollups
+from .exports import EXPORT_FIELDS, Echo, _rows
+from .models import Transaction
+
+# A4 in points, with Courier at 9pt on a 12pt leading
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+LINES_PER_PAGE = 60
+
+
+def month_bounds(month):
+    """First and last day of a 'YYYY-MM' month, or raise ValueError"""
+    year, number = (int(part) for part in month.split('-'))
+    first = date(year, number, 1)
+    following = date(year + number // 12, number % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+
+class Statement:
+    """
+    One account's postings between two days, inclusive.
+
+    The opening balance costs one rollup lookup plus a short ledger tail;
+    entries are read lazily and the totals are accumulated while they are
+    rendered, so memory stays flat however busy the period was.
+    """
+
+    def __init__(self, account, start, end):
+        self.account = account
+        self.start = start
+        self.end = end
+        self.opening_balance = rollups.opening_balance(account.pk, start)
+        self.credits = rollups.ZERO
+        self.debits = rollups.ZERO
+
+    @property
+    def closing_balance(self):
+        return self.opening_balance + self.credits - self.debits
+
+    def entries(self):
+        """Yield (id, entry_id, type, amount, balance_after, created_at) in posting order"""
+        queryset = Transaction.objects.using(self.account._state.db).filter(
+            account_id=self.account.pk,
+            created_at__gte=rollups.day_start(self.start),
+            created_at__lt=rollups.day_start(self.end + timedelta(days=1)),
+        )
+        for row in _rows(queryset):
+            amount = row[3]
+            if amount > 0:
+                self.credits += amount
+            else:
+                self.debits -= amount
+            yield row
+
+    def header(self):
+        user = self.account.user
+        return [
+            ['Account', self.account.account_number],
+            ['Holder', f'{user.first_name} {user.last_name}'],
+            ['Period', self.start.isoformat(), self.end.isoformat()],
+            ['Opening balance', self.opening_balance],
+        ]
+
+    def footer(self):
+        return [
+            ['Credits', self.credits],
+            ['Debits', self.debits],
+            ['Closing balance', self.closing_balance],
+        ]
+
+
+def stream_csv(statement):
+    """Yield a statement as CSV lines"""
+    writer = csv.writer(Echo())
+    for row in statement.header():
+        yield writer.writerow(row)
+    yield writer.writerow([])
+    yield writer.writerow(EXPORT_FIELDS)
+    for pk, entry_id, transaction_type, amount, balance_after, created_at in statement.entries():
+        yield writer.writerow([pk, entry_id, transaction_type, amount, balance_after, created_at.isoformat()])
+    yield writer.writerow([])
+    for row in statement.footer():
+        yield writer.writerow(row)
+
+
+def _text_lines(statement):
+    for label, *values in statement.header():
+        yield f"{label + ':':<17}{' '.join(str(value) for value in values)}"
+    yield ''
+    yield f"{'Date':<18}{'Type':<14}{'Amount':>14}{'Balance':>14}"
+    for _, _, transaction_type, amount, balance_after, created_at in statement.entries():
+        yield f"{created_at:%Y-%m-%d %H:%M}  {transaction_type:<14}{amount:>14}{balance_after:>14}"
+    yield ''
+    for label, value in statement.footer():
+        yield f"{label + ':':<17}{value}"
+
+
+class PDFWriter:
+    """
+    Writes a plain-text PDF one page at a time.
+
+    Objects 1-3 are the catalog, the page tree and the font. The page tree
+    lists every page, so it is written last; the cross-reference table only
+    needs each object's byte offset, which is known as pages are emitted.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.pages = []
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, number, body):
+        self.offsets[number] = self.offset
+        return self._emit(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def start(self):
+        return (
+            self._emit(b'%PDF-1.4\n')
+            + self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+            + self._object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>')
+        )
+
+    def page(self, lines):
+        content_id = 4 + 2 * len(self.pages)
+        page_id = content_id + 1
+        self.pages.append(page_id)
+        text = b''.join(b'(%s) \'\n' % _pdf_string(line) for line in lines)
+        stream = b'BT\n/F1 9 Tf\n12 TL\n%d %d Td\n%sET' % (MARGIN, PAGE_HEIGHT - MARGIN, text)
+        return (
+            self._object(content_id, b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+            + self._object(page_id, (
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+            ) % (PAGE_WIDTH, PAGE_HEIGHT, content_id))
+        )
+
+    def finish(self):
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.pages)
+        data = self._object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.pages)))
+        size = len(self.offsets) + 1
+        xref_offset = self.offset
+        xref = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        xref += [b'%010d 00000 n \n' % self.offsets[number] for number in range(1, size)]
+        xref.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_offset))
+        return data + self._emit(b''.join(xref))
+
+
+def _pdf_string(line):
+    line = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return line.encode('latin-1', errors='replace')
+
+
+def stream_pdf(statement):
+    """Yield a statement as a PDF, one page per chunk"""
+    writer = PDFWriter()
+    yield writer.start()
+    lines = []
+    for line in _text_lines(statement):
+        lines.append(line)
+        if len(lines) == LINES_PER_PAGE:
+            yield writer.page(lines)
+            lines = []
+    if lines or not writer.pages:
+        yield writer.page(lines)
+    yield writer.finish()
+
+
+FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'pdf': ('application/pdf', stream_pdf),
+}
@@ -1,3 +1,1393 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import (
+    admin as api_admin, analytics, async_views, batching, checks as api_checks, events, identifiers, jobs, ledger,
+    metrics, money, reconciliation, replicas, rollups, sharding, snapshots, throttling, tokens, transfers,
+)
+from .authentication import tokens_for_user
+from .fast_serializers import account_payload, user_payload
+from .idempotency import CacheStore, get_store
+from .management.commands import import_customers
+from .models import (
+    User, Account, AccountJob, DailyBalance, MonthlyBalance, PendingCredit, ReplicationHeartbeat, Transaction,
+)
+from .serializers import AccountSerializer, UserSerializer
+
+
+def make_account(email='jane@example.com', balance=0):
+    user = User.objects.create_user(
+        email=email, first_name='Jane', last_name='Doe', password='s3cure-Passw0rd'
+    )
+    return Account.objects.create(user=user, balance=balance)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.account = make_account()
+
+    def test_deposit_updates_balance_and_writes_entry(self):
+        entry = ledger.deposit(self.account.pk, 1050)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 1050)
+        self.assertEqual(entry.amount, Decimal('10.50'))
+        self.assertEqual(entry.balance_after, Decimal('10.50'))
+
+    def test_withdraw_rejects_overdraft(self):
+        ledger.deposit(self.account.pk, 500)
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.withdraw(self.account.pk, 600)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 500)
+        self.assertEqual(self.account.transactions.count(), 1)
+
+    def test_set_balance_records_difference(self):
+        ledger.deposit(self.account.pk, 2000)
+        entry = ledger.set_balance(self.account.pk, 1500)
+        self.assertEqual(entry.transaction_type, Transaction.ADJUSTMENT)
+        self.assertEqual(entry.amount, Decimal('-5.00'))
+
+
+class MoneyTests(TestCase):
+    def test_amounts_parse_to_exact_minor_units(self):
+        cases = [('10.50', 1050), ('0.1', 10), (7, 700), (0.1 + 0.2, 30), ('12.345', 1234), ('1e2', 10000)]
+        for value, minor in cases:
+            self.assertEqual(money.to_minor(value), minor)
+        for value in ['abc', 'NaN', 'Infinity', True, None, '99999999999']:
+            with self.assertRaises(ValueError):
+                money.to_minor(value)
+        self.assertEqual([money.to_string(minor) for minor in (0, 5, -150)], ['0.00', '0.05', '-1.50'])
+        self.assertEqual(money.to_decimal(1050), Decimal('10.50'))
+
+    def test_batch_parse_matches_single_parse(self):
+        values = ['1', '2.5', '3.05', 4]
+        self.assertEqual(money.parse_amounts(values), [100, 250, 305, 400])
+        values += ['0', '-1', 'x', None, '0.001', '1\n2']
+        for value, outcome in zip(values, money.parse_amounts(values)):
+            try:
+                expected = money.parse_amount(value)
+            except ValueError as e:
+                self.assertEqual(str(outcome), str(e))
+            else:
+                self.assertEqual(outcome, expected)
+
+    def test_views_validate_amounts_the_same_way(self):
+        account = make_account()
+        client = APIClient()
+        client.force_authenticate(account.user)
+        for amount, error in [('', 'Amount is required'), ('abc', 'Invalid amount'), ('0.001', 'Amount must be positive')]:
+            response = client.post('/api/account/deposit/', {'amount': amount}, format='json')
+            self.assertEqual(response.data['error'], error)
+        for _ in range(3):
+            client.post('/api/account/deposit/', {'amount': 0.1}, format='json')
+        response = client.patch('/api/account/balance/', {'balance': '-1'}, format='json')
+        self.assertEqual(response.data['error'], 'Balance cannot be negative')
+        response = client.post('/api/account/withdraw/', {'amount': '0.30'}, format='json')
+        self.assertEqual(response.data['account']['balance'], '0.00')
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    """Hammer one account from many threads and check no update is lost"""
+    workers = 8
+    postings_per_worker = 25
+
+    def _run(self, fn):
+        try:
+            fn()
+        finally:
+            connections.close_all()
+
+    def test_concurrent_postings_do_not_lose_updates(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite cannot be shared across threads')
+        account = make_account(balance=0)
+
+        def work(i):
+            for _ in range(self.postings_per_worker):
+                ledger.deposit(account.pk, 200)
+                try:
+                    ledger.withdraw(account.pk, 100)
+                except ledger.InsufficientFunds:
+                    pass
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            list(pool.map(lambda i: self._run(lambda: work(i)), range(self.workers)))
+
+        account.refresh_from_db()
+        total = sum(account.transactions.values_list('amount', flat=True))
+        self.assertEqual(money.to_decimal(account.balance), total)
+        self.assertEqual(account.balance, self.workers * self.postings_per_worker * 100)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        get_store().clear()
+        self.account = make_account()
+        self.client = APIClient()
+        self.client.force_authenticate(self.account.user)
+
+    def test_replay_returns_stored_response_without_posting(self):
+        first = self.client.post(
+            '/api/account/deposit/', {'amount': '25'}, format='json',
+            HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        second = self.client.post(
+            '/api/account/deposit/', {'amount': '25'}, format='json',
+            HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.account.transactions.count(), 1)
+
+    def test_key_reuse_with_different_body_is_rejected(self):
+        self.client.post(
+            '/api/account/deposit/', {'amount': '25'}, format='json',
+            HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        response = self.client.post(
+            '/api/account/deposit/', {'amount': '30'}, format='json',
+            HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_key_claimed_by_another_worker_is_not_run_twice(self):
+        store = CacheStore()
+        self.addCleanup(store.clear)
+        key = f'idempotency:{self.account.user.pk}:/api/account/deposit/:abc'
+        # As if another worker were still running the same request
+        self.assertTrue(store.claim(key, 60))
+        with mock.patch('api.idempotency._store', store):
+            response = self.client.post(
+                '/api/account/deposit/', {'amount': '25'}, format='json',
+                HTTP_IDEMPOTENCY_KEY='abc'
+            )
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(self.account.transactions.count(), 0)
+
+            store.release(key)
+            response = self.client.post(
+                '/api/account/deposit/', {'amount': '25'}, format='json',
+                HTTP_IDEMPOTENCY_KEY='abc'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.account.transactions.count(), 1)
+        self.assertIsNone(store.cache.get(f'{key}:lock'))
+
+
+class TransactionHistoryTests(TestCase):
+    def setUp(self):
+        self.account = make_account()
+        self.client = APIClient()
+        self.client.force_authenticate(self.account.user)
+        for amount in range(1, 6):
+            ledger.deposit(self.account.pk, amount * 100)
+
+    def test_cursor_walks_every_entry_once(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/account/transactions/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['amount'] for row in response.data['transactions']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, ['5.00', '4.00', '3.00', '2.00', '1.00'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/account/transactions/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_streams_ndjson(self):
+        response = self.client.get('/api/account/transactions/export/', {'output': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['amount'] for line in lines], ['1.00', '2.00', '3.00', '4.00', '5.00'])
+
+
+class AccountSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = make_account()
+        self.client = APIClient()
+        self.client.force_authenticate(self.account.user)
+
+    def test_hit_is_served_without_queries(self):
+        first = self.client.get('/api/account/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/account/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(json.loads(second.content)['account_number'], self.account.account_number)
+
+    def test_posting_invalidates_snapshot(self):
+        self.client.get('/api/account/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/account/deposit/', {'amount': '12.34'}, format='json')
+        response = self.client.get('/api/account/')
+        self.assertEqual(json.loads(response.content)['balance'], '12.34')
+
+    def test_process_local_snapshots_expire_quickly(self):
+        # Other workers' invalidations never reach a per-process cache
+        self.assertEqual(snapshots._ttl(), snapshots.PROCESS_LOCAL_TTL)
+        self.assertIn('api.W002', [w.id for w in api_checks.check_shared_caches(None)])
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            CACHES={
+                **settings.CACHES,
+                'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp},
+            },
+            ACCOUNT_SNAPSHOT_CACHE='shared',
+        ):
+            self.assertEqual(snapshots._ttl(), settings.ACCOUNT_SNAPSHOT_TTL)
+            self.assertNotIn('api.W002', [w.id for w in api_checks.check_shared_caches(None)])
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Every test logs the same user in
+        throttling.get_store().clear()
+        self.addCleanup(throttling.get_store().clear)
+        self.account = make_account()
+        response = self.client.post(
+            '/api/auth/login/',
+            {'email': 'jane@example.com', 'password': 's3cure-Passw0rd'},
+            content_type='application/json'
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['tokens']['access']}"}
+
+    def shared_revocations(self):
+        """Revocations in a cache every worker on the host reads"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        caches = {
+            **settings.CACHES,
+            'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp.name},
+        }
+        return override_settings(CACHES=caches, REVOKED_USERS_CACHE='shared')
+
+    def test_cached_account_read_runs_no_queries(self):
+        with self.shared_revocations():
+            self.client.get('/api/account/', **self.auth)
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/account/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_process_local_revocations_check_the_user_row(self):
+        self.client.get('/api/account/', **self.auth)
+        with self.assertNumQueries(1):
+            self.client.get('/api/account/', **self.auth)
+        self.assertIn('api.W001', [w.id for w in api_checks.check_shared_caches(None)])
+        # Deactivated without any signal, in another worker or not
+        User.objects.filter(pk=self.account.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/account/', **self.auth).status_code, 401)
+
+    def test_profile_loads_user_lazily(self):
+        with self.shared_revocations():
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/auth/profile/', **self.auth)
+        self.assertEqual(response.json()['email'], 'jane@example.com')
+
+    def test_deactivated_user_is_rejected(self):
+        with self.shared_revocations():
+            self.assertNotIn('api.W001', [w.id for w in api_checks.check_shared_caches(None)])
+            user = self.account.user
+            user.is_active = False
+            user.save()
+            response = self.client.get('/api/account/', **self.auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_bulk_deactivation_revokes(self):
+        with self.shared_revocations():
+            User.objects.filter(email='jane@example.com').update(is_active=False)
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/account/', **self.auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_reactivation_restores_tokens(self):
+        with self.shared_revocations():
+            user = self.account.user
+            user.is_active = False
+            user.save()
+            user.is_active = True
+            user.save()
+            self.assertEqual(self.client.get('/api/account/', **self.auth).status_code, 200)
+
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            self.assertEqual(self.client.get('/api/account/', **self.auth).status_code, 401)
+            User.objects.filter(pk=user.pk).update(is_active=True)
+            self.assertEqual(self.client.get('/api/account/', **self.auth).status_code, 200)
+
+
+class PasswordPolicyTests(TestCase):
+    def test_login_upgrades_legacy_hash(self):
+        account = make_account()
+        user = account.user
+        user.password = make_password('s3cure-Passw0rd', hasher='pbkdf2_sha256')
+        user.save()
+
+        response = self.client.post(
+            '/api/auth/login/',
+            {'email': 'jane@example.com', 'password': 's3cure-Passw0rd'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).algorithm, get_hasher().algorithm)
+        self.assertTrue(user.check_password('s3cure-Passw0rd'))
+
+    def test_wrong_password_is_rejected(self):
+        make_account()
+        response = self.client.post(
+            '/api/auth/login/',
+            {'email': 'jane@example.com', 'password': 'wrong'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class IdentifierTests(TestCase):
+    def register(self, email):
+        return self.client.post('/api/auth/register/', {
+            'email': email,
+            'first_name': 'John',
+            'last_name': 'Smith',
+            'password': 's3cure-Passw0rd',
+            'password_confirm': 's3cure-Passw0rd',
+        }, content_type='application/json')
+
+    def test_usernames_get_increasing_suffixes(self):
+        for i in range(3):
+            self.assertEqual(self.register(f'john{i}@example.com').status_code, 201)
+        usernames = User.objects.order_by('date_joined').values_list('username', flat=True)
+        self.assertEqual(list(usernames), ['johnsmith', 'johnsmith1', 'johnsmith2'])
+
+    def test_registration_cost_does_not_grow_with_name_popularity(self):
+        self.register('john0@example.com')
+        with CaptureQueriesContext(connection) as second:
+            self.register('john1@example.com')
+        for i in range(2, 6):
+            self.register(f'john{i}@example.com')
+        with CaptureQueriesContext(connection) as later:
+            self.register('john6@example.com')
+        self.assertEqual(len(later), len(second))
+
+    def test_collision_with_legacy_username_is_retried(self):
+        User.objects.create_user(
+            email='legacy@example.com', first_name='Legacy', last_name='User', password='x'
+        )
+        User.objects.filter(email='legacy@example.com').update(username='johnsmith')
+        self.assertEqual(self.register('john@example.com').status_code, 201)
+        self.assertEqual(User.objects.get(email='john@example.com').username, 'johnsmith1')
+
+    def test_account_numbers_carry_a_check_digit(self):
+        account = make_account()
+        self.assertTrue(identifiers.is_valid_account_number(account.account_number))
+        self.assertEqual(len(account.account_number), 12)
+
+
+class ImportCustomersTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_imports_valid_rows_and_resumes_from_checkpoint(self):
+        path = self.write('customers.csv', (
+            'email,first_name,last_name,password,balance\n'
+            'a@example.com,Ann,Lee,pw-one-1234,10.00\n'
+            'not-an-email,Bad,Row,pw,0\n'
+            'b@example.com,Ann,Lee,,0\n'
+        ))
+        call_command('import_customers', path, workers=1, chunk_size=2, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(User.objects.count(), 2)
+        ann = User.objects.get(email='a@example.com')
+        self.assertTrue(ann.check_password('pw-one-1234'))
+        self.assertEqual(ann.account.balance, 1000)
+        self.assertEqual(ann.account.transactions.get().amount, Decimal('10.00'))
+        self.assertEqual(User.objects.get(email='b@example.com').username, 'annlee1')
+
+        with open(path, 'a') as f:
+            f.write('c@example.com,Cy,Park,pw-three-1234,0\n')
+        call_command('import_customers', path, workers=1, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_opening_balances_are_rolled_up(self):
+        path = self.write('customers.csv', 'email,first_name,last_name,balance\na@example.com,Ann,Lee,100.00\n')
+        call_command('import_customers', path, workers=1, stdout=StringIO(), stderr=StringIO())
+        account = Account.objects.get(user__email='a@example.com')
+        rollup = DailyBalance.objects.get(account=account)
+        self.assertEqual((rollup.credits, rollup.closing_balance), (Decimal('100.00'), Decimal('100.00')))
+        self.assertEqual(rollups.balance_as_of(account.pk, timezone.now()), Decimal('100.00'))
+
+    def test_rows_with_values_that_are_not_text_are_reported(self):
+        path = self.write('customers.ndjson', (
+            '{"email": "a@example.com", "first_name": "Ann", "last_name": "Lee"}\n'
+            '{"email": "b@example.com", "first_name": 7, "last_name": null}\n'
+            '{"email": ["c@example.com"], "first_name": "Cy", "last_name": "Park", "password": 1234}\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_customers', path, workers=1, stdout=out, stderr=err)
+        self.assertIn('1 imported, 2 skipped', out.getvalue())
+        self.assertIn('line 2: first_name must be text', err.getvalue())
+        self.assertIn('line 3: email, password must be text', err.getvalue())
+
+    def test_emails_registered_during_the_import_are_skipped(self):
+        path = self.write('customers.csv', (
+            'email,first_name,last_name,balance\n'
+            'a@example.com,Ann,Lee,10.00\n'
+            'b@example.com,Bo,Kim,0\n'
+        ))
+
+        class RegisteringPool(ThreadPoolExecutor):
+            def map(self, *args, **kwargs):
+                # After the chunk was checked for registered emails
+                make_account('b@example.com')
+                return super().map(*args, **kwargs)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(import_customers, 'ProcessPoolExecutor', RegisteringPool):
+            call_command('import_customers', path, workers=1, stdout=out, stderr=err)
+        self.assertIn('1 imported, 1 skipped', out.getvalue())
+        self.assertIn('b@example.com: already exists', err.getvalue())
+        self.assertEqual(User.objects.get(email='a@example.com').account.balance, 1000)
+        self.assertEqual(User.objects.get(email='b@example.com').first_name, 'Jane')
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.source = make_account(balance=10000)
+        self.other = make_account(email='sam@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.source.user)
+
+    def test_batch_reports_per_item_results(self):
+        response = self.client.post('/api/account/transfers/', {'transfers': [
+            {'to_account': self.other.account_number, 'amount': '60'},
+            {'to_account': self.other.account_number, 'amount': '60'},
+            {'to_account': 'NB0000000000', 'amount': '1'},
+            {'to_account': self.other.account_number, 'amount': '-5'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['status'], r.get('error')) for r in response.data['results']],
+            [('completed', None), ('failed', 'Insufficient balance'),
+             ('failed', 'Account not found'), ('failed', 'Amount must be positive')]
+        )
+        self.source.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.source.balance, 4000)
+        self.assertEqual(self.other.balance, 6000)
+        entry = self.other.transactions.get()
+        self.assertEqual(entry.counterparty_id, self.source.pk)
+        self.assertEqual(entry.transaction_type, Transaction.TRANSFER_IN)
+
+    def test_single_transfer(self):
+        response = self.client.post('/api/account/transfers/', {
+            'to_account': self.other.account_number, 'amount': '10'
+        }, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'completed')
+        self.assertEqual(response.data['balance'], '90.00')
+
+
+
+class DailyBalanceTests(TestCase):
+    def setUp(self):
+        self.account = make_account()
+
+    def post(self, when, amount):
+        balance = self.account.balance + money.to_minor(amount)
+        Account.objects.filter(pk=self.account.pk).update(balance=balance)
+        self.account.balance = balance
+        Transaction.objects.create(
+            account=self.account, transaction_type=Transaction.ADJUSTMENT,
+            amount=Decimal(amount), balance_after=money.to_decimal(balance), created_at=when,
+        )
+
+    def test_postings_keep_todays_rollup_current(self):
+        ledger.deposit(self.account.pk, 1000)
+        ledger.withdraw(self.account.pk, 300)
+        rollup = DailyBalance.objects.get(account=self.account)
+        self.assertEqual(
+            (rollup.credits, rollup.debits, rollup.entry_count, rollup.closing_balance),
+            (Decimal('10.00'), Decimal('3.00'), 2, Decimal('7.00'))
+        )
+
+    def test_rollup_job_rebuilds_days_and_serves_as_of_queries(self):
+        self.post(datetime(2025, 1, 5, 9, tzinfo=dt_timezone.utc), '100.00')
+        self.post(datetime(2025, 2, 3, 9, tzinfo=dt_timezone.utc), '-30.00')
+        self.post(datetime(2025, 2, 3, 17, tzinfo=dt_timezone.utc), '5.00')
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command(
+                'rollup_balances', since=date(2025, 1, 1), until=date(2025, 2, 28),
+                checkpoint=os.path.join(tmp, 'checkpoint'), stdout=StringIO()
+            )
+        self.assertEqual(
+            list(DailyBalance.objects.order_by('date').values_list('date', 'entry_count', 'closing_balance')),
+            [(date(2025, 1, 5), 1, Decimal('100.00')), (date(2025, 2, 3), 2, Decimal('75.00'))]
+        )
+        # One rollup lookup and one aggregate over the day's tail
+        with self.assertNumQueries(2):
+            balance = rollups.balance_as_of(self.account.pk, datetime(2025, 2, 3, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(balance, Decimal('70.00'))
+        self.assertEqual(rollups.opening_balance(self.account.pk, date(2025, 2, 1)), Decimal('100.00'))
+
+    def test_statement_downloads(self):
+        self.post(datetime(2025, 1, 5, 9, tzinfo=dt_timezone.utc), '100.00')
+        self.post(datetime(2025, 2, 3, 9, tzinfo=dt_timezone.utc), '-30.00')
+        client = APIClient()
+        client.force_authenticate(self.account.user)
+
+        response = client.get('/api/account/statement/', {'month': '2025-02'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertIn('Opening balance,100.00', lines)
+        self.assertIn('Debits,30.00', lines)
+        self.assertIn('Closing balance,70.00', lines)
+
+        response = client.get('/api/account/statement/', {'month': '2025-02', 'output': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+        self.assertIn(b'Closing balance: 70.00', pdf)
+
+        response = client.get('/api/account/balance/as-of/', {'at': '2025-01-31'})
+        self.assertEqual(response.data['balance'], '100.00')
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.account = make_account()
+        self.client = APIClient()
+        self.client.force_authenticate(self.account.user)
+
+    def post(self, when, amount, transaction_type):
+        """A posting made at `when`, rolled up as the ledger does"""
+        balance = self.account.balance + money.to_minor(amount)
+        Account.objects.filter(pk=self.account.pk).update(balance=balance)
+        self.account.balance = balance
+        entry = Transaction.objects.create(
+            account=self.account, transaction_type=transaction_type,
+            amount=Decimal(amount), balance_after=money.to_decimal(balance), created_at=when,
+        )
+        rollups.record([entry])
+
+    def summaries(self):
+        return (
+            list(DailyBalance.objects.order_by('date').values_list(
+                'date', 'credits', 'debits', 'entry_count', 'closing_balance'
+            )),
+            list(MonthlyBalance.objects.order_by('month').values_list(
+                'month', 'credits', 'debits', 'spend', 'entry_count', 'opening_balance', 'closing_balance',
+                'balance_days',
+            )),
+        )
+
+    def test_monthly_buckets_come_from_summaries(self):
+        self.post(datetime(2025, 1, 5, 9, tzinfo=dt_timezone.utc), '100.00', Transaction.DEPOSIT)
+        self.post(datetime(2025, 1, 20, 9, tzinfo=dt_timezone.utc), '-40.00', Transaction.WITHDRAWAL)
+        self.post(datetime(2025, 3, 10, 9, tzinfo=dt_timezone.utc), '-10.00', Transaction.ADJUSTMENT)
+        self.post(datetime(2025, 3, 10, 12, tzinfo=dt_timezone.utc), '20.00', Transaction.TRANSFER_IN)
+
+        # The last summary before the range and the ones in it
+        with self.assertNumQueries(2):
+            buckets = analytics.months(self.account.pk, date(2025, 1, 1), date(2025, 3, 1))
+        self.assertEqual(
+            [(b['period'], b['inflow'], b['outflow'], b['spend'], b['closing_balance'], b['average_balance'])
+             for b in buckets],
+            [
+                # 4 days at 0, 15 at 100 and 12 at 60, over 31
+                ('2025-01', '100.00', '40.00', '40.00', '60.00', '71.61'),
+                ('2025-02', '0.00', '0.00', '0.00', '60.00', '60.00'),
+                # Adjustments are not spend
+                ('2025-03', '20.00', '10.00', '0.00', '70.00', '67.10'),
+            ]
+        )
+        response = self.client.get('/api/account/analytics/', {'since': '2025-02', 'until': '2025-03'})
+        self.assertEqual(response.data['buckets'], buckets[1:])
+
+        response = self.client.get(
+            '/api/account/analytics/', {'interval': 'day', 'since': '2025-03-09', 'until': '2025-03-11'}
+        )
+        self.assertEqual(
+            [(b['period'], b['opening_balance'], b['net'], b['entry_count']) for b in response.data['buckets']],
+            [('2025-03-09', '60.00', '0.00', 0), ('2025-03-10', '60.00', '10.00', 2), ('2025-03-11', '70.00', '0.00', 0)]
+        )
+
+        maintained = self.summaries()
+        DailyBalance.objects.update(entry_count=0)
+        MonthlyBalance.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_summaries', stdout=out)
+        self.assertIn('Rebuilt 3 daily and 2 monthly summaries for 1 accounts', out.getvalue())
+        self.assertEqual(self.summaries(), maintained)
+
+    def test_current_month_averages_days_so_far(self):
+        ledger.deposit(self.account.pk, 3100)
+        today = timezone.localdate()
+        bucket = self.client.get('/api/account/analytics/').data['buckets'][-1]
+        self.assertEqual(bucket['period'], f'{today:%Y-%m}')
+        self.assertEqual(bucket['average_balance'], money.to_string(round(3100 / today.day)))
+
+    def test_imported_opening_balances_show_up(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'customers.csv')
+            with open(path, 'w') as f:
+                f.write('email,first_name,last_name,balance\na@example.com,Ann,Lee,100.00\n')
+            call_command('import_customers', path, workers=1, stdout=StringIO(), stderr=StringIO())
+            # And through the row-by-row path taken after a collision
+            with open(path, 'a') as f:
+                f.write('b@example.com,Bo,Kim,25.00\n')
+            with mock.patch.object(import_customers.Command, 'bulk_insert', side_effect=IntegrityError):
+                call_command('import_customers', path, workers=1, stdout=StringIO(), stderr=StringIO())
+
+        for email, balance in [('a@example.com', '100.00'), ('b@example.com', '25.00')]:
+            self.client.force_authenticate(User.objects.get(email=email))
+            bucket = self.client.get('/api/account/analytics/').data['buckets'][-1]
+            self.assertEqual(
+                (bucket['inflow'], bucket['opening_balance'], bucket['closing_balance']), (balance, '0.00', balance)
+            )
+
+    def test_invalid_ranges_are_rejected(self):
+        for params in [
+            {'interval': 'week'}, {'since': '2025-13'}, {'since': '2025-03', 'until': '2025-01'},
+            {'interval': 'day', 'since': '2024-01-01', 'until': '2025-06-01'},
+        ]:
+            self.assertEqual(self.client.get('/api/account/analytics/', params).status_code, 400)
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        self.accounts = [make_account(email=f'r{i}@example.com') for i in range(5)]
+        for account in self.accounts:
+            ledger.deposit(account.pk, 1010)
+            ledger.withdraw(account.pk, 30)
+
+    def test_reports_accounts_that_drift_from_their_ledger(self):
+        for method in reconciliation.METHODS:
+            out = StringIO()
+            call_command('reconcile', method=method, workers=1, shards=3, chunk_size=2, stdout=out)
+            self.assertIn('5 accounts, 10 ledger rows', out.getvalue())
+
+        drifted = self.accounts[2]
+        Account.objects.filter(pk=drifted.pk).update(balance=990)
+        with tempfile.TemporaryDirectory() as tmp:
+            report = os.path.join(tmp, 'report.csv')
+            with self.assertRaises(CommandError):
+                call_command('reconcile', workers=1, output=report, stdout=StringIO())
+            with open(report) as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(
+            [(row['account_number'], row['difference']) for row in rows],
+            [(drifted.account_number, '0.10')]
+        )
+
+
+class ReconcileWorkerTests(TransactionTestCase):
+    def test_shards_run_in_worker_processes(self):
+        for i in range(4):
+            ledger.deposit(make_account(email=f'w{i}@example.com').pk, 100)
+        out = StringIO()
+        call_command('reconcile', workers=2, shards=4, stdout=out)
+        self.assertIn('4 accounts, 4 ledger rows', out.getvalue())
+
+
+class GroupCommitTests(TransactionTestCase):
+    def setUp(self):
+        batching.reset()
+        self.addCleanup(batching.reset)
+
+    def test_batch_applies_postings_in_order(self):
+        account = make_account(balance=500)
+        outcomes = batching.apply_batch([
+            (account.pk, -300, Transaction.WITHDRAWAL),
+            (account.pk, -300, Transaction.WITHDRAWAL),
+            (account.pk, 1000, Transaction.DEPOSIT),
+            (uuid.uuid4(), 100, Transaction.DEPOSIT),
+        ])
+        self.assertEqual([entry.balance_after for entry in outcomes[::2]], [Decimal('2.00'), Decimal('12.00')])
+        self.assertIsInstance(outcomes[1], ledger.InsufficientFunds)
+        self.assertIsInstance(outcomes[3], Account.DoesNotExist)
+        account.refresh_from_db()
+        self.assertEqual(account.balance, 1200)
+        self.assertEqual(account.transactions.count(), 2)
+        self.assertEqual(account.daily_balances.get().entry_count, 2)
+
+    @override_settings(LEDGER_BATCHING={'ENABLED': True, 'WINDOW': 0.01})
+    def test_concurrent_postings_share_commits(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite cannot be shared across threads')
+        accounts = [make_account(email=f'g{i}@example.com').pk for i in range(8)]
+
+        def work(account_id):
+            try:
+                return [ledger.deposit(account_id, 100).balance_after for _ in range(5)]
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(batching, 'apply_batch', wraps=batching.apply_batch) as apply_batch:
+            with ThreadPoolExecutor(len(accounts)) as pool:
+                results = list(pool.map(work, accounts))
+        self.assertEqual(results, [[Decimal(n) for n in range(1, 6)]] * len(accounts))
+        self.assertLess(apply_batch.call_count, 40)
+        self.assertEqual(Transaction.objects.count(), 40)
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.withdraw(accounts[0], 600)
+
+    @override_settings(LEDGER_BATCHING={'ENABLED': True, 'WINDOW': 1, 'TIMEOUT': 0.01})
+    def test_timeout_answers_503_and_drops_the_queued_posting(self):
+        account = make_account()
+        client = APIClient()
+        client.force_authenticate(account.user)
+        response = client.post('/api/account/deposit/', {'amount': '1.00'}, format='json')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        # Let the writer take up the batch it was waiting to fill
+        batching.reset()
+        self.assertFalse(Transaction.objects.exists())
+
+    @override_settings(LEDGER_BATCHING={'ENABLED': True, 'WINDOW': 0, 'TIMEOUT': 0.01})
+    def test_timeout_waits_for_a_batch_already_being_applied(self):
+        get_store().clear()
+        account = make_account()
+        client = APIClient()
+        client.force_authenticate(account.user)
+        apply_batch = batching.apply_batch
+
+        def slow_apply(postings):
+            time.sleep(0.1)
+            return apply_batch(postings)
+
+        with mock.patch.object(batching, 'apply_batch', side_effect=slow_apply):
+            first = client.post(
+                '/api/account/deposit/', {'amount': '1.00'}, format='json', HTTP_IDEMPOTENCY_KEY='slow'
+            )
+        retry = client.post('/api/account/deposit/', {'amount': '1.00'}, format='json', HTTP_IDEMPOTENCY_KEY='slow')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(account.transactions.count(), 1)
+
+    @override_settings(LEDGER_BATCHING={'ENABLED': True})
+    def test_postings_inside_a_transaction_bypass_the_batcher(self):
+        account = make_account()
+        with mock.patch.object(batching, 'post') as post, transaction.atomic():
+            ledger.deposit(account.pk, 100)
+        post.assert_not_called()
+        account.refresh_from_db()
+        self.assertEqual(account.balance, 100)
+
+
+SHARDS = ['shard_0', 'shard_1']
+
+
+class ShardingTests(TransactionTestCase):
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        cache.clear()
+
+    def open_account(self, email, deposit=0, shard=None):
+        """Open an account the way registration does, which places it on its shard"""
+        user = User.objects.create_user(email=email, first_name='Jane', last_name='Doe', password='s3cure-Passw0rd')
+        account_id = uuid.uuid4()
+        while shard and sharding.shard_for(account_id, SHARDS) != shard:
+            account_id = uuid.uuid4()
+        account = Account(pk=account_id, user=user)
+        account.save()
+        if deposit:
+            ledger.deposit(account.pk, deposit)
+        return account
+
+    def open_accounts_on_both_shards(self):
+        return [self.open_account(f'{shard}@example.com', deposit=10000, shard=shard) for shard in SHARDS]
+
+    def holders(self, model, **filters):
+        return [db for db in ['default', *SHARDS] if model.objects.using(db).filter(**filters).exists()]
+
+    def test_jump_hash_only_moves_keys_to_new_shards(self):
+        keys = [uuid.uuid4().int >> 64 for _ in range(2000)]
+        moved = [key for key in keys if sharding.jump_hash(key, 3) != sharding.jump_hash(key, 4)]
+        self.assertTrue(all(sharding.jump_hash(key, 4) == 3 for key in moved))
+        self.assertAlmostEqual(len(moved) / len(keys), 0.25, delta=0.05)
+        account_id = uuid.uuid4()
+        self.assertEqual(sharding.shard_for(account_id, SHARDS), sharding.shard_for(str(account_id), SHARDS))
+
+    @override_settings(ACCOUNT_SHARDING={'SHARDS': SHARDS})
+    def test_batched_postings_follow_a_moved_account(self):
+        account = self.open_account('moved@example.com', shard='shard_1')
+        # Grouped while it was still on shard_0
+        with mock.patch.object(sharding, 'group', return_value={'shard_0': [account.pk]}):
+            entry, = batching.apply_batch([(account.pk, 500, Transaction.DEPOSIT)])
+        self.assertEqual(entry.balance_after, Decimal('5.00'))
+        self.assertEqual(Account.objects.using('shard_1').get(pk=account.pk).balance, 500)
+
+    @override_settings(ACCOUNT_SHARDING={'SHARDS': SHARDS})
+    def test_accounts_and_ledgers_live_on_their_shard(self):
+        source, destination = self.open_accounts_on_both_shards()
+        self.assertEqual(self.holders(Account, pk=source.pk), ['shard_0'])
+        self.assertEqual(self.holders(Transaction, account_id=source.pk), ['shard_0'])
+        self.assertEqual(self.holders(DailyBalance, account_id=source.pk), ['shard_0'])
+
+        # Logging in resolves the account for the token claims across shards
+        response = self.client.post(
+            '/api/auth/login/', {'email': source.user.email, 'password': 's3cure-Passw0rd'},
+            content_type='application/json'
+        )
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['tokens']['access']}"}
+        self.assertEqual(self.client.get('/api/account/', **auth).json()['balance'], '100.00')
+
+        response = self.client.post('/api/account/transfers/', {
+            'to_account': destination.account_number, 'amount': '30'
+        }, content_type='application/json', **auth)
+        self.assertEqual(response.json()['balance'], '70.00')
+        # Credited on the other shard once the debit committed
+        credit = Transaction.objects.using('shard_1').get(
+            account_id=destination.pk, transaction_type=Transaction.TRANSFER_IN
+        )
+        debit = Transaction.objects.using('shard_0').get(transaction_type=Transaction.TRANSFER_OUT)
+        self.assertEqual((credit.reference, credit.counterparty_id), (debit.reference, source.pk))
+        self.assertFalse(PendingCredit.objects.using('shard_0').exists())
+        self.assertEqual(Account.objects.using('shard_1').get(pk=destination.pk).balance, 13000)
+
+        history = self.client.get('/api/account/transactions/', **auth).json()['transactions']
+        self.assertEqual([row['transaction_type'] for row in history], ['transfer_out', 'deposit'])
+        out = StringIO()
+        call_command('reconcile', workers=1, stdout=out)
+        self.assertIn('2 accounts, 4 ledger rows', out.getvalue())
+
+    @override_settings(ACCOUNT_SHARDING={'SHARDS': SHARDS})
+    def test_settling_twice_credits_once(self):
+        source, destination = self.open_accounts_on_both_shards()
+        credit = PendingCredit(reference=uuid.uuid4(), source=source.pk, destination=destination.pk, amount=500)
+        credit.save()
+        self.assertEqual(transfers.settle('shard_0'), 1)
+        # As if the process died after crediting but before deleting the row
+        credit.pk = None
+        credit.save()
+        self.assertEqual(transfers.settle('shard_0'), 0)
+        self.assertFalse(PendingCredit.objects.using('shard_0').exists())
+        self.assertEqual(Account.objects.using('shard_1').get(pk=destination.pk).balance, 10500)
+
+    def test_rebalance_moves_accounts_while_they_stay_usable(self):
+        accounts = [self.open_account(f'm{i}@example.com', deposit=1000 * (i + 1)) for i in range(6)]
+        for account in accounts:
+            ledger.withdraw(account.pk, 100)
+        self.assertEqual(self.holders(Account), ['default'])
+
+        with override_settings(ACCOUNT_SHARDING={'SHARDS': SHARDS, 'PREVIOUS_SHARDS': ['default']}):
+            # Found on the old home until moved, and postable meanwhile
+            client = APIClient()
+            client.force_authenticate(accounts[0].user)
+            response = client.post('/api/account/deposit/', {'amount': '1'}, format='json')
+            self.assertEqual(response.data['account']['balance'], '10.00')
+
+            out = StringIO()
+            call_command('rebalance_shards', dry_run=True, stdout=out)
+            self.assertIn('Would move 6 accounts', out.getvalue())
+            call_command('rebalance_shards', chunk_size=4, stdout=StringIO())
+
+            self.assertFalse(Account.objects.using('default').exists())
+            self.assertFalse(Transaction.objects.using('default').exists())
+            for i, account in enumerate(accounts):
+                home = sharding.shard_for(account.pk)
+                self.assertEqual(self.holders(Account, pk=account.pk), [home])
+                self.assertEqual(self.holders(DailyBalance, account_id=account.pk), [home])
+                self.assertEqual(sharding.transactions(account.pk).count(), 3 if i == 0 else 2)
+            self.assertEqual(sharding.get_account(accounts[1].pk).balance, 1900)
+            out = StringIO()
+            call_command('reconcile', workers=1, stdout=out)
+            self.assertIn('6 accounts, 13 ledger rows', out.getvalue())
+            response = client.post('/api/account/withdraw/', {'amount': '1'}, format='json')
+            self.assertEqual(response.data['account']['balance'], '9.00')
+
+    @override_settings(ACCOUNT_SHARDING={'SHARDS': SHARDS})
+    def test_history_cursors_survive_a_move(self):
+        account = self.open_account('moved@example.com', shard='shard_0')
+        # Taking the first ids on the target
+        other = self.open_account('other@example.com', deposit=100, shard='shard_1')
+        ledger.deposit(other.pk, 100)
+        for _ in range(4):
+            ledger.deposit(account.pk, 100)
+        # As if posted in the same instant, which leaves only the tiebreaker
+        Transaction.objects.using('shard_0').filter(account=account).update(created_at=timezone.now())
+        client = APIClient()
+        client.force_authenticate(account.user)
+        first = client.get('/api/account/transactions/', {'limit': 2}).data
+        self.assertEqual(sharding.move_accounts([account.pk], 'shard_0', 'shard_1'), 1)
+
+        with override_settings(ACCOUNT_SHARDING={'SHARDS': ['shard_1']}):
+            rest = client.get('/api/account/transactions/', {'cursor': first['next_cursor']}).data
+        entries = [row['entry_id'] for row in first['transactions'] + rest['transactions']]
+        self.assertEqual(sorted(entries), sorted(
+            str(entry_id)
+            for entry_id in Transaction.objects.using('shard_1').filter(account=account).values_list('entry_id', flat=True)
+        ))
+        self.assertEqual(len(set(entries)), 4)
+
+
+@override_settings(READ_REPLICAS={'REPLICAS': {'default': ['replica_0']}})
+class ReplicaTests(TransactionTestCase):
+    databases = {'default', 'replica_0'}
+
+    def setUp(self):
+        cache.clear()
+        replicas.reset()
+        self.account = make_account(balance=10000)
+        call_command('sync_replicas', stdout=StringIO())
+        # Committed on the primary after the copy, so only there until the next sync
+        ledger.deposit(self.account.pk, 500)
+        self.client = self.client_for(self.account.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def balance(self, client):
+        snapshots.invalidate(self.account.pk)
+        return client.get('/api/account/').json()['balance']
+
+    def test_get_endpoints_read_from_a_replica(self):
+        # Caches which account is the user's, looked up on the primary
+        self.client.get('/api/account/')
+        with CaptureQueriesContext(connections['replica_0']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            self.assertEqual(self.balance(self.client), '100.00')
+            history = self.client.get('/api/account/transactions/').json()['transactions']
+        self.assertEqual(history, [])
+        self.assertTrue(replica.captured_queries)
+        self.assertEqual(primary.captured_queries, [])
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        response = self.client.post('/api/account/deposit/', {'amount': '1.00'}, format='json')
+        self.assertEqual(response.json()['account']['balance'], '106.00')
+        self.assertEqual(self.balance(self.client), '106.00')
+        self.assertEqual(len(self.client.get('/api/account/transactions/').json()['transactions']), 2)
+
+        # Another worker has no pin in memory; the cookie carries it there
+        replicas.reset()
+        self.assertEqual(self.balance(self.client), '106.00')
+        self.assertEqual(self.balance(self.client_for(self.account.user)), '100.00')
+
+        with override_settings(READ_REPLICAS={'REPLICAS': {'default': ['replica_0']}, 'STICKY_SECONDS': 0}):
+            replicas.reset()
+            self.client.post('/api/account/deposit/', {'amount': '1.00'}, format='json')
+            self.assertEqual(self.balance(self.client), '100.00')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        ReplicationHeartbeat.objects.using('replica_0').update(beat_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.balance(self.client), '105.00')
+
+        # Caught up, but the measured lag is trusted for CHECK_INTERVAL
+        call_command('sync_replicas', stdout=StringIO())
+        with CaptureQueriesContext(connections['replica_0']) as replica:
+            self.client.get('/api/account/transactions/')
+        self.assertEqual(replica.captured_queries, [])
+        replicas.reset()
+        with CaptureQueriesContext(connections['replica_0']) as replica:
+            self.client.get('/api/account/transactions/')
+        self.assertTrue(replica.captured_queries)
+
+        # A replica without the heartbeat can't tell its lag
+        ReplicationHeartbeat.objects.using('replica_0').all().delete()
+        replicas.reset()
+        with CaptureQueriesContext(connections['replica_0']) as replica:
+            self.client.get('/api/account/transactions/')
+        self.assertEqual(len(replica.captured_queries), 1)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.addCleanup(throttling.get_store().clear)
+        self.client = APIClient()
+
+    def login(self, email, ip='10.0.0.1'):
+        return self.client.post(
+            '/api/auth/login/', {'email': email, 'password': 'wrong'}, format='json', REMOTE_ADDR=ip
+        )
+
+    @override_settings(THROTTLING={'RATES': {'login': '2/min'}})
+    def test_login_is_rejected_before_any_password_check(self):
+        with mock.patch('api.serializers.authenticate', return_value=None) as authenticate:
+            statuses = [self.login('jane@example.com').status_code for _ in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(authenticate.call_count, 2)
+        self.assertEqual(self.login('jane@example.com', ip='10.0.0.2').status_code, 400)
+
+    @override_settings(THROTTLING={'RATES': {'login_email': '1/min'}})
+    def test_login_email_scope_spans_ips(self):
+        self.assertEqual(self.login('jane@example.com', ip='10.0.0.1').status_code, 400)
+        response = self.login('Jane@Example.com', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(THROTTLING={'RATES': {'money': '1/min'}})
+    def test_money_scope_is_per_user(self):
+        for email in ['a@example.com', 'b@example.com']:
+            self.client.force_authenticate(make_account(email=email).user)
+            statuses = [
+                self.client.post('/api/account/deposit/', {'amount': '1'}, format='json').status_code
+                for _ in range(2)
+            ]
+            self.assertEqual(statuses, [200, 429])
+
+    def test_bucket_refills_and_evicts_least_recently_used(self):
+        store = throttling.LocMemBucketStore(max_entries=2)
+        with mock.patch('time.monotonic', side_effect=[0, 0, 0.5, 1]):
+            self.assertEqual(store.consume('a', 1, 1.0), 0)
+            self.assertEqual(store.consume('a', 1, 1.0), 1.0)
+            self.assertEqual(store.consume('a', 1, 1.0), 0.5)
+            self.assertEqual(store.consume('a', 1, 1.0), 0)
+        store.consume('b', 1, 1.0)
+        store.consume('c', 1, 1.0)
+        self.assertEqual(list(store._buckets), ['b', 'c'])
+
+
+
+class FastSerializerTests(TestCase):
+    def test_compiled_serializers_render_the_same_bytes(self):
+        account = make_account(balance=123450)
+        account.user.first_name = 'Zoë\u2028'
+        for slow, fast in [
+            (AccountSerializer(account).data, account_payload(account)),
+            (UserSerializer(account.user).data, user_payload(account.user)),
+        ]:
+            self.assertEqual(api_settings.DEFAULT_RENDERER_CLASSES[0]().render(fast), JSONRenderer().render(slow))
+
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        self.account = make_account()
+        self.client = APIClient()
+        tokens.blacklist.rebuild()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': token}, format='json')
+
+    def test_refresh_rotates_without_querying_the_blacklist(self):
+        issued = tokens_for_user(self.account.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.refresh(issued['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'blacklistedtoken' in q['sql']])
+
+        self.assertEqual(self.refresh(issued['refresh']).status_code, 401)
+        rotated = self.refresh(response.data['refresh'])
+        self.assertEqual(rotated.status_code, 200)
+        access = tokens.FastRefreshToken(rotated.data['refresh']).access_token
+        self.assertEqual(access['account_id'], str(self.account.pk))
+
+    def test_blacklisting_by_another_worker_is_seen(self):
+        issued = tokens.FastRefreshToken(tokens_for_user(self.account.user)['refresh'])
+        this_worker = tokens.Blacklist()
+        this_worker.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            issued.blacklist()
+        # The filter predates the blacklisting; the shared cache covers it
+        self.assertNotIn(issued['jti'], this_worker._filter)
+        self.assertTrue(this_worker.contains(issued['jti']))
+        self.assertFalse(this_worker.contains('never-issued'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = tokens.BloomFilter(1000, 0.01)
+        keys = [f'jti-{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_prune_tokens_deletes_expired_in_batches(self):
+        issued = tokens.FastRefreshToken(tokens_for_user(self.account.user)['refresh'])
+        issued.blacklist()
+        tokens_for_user(self.account.user)
+        OutstandingToken.objects.filter(jti=issued['jti']).update(expires_at=timezone.now())
+        call_command('prune_tokens', batch_size=1, stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_requests_are_exposed_in_prometheus_format(self):
+        self.client.get('/api/health/')
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('http_requests_total{view="health-check",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{view="health-check"} 1', body)
+
+    def test_queries_and_serializer_time_are_attributed_to_the_view(self):
+        account = make_account()
+        client = APIClient()
+        client.force_authenticate(account.user)
+        client.get('/api/auth/profile/')
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('db_queries_per_request_count{view="user-profile"} 1', body)
+        self.assertIn('serializer_duration_seconds_total{view="user-profile"}', body)
+        # Compiled serializers are timed too, nested ones only once
+        client.get('/api/account/')
+        self.assertGreater(metrics.registry._views['user-profile'].serializer_time, 0)
+        self.assertGreater(metrics.registry._views['user-account'].serializer_time, 0)
+
+    @override_settings(METRICS={'SLOW_REQUEST_THRESHOLD': 0})
+    def test_slow_requests_are_logged_with_sql(self):
+        account = make_account()
+        client = APIClient()
+        client.force_authenticate(account.user)
+        with self.assertLogs('api.slow_requests', level='WARNING') as logs:
+            client.get('/api/account/transactions/')
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_scrapes_are_limited_to_allowed_addresses(self):
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = make_account()
+        ledger.deposit(self.account.pk, 500)
+        self.headers = {'Authorization': f"Bearer {tokens_for_user(self.account.user)['access']}"}
+        self.factory = AsyncRequestFactory()
+
+    async def test_account_matches_sync_view(self):
+        response = await async_views.get_user_account(self.factory.get('/api/account/', headers=self.headers))
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(self.client.get)('/api/account/', headers=self.headers)
+        self.assertEqual(response.content, sync_response.content)
+
+    async def test_profile_and_history(self):
+        profile = await async_views.get_user_profile(self.factory.get('/api/auth/profile/', headers=self.headers))
+        self.assertEqual(json.loads(profile.content)['email'], 'jane@example.com')
+        history = await async_views.get_transaction_history(
+            self.factory.get('/api/account/transactions/', headers=self.headers)
+        )
+        self.assertEqual(json.loads(history.content)['transactions'][0]['amount'], '5.00')
+
+    async def test_missing_token_is_rejected(self):
+        response = await async_views.get_user_account(self.factory.get('/api/account/'))
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(ASYNC_VIEWS=True, THROTTLING={'RATES': {'user': '2/min', 'anon': '1/min'}})
+    async def test_default_throttles_apply(self):
+        throttling.get_store().clear()
+        self.addCleanup(throttling.get_store().clear)
+        statuses = [
+            (await async_views.get_user_account(self.factory.get('/api/account/', headers=self.headers))).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = await async_views.get_user_profile(self.factory.get('/api/auth/profile/', headers=self.headers))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Anonymous requests are limited per IP
+        statuses = [(await async_views.health_check(self.factory.get('/api/health/'))).status_code for _ in range(2)]
+        self.assertEqual(statuses, [200, 429])
+
+
+@override_settings(BALANCE_EVENTS={'KEEPALIVE_INTERVAL': 0.05, 'STREAM_TIMEOUT': 0.2})
+class BalanceEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = make_account()
+        self.headers = {'Authorization': f"Bearer {tokens_for_user(self.account.user)['access']}"}
+
+    def test_stream_starts_with_balance_and_follows_postings(self):
+        response = self.client.get('/api/account/events/', headers=self.headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.deposit(self.account.pk, 700)
+        frames = ''.join(chunk.decode() for chunk in response.streaming_content)
+        self.assertIn('"balance": "0.00"', frames)
+        self.assertIn('"balance": "7.00"', frames)
+        self.assertIn('"transaction_type": "deposit"', frames)
+
+    async def test_async_stream_receives_events_from_other_threads(self):
+        request = AsyncRequestFactory().get('/api/account/events/', headers=self.headers)
+        response = await async_views.balance_events(request)
+        stream = response.streaming_content
+        self.assertIn('"balance": "0.00"', (await anext(stream)).decode())
+        await sync_to_async(events.publish_balance, thread_sensitive=False)(self.account.pk, '3.00')
+        self.assertIn('"balance": "3.00"', (await anext(stream)).decode())
+        await stream.aclose()
+
+
+class UnixSocketBrokerTests(TestCase):
+    def test_events_reach_other_broker_instances(self):
+        with tempfile.TemporaryDirectory() as path:
+            publisher = events.UnixSocketBroker(path)
+            listener = events.UnixSocketBroker(path)
+            subscription = listener.subscribe('balance:1')
+            publisher.publish('balance:1', {'balance': '1.00'})
+            self.assertEqual(subscription.get(timeout=2), {'balance': '1.00'})
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(ACCOUNT_JOBS={'BACKGROUND': False, 'CHUNK_SIZE': 1})
+class AdminTests(TestCase):
+    def setUp(self):
+        staff = User.objects.create_superuser('ada@example.com', 'Ada', 'Admin', 's3cure-Passw0rd')
+        self.client.force_login(staff)
+        self.jane = make_account('jane@example.com', balance=1000)
+        self.john = make_account('john@example.com')
+        User.objects.filter(pk=self.john.user_id).update(first_name='John', last_name='Smith')
+
+    def listed(self, path, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        # Every count is bounded
+        counts = [query['sql'] for query in queries.captured_queries if 'COUNT(' in query['sql']]
+        self.assertTrue(counts and all('LIMIT' in sql for sql in counts), counts)
+        return response.content.decode()
+
+    def test_search_is_by_prefix(self):
+        page = self.listed('/admin/api/account/', q='jan')
+        self.assertIn(self.jane.account_number, page)
+        self.assertNotIn(self.john.account_number, page)
+        page = self.listed('/admin/api/account/', q=self.john.account_number[2:8])
+        self.assertIn(self.john.account_number, page)
+        page = self.listed('/admin/api/user/', q='smi')
+        self.assertIn('john@example.com', page)
+        self.assertNotIn('jane@example.com', page)
+        # Not a prefix, which no index on SQLite could serve
+        self.assertNotIn('john@example.com', self.listed('/admin/api/user/', q='mith'))
+
+    def test_large_tables_use_the_planner_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(api_admin.estimated_count(Account, 'default'), 2)
+        with mock.patch.object(api_admin, 'estimated_count', return_value=2_000_000):
+            count = api_admin.EstimatedCountPaginator(Account.objects.order_by('pk'), 50).count
+            self.assertEqual(count, 2_000_000)
+            filtered = Account.objects.filter(frozen=False).order_by('pk')
+            self.assertEqual(api_admin.EstimatedCountPaginator(filtered, 50).count, 2)
+
+    def test_jobs_store_the_selection_not_a_query(self):
+        client = APIClient()
+        client.force_authenticate(self.jane.user)
+        self.assertFalse(json.loads(client.get('/api/account/').content)['frozen'])
+
+        # Every match of a search, found again by the job
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/api/account/?q=jan&frozen__exact=0', {
+                'action': 'freeze', 'select_across': '1', 'index': '0', '_selected_action': [self.jane.pk],
+            })
+        job = AccountJob.objects.get()
+        self.assertEqual(job.selection, {'search': 'jan', 'frozen': False})
+        self.assertEqual(list(Account.objects.filter(frozen=True).values_list('pk', flat=True)), [self.jane.pk])
+        # The cached account payload was invalidated
+        self.assertTrue(json.loads(client.get('/api/account/').content)['frozen'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/api/account/', {
+                'action': 'unfreeze', 'select_across': '0', 'index': '0', '_selected_action': [self.jane.pk],
+            })
+        self.assertEqual(AccountJob.objects.latest('pk').selection, {'ids': [str(self.jane.pk)]})
+        self.assertFalse(Account.objects.filter(frozen=True).exists())
+
+    def test_freezing_runs_as_a_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/api/account/', {
+                'action': 'freeze', 'select_across': '1', 'index': '0',
+                '_selected_action': [self.jane.pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        job = AccountJob.objects.get()
+        self.assertEqual((job.status, job.done), (AccountJob.DONE, 2))
+        self.assertEqual(Account.objects.filter(frozen=True).count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.jane.user)
+        response = client.post('/api/account/withdraw/', {'amount': '1.00'}, format='json')
+        self.assertEqual((response.status_code, response.data['error']), (403, 'Account is frozen'))
+        self.assertEqual(client.post('/api/account/deposit/', {'amount': '1.00'}, format='json').status_code, 403)
+        response = client.post('/api/account/transfers/', {
+            'to_account': self.john.account_number, 'amount': '1.00'
+        }, format='json')
+        self.assertEqual(response.data['results'][0]['error'], 'Account is frozen')
+        outcome, = batching.apply_batch([(self.jane.pk, 100, Transaction.DEPOSIT)])
+        self.assertIsInstance(outcome, ledger.AccountFrozen)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_interrupted_job_resumes_from_its_checkpoint(self):
+        first, second = sorted([self.jane.pk, self.john.pk])
+        job = jobs.queue(AccountJob.FREEZE, {'search': '', 'frozen': None})
+        # As if its process died after the first chunk
+        AccountJob.objects.filter(pk=job.pk).update(
+            status=AccountJob.RUNNING, last_account=first, done=1,
+            updated_at=timezone.now() - jobs.STALE_AFTER - timedelta(seconds=1),
+        )
+        self.assertFalse(jobs.claim(AccountJob.objects.create(
+            action=AccountJob.FREEZE, selection={'ids': []}, status=AccountJob.RUNNING
+        ).pk))
+        out = StringIO()
+        call_command('run_account_jobs', stdout=out)
+        self.assertIn('Ran 1 account jobs', out.getvalue())
+        self.assertEqual(list(Account.objects.filter(frozen=True).values_list('pk', flat=True)), [second])
+        self.assertEqual(AccountJob.objects.get(pk=job.pk).done, 2)
+
+    def test_frozen_is_only_changed_by_jobs(self):
+        response = self.client.get(f'/admin/api/account/{self.jane.pk}/change/')
+        self.assertNotIn('name="frozen"', response.content.decode())
+
+    @override_settings(ACCOUNT_SHARDING={'SHARDS': ['default', 'shard_1']})
+    def test_jobs_fail_on_accounts_off_the_default_database(self):
+        elsewhere = str(uuid.uuid4())
+        for selection in [{'search': 'jan', 'frozen': None}, {'ids': [str(self.jane.pk), elsewhere]}]:
+            with self.assertLogs('api.jobs', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                job = jobs.queue(AccountJob.FREEZE, selection)
+            job.refresh_from_db()
+            self.assertEqual(job.status, AccountJob.FAILED)
+        self.assertIn(elsewhere, job.error)
+        self.assertFalse(Account.objects.filter(frozen=True).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.queue(AccountJob.FREEZE, {'ids': [str(self.jane.pk)]})
+        job.refresh_from_db()
+        self.assertEqual(job.status, AccountJob.DONE)
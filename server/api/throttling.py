@@ -0,0 +1,190 @@
+# server/api/throttling.py
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'api.throttling.LocMemBucketStore',
+    'OPTIONS': {},
+    # 'requests/period' per scope, period being s, min, hour or day. The
+    # bucket holds that many requests and refills evenly over the period
+    'RATES': {},
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLING', {})}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Return (capacity, tokens per second) for a rate like '10/min'"""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocMemBucketStore:
+    """
+    In-process token buckets.
+
+    Each check is a dict lookup and an LRU bump under one lock. Only the
+    least recently used buckets are evicted past max_entries, and an idle
+    bucket would have refilled anyway, so eviction never lets anyone
+    through who should have been throttled.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        """Take a token; return 0 if one was available, else seconds until one is"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens, updated = bucket
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                self._buckets.move_to_end(key)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Token buckets in a Django cache alias, shared between worker processes.
+
+    The read and write are not atomic, so workers racing on one bucket can
+    each admit a request; point it at a cache shared by all workers.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def consume(self, key, capacity, rate):
+        now = time.time()
+        bucket = self.cache.get(key)
+        tokens = capacity
+        if bucket is not None:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        # Once idle for capacity / rate seconds the bucket is full again,
+        # which is what a missing key means
+        self.cache.set(key, (tokens - 1 if tokens >= 1 else tokens, now), int(capacity / rate) + 1)
+        return wait
+
+    def clear(self):
+        self.cache.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the configured store, building it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_config()
+                _store = import_string(config['BACKEND'])(**config['OPTIONS'])
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle taking one token per request from the bucket of
+    (scope, ident). DRF checks throttles before the view runs, so rejected
+    requests never reach serializers or password hashing.
+    """
+    scope = None
+
+    def get_ident_key(self, request):
+        """The bucket to charge, or None to let the request through"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        config = get_config()
+        rate = config['RATES'].get(self.scope)
+        if not config['ENABLED'] or rate is None:
+            return True
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+        capacity, per_second = parse_rate(rate)
+        self.wait_time = get_store().consume(f'throttle:{self.scope}:{ident}', capacity, per_second)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class UserIdThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request):
+        return request.user.pk if request.user.is_authenticated else None
+
+
+class AnonThrottle(IPThrottle):
+    """Default for unauthenticated requests, per client IP"""
+    scope = 'anon'
+
+    def get_ident_key(self, request):
+        return None if request.user.is_authenticated else self.get_ident(request)
+
+
+class UserThrottle(UserIdThrottle):
+    """Default for authenticated requests, per user"""
+    scope = 'user'
+
+
+class LoginThrottle(IPThrottle):
+    scope = 'login'
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    """Per target account, so guessing one password from many IPs is limited too"""
+    scope = 'login_email'
+
+    def get_ident_key(self, request):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+class RegisterThrottle(IPThrottle):
+    scope = 'register'
+
+
+class MoneyThrottle(UserIdThrottle):
+    """Deposits, withdrawals, balance changes and transfers"""
+    scope = 'money'
@@ -0,0 +1,196 @@
+# server/api/tokens.py
+import hashlib
+import math
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+DEFAULTS = {
+    # Sizing of each process's Bloom filter; beyond CAPACITY live entries
+    # the false positive rate, and with it the DB confirmations, grows
+    'CAPACITY': 1_000_000,
+    'ERROR_RATE': 0.001,
+    # Seconds between rebuilds of the filter from the database
+    'REBUILD_INTERVAL': 60,
+    # Cache shared by all workers, announcing blacklistings to processes
+    # whose filter predates them
+    'CACHE': 'default',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_BLACKLIST', {})}
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two independent 64-bit hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _recent_key(jti):
+    return f'token-blacklisted:{jti}'
+
+
+class Blacklist:
+    """
+    Answers "is this refresh token blacklisted?" mostly without the database.
+
+    Each process keeps a Bloom filter of the unexpired blacklisted tokens,
+    rebuilt every REBUILD_INTERVAL seconds. A miss there is final, unless
+    the shared cache says another worker blacklisted the token since our
+    last rebuild; a hit is confirmed against the database, so a false
+    positive never rejects a valid token.
+    """
+
+    def __init__(self):
+        self._filter = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _current_filter(self):
+        config = get_config()
+        if self._filter is None or time.monotonic() - self._built_at > config['REBUILD_INTERVAL']:
+            # One thread rebuilds; the others carry on with the old filter
+            blocking = self._filter is None
+            if self._lock.acquire(blocking=blocking):
+                try:
+                    if self._filter is None or time.monotonic() - self._built_at > config['REBUILD_INTERVAL']:
+                        self.rebuild()
+                finally:
+                    self._lock.release()
+        return self._filter
+
+    def rebuild(self):
+        config = get_config()
+        started = time.monotonic()
+        bloom = BloomFilter(config['CAPACITY'], config['ERROR_RATE'])
+        jtis = (
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+            .iterator(chunk_size=10000)
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter, self._built_at = bloom, started
+
+    def contains(self, jti):
+        if caches[get_config()['CACHE']].get(_recent_key(jti)):
+            return True
+        if jti not in self._current_filter():
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def remember(self, jti):
+        """Record a committed blacklisting here and for the other workers"""
+        # Every process rebuilds within two intervals, after which the
+        # database copy is in all filters
+        ttl = 2 * get_config()['REBUILD_INTERVAL'] + 60
+        caches[get_config()['CACHE']].set(_recent_key(jti), True, ttl)
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def reset(self):
+        self._filter = None
+
+
+blacklist = Blacklist()
+
+
+class FastRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist check goes through the Bloom filter, and
+    whose blacklisting and rotation write the minimum of rows.
+    """
+
+    def check_blacklist(self):
+        if blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def _outstanding(self):
+        return {
+            'user_id': self.payload.get(api_settings.USER_ID_CLAIM),
+            'created_at': self.current_time,
+            'token': str(self),
+            'expires_at': datetime_from_epoch(self.payload['exp']),
+        }
+
+    def blacklist(self):
+        """
+        Blacklist this token. Raises TokenError if it already is, so of two
+        requests racing to use one refresh token only the first succeeds.
+        """
+        jti = self.payload[api_settings.JTI_CLAIM]
+        try:
+            with transaction.atomic():
+                # Every token we issue is already outstanding; only older
+                # ones need the row created
+                token_id = OutstandingToken.objects.filter(jti=jti).values_list('id', flat=True).first()
+                if token_id is None:
+                    token_id = self.outstand().id
+                entry = BlacklistedToken.objects.create(token_id=token_id)
+        except IntegrityError:
+            raise TokenError(_('Token is blacklisted'))
+        transaction.on_commit(partial(blacklist.remember, jti))
+        return entry
+
+    def outstand(self):
+        return OutstandingToken.objects.create(jti=self.payload[api_settings.JTI_CLAIM], **self._outstanding())
+
+
+def rotate(raw_token):
+    """
+    Exchange a refresh token for a new access token, and when rotation is
+    on a new refresh token too, the old one being blacklisted.
+
+    Raises TokenError for invalid, expired or blacklisted tokens and
+    User.DoesNotExist for tokens of users that are gone or inactive.
+    """
+    from .models import User
+
+    refresh = FastRefreshToken(raw_token)
+    user = User.objects.get(pk=refresh.payload[api_settings.USER_ID_CLAIM])
+    if not api_settings.USER_AUTHENTICATION_RULE(user):
+        raise User.DoesNotExist()
+
+    data = {'access': str(refresh.access_token)}
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        with transaction.atomic():
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+        data['refresh'] = str(refresh)
+    return data
@@ -0,0 +1,180 @@
+# server/api/transfers.py
+import logging
+import uuid
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, Value, When
+
+from . import ledger, money, rollups, sharding
+from .models import Account, PendingCredit, Transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 100
+
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+def parse_item(item, amount):
+    """
+    Return (account_number, amount) for one transfer, or raise ValueError.
+    `amount` is the item's entry from money.parse_amounts().
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Transfer must be an object')
+    to_account = item.get('to_account')
+    if not to_account or not isinstance(to_account, str):
+        raise ValueError('Destination account is required')
+    if isinstance(amount, ValueError):
+        raise amount
+    return to_account, amount
+
+
+def execute(source_account_id, items):
+    """
+    Move money from one account to others and return a result per item.
+
+    All involved rows are locked in primary key order, so two batches
+    touching the same accounts always queue instead of deadlocking. Balances
+    are then updated with one UPDATE and the ledger with one bulk INSERT,
+    all in a single transaction. Items that fail validation or would
+    overdraw the source are reported and skipped; the rest are applied.
+
+    Destinations on another shard than the source are credited after the
+    source's transaction commits, through a PendingCredit written in it;
+    see settle().
+    """
+    results = [None] * len(items)
+    amounts = money.parse_amounts([item.get('amount') if isinstance(item, dict) else None for item in items])
+    parsed = []
+    for index, (item, amount) in enumerate(zip(items, amounts)):
+        try:
+            parsed.append((index, *parse_item(item, amount)))
+        except ValueError as e:
+            results[index] = {'index': index, 'status': FAILED, 'error': str(e)}
+
+    # Account numbers never change, so resolving them needs no lock
+    destinations = sharding.find_accounts({number for _, number, _ in parsed})
+    db = sharding.locate(source_account_id)
+    try:
+        balance = _execute(db, source_account_id, parsed, destinations, results)
+    except Account.DoesNotExist:
+        # rebalance_shards may have moved it while we waited for its lock
+        moved_to = sharding.locate(source_account_id)
+        if moved_to == db:
+            raise
+        balance = _execute(moved_to, source_account_id, parsed, destinations, results)
+    return results, balance
+
+
+def _execute(db, source_account_id, parsed, destinations, results):
+    local = {pk for pk in destinations.values() if sharding.locate(pk) == db}
+    with transaction.atomic(using=db):
+        rows = (
+            Account.objects.using(db).select_for_update()
+            .filter(pk__in={source_account_id, *local})
+            .order_by('pk')
+            .values_list('id', 'balance', 'frozen')
+        )
+        balances, frozen = {}, False
+        for account_id, balance, is_frozen in rows:
+            balances[account_id] = balance
+            frozen = frozen or (is_frozen and account_id == source_account_id)
+        if source_account_id not in balances:
+            raise Account.DoesNotExist()
+
+        entries, credits = [], []
+        for index, number, amount in parsed:
+            destination_id = destinations.get(number)
+            if frozen:
+                error = 'Account is frozen'
+            elif destination_id is None:
+                error = 'Account not found'
+            elif destination_id == source_account_id:
+                error = 'Cannot transfer to the same account'
+            elif balances[source_account_id] < amount:
+                error = 'Insufficient balance'
+            else:
+                error = None
+            if error:
+                results[index] = {'index': index, 'status': FAILED, 'error': error}
+                continue
+
+            balances[source_account_id] -= amount
+            # Also remote when it moved away between locate() and the lock
+            reference = None if destination_id in balances else uuid.uuid4()
+            entries.append(Transaction(
+                account_id=source_account_id,
+                counterparty_id=destination_id,
+                transaction_type=Transaction.TRANSFER_OUT,
+                amount=money.to_decimal(-amount),
+                balance_after=money.to_decimal(balances[source_account_id]),
+                reference=reference,
+            ))
+            if reference is None:
+                balances[destination_id] += amount
+                entries.append(Transaction(
+                    account_id=destination_id,
+                    counterparty_id=source_account_id,
+                    transaction_type=Transaction.TRANSFER_IN,
+                    amount=money.to_decimal(amount),
+                    balance_after=money.to_decimal(balances[destination_id]),
+                ))
+            else:
+                credits.append(PendingCredit(
+                    reference=reference, source=source_account_id, destination=destination_id, amount=amount,
+                ))
+            results[index] = {
+                'index': index, 'status': COMPLETED, 'amount': money.to_string(amount), 'to_account': number,
+            }
+
+        if entries:
+            touched = {entry.account_id for entry in entries}
+            Account.objects.using(db).filter(pk__in=touched).update(balance=Case(
+                *[When(pk=pk, then=Value(balances[pk])) for pk in touched],
+                output_field=BigIntegerField(),
+            ))
+            Transaction.objects.using(db).bulk_create(entries)
+            PendingCredit.objects.using(db).bulk_create(credits)
+            rollups.record(entries)
+            # The last entry per account carries its final balance
+            latest = {entry.account_id: entry for entry in entries}
+            for entry in latest.values():
+                transaction.on_commit(partial(ledger.after_commit, entry), using=db)
+            if credits:
+                # A failure here leaves the credits for `manage.py settle_transfers`
+                transaction.on_commit(
+                    partial(settle, db, [credit.reference for credit in credits]), using=db, robust=True,
+                )
+
+    return balances[source_account_id]
+
+
+def settle(db, references=None):
+    """
+    Apply the pending credits recorded on a database, or only those with
+    the given references, and return how many were applied.
+
+    Each credit commits on its destination's shard before its PendingCredit
+    is deleted, and the ledger accepts one TRANSFER_IN per reference, so
+    settling again after a crash, or alongside another settler, never
+    credits twice.
+    """
+    pending = PendingCredit.objects.using(db).order_by('id')
+    if references is not None:
+        pending = pending.filter(reference__in=references)
+    applied = 0
+    for credit in pending:
+        try:
+            ledger.credit_transfer(credit.destination, credit.amount, credit.source, credit.reference)
+            applied += 1
+        except IntegrityError:
+            # Applied before; only the PendingCredit was left behind
+            pass
+        except Account.DoesNotExist:
+            logger.warning('Transfer %s is owed to missing account %s', credit.reference, credit.destination)
+            continue
+        PendingCredit.objects.using(db).filter(pk=credit.pk).delete()
+    return applied
@@ -1,20 +1,36 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the read-heavy and streaming endpoints can be served by
+# async-native views
+if settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
+
 urlpatterns = [
     # Health check
-    path('health/', views.health_check, name='health-check'),
+    path('health/', read_views.health_check, name='health-check'),
+    path('metrics/', views.get_metrics, name='metrics'),
     
     # Authentication endpoints
     path('auth/register/', views.register, name='register'),
     path('auth/login/', views.login_user, name='login'),
+    path('auth/refresh/', views.refresh_tokens, name='token-refresh'),
     path('auth/logout/', views.logout_user, name='logout'),
-    path('auth/profile/', views.get_user_profile, name='user-profile'),
+    path('auth/profile/', read_views.get_user_profile, name='user-profile'),
     
     # Account endpoints
-    path('account/', views.get_user_account, name='user-account'),
+    path('account/', read_views.get_user_account, name='user-account'),
+    path('account/events/', read_views.balance_events, name='balance-events'),
     path('account/balance/', views.update_balance, name='update-balance'),
+    path('account/balance/as-of/', views.get_balance_as_of, name='balance-as-of'),
     path('account/deposit/', views.deposit_money, name='deposit-money'),
     path('account/withdraw/', views.withdraw_money, name='withdraw-money'),
-    path('account/transactions/', views.get_transaction_history, name='transaction-history'),
+    path('account/transfers/', views.create_transfers, name='transfers'),
+    path('account/transactions/', read_views.get_transaction_history, name='transaction-history'),
+    path('account/transactions/export/', views.export_transactions, name='transaction-export'),
+    path('account/statement/', views.download_statement, name='statement'),
+    path('account/analytics/', views.get_account_analytics, name='account-analytics'),
 ]
\ No newline at end of file
@@ -1,66 +1,111 @@
 # server/api/views.py
-from django.shortcuts import get_object_or_404
+from datetime import date, datetime, timedelta
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view, authentication_classes, permission_classes, renderer_classes, throttle_classes
+)
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import login
+from rest_framework_simplejwt.exceptions import TokenError
+from . import (
+    analytics, events, exports, ledger, metrics, money, replicas, rollups, sharding, snapshots, statements, tokens,
+    transfers,
+)
+from .authentication import tokens_for_user
+from .fast_serializers import account_payload, user_payload
+from .idempotency import idempotent
 from .models import User, Account
+from .pagination import InvalidCursor, keyset_page
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
-    UserSerializer, 
-    AccountSerializer
+    TransactionSerializer
 )
+from .throttling import LoginEmailThrottle, LoginThrottle, MoneyThrottle, RegisterThrottle, UserThrottle
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _account_id(request):
+    """
+    Resolve the caller's account id without loading the user.
+
+    Tokens carry the id as a claim; other authentication paths fall back to
+    the cached user-to-account mapping. Raises Account.DoesNotExist.
+    """
+    account_id = getattr(request.user, 'account_id', None)
+    if account_id is None:
+        account_id = snapshots.get_account_id(request.user.pk)
+    return account_id
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterThrottle])
 def register(request):
     """Register a new user"""
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
         
-        return Response({
+        return replicas.pin(Response({
             'message': 'User registered successfully',
-            'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-        }, status=status.HTTP_201_CREATED)
+            'user': user_payload(user),
+            'tokens': tokens_for_user(user)
+        }, status=status.HTTP_201_CREATED), user.pk)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle, LoginEmailThrottle])
 def login_user(request):
     """Login user and return JWT tokens"""
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
         
         return Response({
             'message': 'Login successful',
-            'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
+            'user': user_payload(user),
+            'tokens': tokens_for_user(user)
         })
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh_tokens(request):
+    """Exchange a refresh token for a new access token (and refresh token)"""
+    refresh_token = request.data.get('refresh')
+    if not refresh_token or not isinstance(refresh_token, str):
+        return Response(
+            {'error': 'Refresh token is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        return Response(tokens.rotate(refresh_token))
+    except TokenError as e:
+        return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    except User.DoesNotExist:
+        return Response(
+            {'error': 'No active account found for the given token'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_user(request):
     """Logout user by blacklisting the refresh token"""
     try:
         refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
+        token = tokens.FastRefreshToken(refresh_token)
         token.blacklist()
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
     except Exception as e:
@@ -68,163 +113,387 @@ def logout_user(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replicas.replica_reads
 def get_user_profile(request):
     """Get current user's profile"""
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    return Response(user_payload(request.user))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replicas.replica_reads
 def get_user_account(request):
     """Get current user's bank account details"""
     try:
-        account = request.user.account
-        serializer = AccountSerializer(account)
-        return Response(serializer.data)
+        # Served from a pre-rendered snapshot that postings invalidate
+        payload = snapshots.get(_account_id(request))
     except Account.DoesNotExist:
         return Response(
             {'error': 'Account not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
+    return HttpResponse(payload, content_type='application/json')
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([UserThrottle, MoneyThrottle])
+@idempotent
 def deposit_money(request):
     """Deposit money to user's account"""
     try:
-        account = request.user.account
+        account_id = _account_id(request)
     except Account.DoesNotExist:
         return Response(
             {'error': 'Account not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
     
-    amount = request.data.get('amount')
-    if not amount:
+    try:
+        amount = money.parse_amount(request.data.get('amount'))
+    except ValueError as e:
         return Response(
-            {'error': 'Amount is required'},
+            {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     try:
-        amount = float(amount)
-        if amount <= 0:
-            return Response(
-                {'error': 'Amount must be positive'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    except (ValueError, TypeError):
+        ledger.deposit(account_id, amount)
+    except ledger.AccountFrozen:
         return Response(
-            {'error': 'Invalid amount'},
-            status=status.HTTP_400_BAD_REQUEST
+            {'error': 'Account is frozen'},
+            status=status.HTTP_403_FORBIDDEN
         )
+    account = sharding.get_account(account_id)
     
-    account.balance += amount
-    account.save()
-    
-    serializer = AccountSerializer(account)
-    return Response({
+    # Pinned so this user's next reads see the deposit
+    return replicas.pin(Response({
         'message': 'Deposit successful',
-        'account': serializer.data
-    })
+        'account': account_payload(account)
+    }), request.user.pk)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([UserThrottle, MoneyThrottle])
+@idempotent
 def withdraw_money(request):
     """Withdraw money from user's account"""
     try:
-        account = request.user.account
+        account_id = _account_id(request)
     except Account.DoesNotExist:
         return Response(
             {'error': 'Account not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
     
-    amount = request.data.get('amount')
-    if not amount:
+    try:
+        amount = money.parse_amount(request.data.get('amount'))
+    except ValueError as e:
         return Response(
-            {'error': 'Amount is required'},
+            {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     try:
-        amount = float(amount)
-        if amount <= 0:
+        ledger.withdraw(account_id, amount)
+    except ledger.InsufficientFunds:
+        return Response(
+            {'error': 'Insufficient balance'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except ledger.AccountFrozen:
+        return Response(
+            {'error': 'Account is frozen'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    account = sharding.get_account(account_id)
+    
+    return replicas.pin(Response({
+        'message': 'Withdrawal successful',
+        'account': account_payload(account)
+    }), request.user.pk)
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserThrottle, MoneyThrottle])
+def update_balance(request):
+    """Update account balance directly"""
+    try:
+        account_id = _account_id(request)
+    except Account.DoesNotExist:
+        return Response(
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        balance = money.parse_balance(request.data.get('balance'))
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        ledger.set_balance(account_id, balance)
+    except ledger.AccountFrozen:
+        return Response(
+            {'error': 'Account is frozen'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    account = sharding.get_account(account_id)
+    
+    return replicas.pin(Response({
+        'message': 'Balance updated successfully',
+        'account': account_payload(account)
+    }), request.user.pk)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserThrottle, MoneyThrottle])
+@idempotent
+def create_transfers(request):
+    """Transfer money to other accounts, one transfer or a batch of them"""
+    try:
+        account_id = _account_id(request)
+    except Account.DoesNotExist:
+        return Response(
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if 'transfers' in request.data:
+        items = request.data['transfers']
+        if not isinstance(items, list) or not items:
             return Response(
-                {'error': 'Amount must be positive'},
+                {'error': 'Transfers must be a non-empty list'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-    except (ValueError, TypeError):
+    else:
+        items = [request.data]
+    
+    if len(items) > transfers.MAX_BATCH_SIZE:
         return Response(
-            {'error': 'Invalid amount'},
+            {'error': f'At most {transfers.MAX_BATCH_SIZE} transfers per batch'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    if account.balance < amount:
+    results, balance = transfers.execute(account_id, items)
+    return replicas.pin(Response({
+        'message': 'Transfers processed',
+        'results': results,
+        'balance': money.to_string(balance)
+    }), request.user.pk)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, events.EventStreamRenderer])
+def balance_events(request):
+    """Stream the user's balance changes as server-sent events"""
+    try:
+        account_id = _account_id(request)
+    except Account.DoesNotExist:
         return Response(
-            {'error': 'Insufficient balance'},
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    # Subscribe before reading the balance so no change can slip between
+    subscription = events.get_broker().subscribe(events.balance_channel(account_id))
+    balance = Account.objects.using(sharding.locate(account_id)).values_list('balance', flat=True).get(pk=account_id)
+    response = StreamingHttpResponse(
+        events.stream(subscription, {'account_id': str(account_id), 'balance': money.to_string(balance)}),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replicas.replica_reads
+def get_transaction_history(request):
+    """Get one page of the user's transaction history, newest first"""
+    try:
+        account_id = _account_id(request)
+    except Account.DoesNotExist:
+        return Response(
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        limit = min(int(request.query_params.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return Response(
+            {'error': 'Invalid limit'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    account.balance -= amount
-    account.save()
+    try:
+        transactions, next_cursor = keyset_page(
+            sharding.transactions(account_id),
+            cursor=request.query_params.get('cursor'),
+            limit=limit
+        )
+    except InvalidCursor:
+        return Response(
+            {'error': 'Invalid cursor'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    serializer = AccountSerializer(account)
+    serializer = TransactionSerializer(transactions, many=True)
     return Response({
-        'message': 'Withdrawal successful',
-        'account': serializer.data
+        'transactions': serializer.data,
+        'next_cursor': next_cursor
     })
 
-@api_view(['PATCH'])
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def update_balance(request):
-    """Update account balance directly"""
+def export_transactions(request):
+    """Stream the user's full transaction history as CSV or NDJSON"""
     try:
-        account = request.user.account
+        account_id = _account_id(request)
     except Account.DoesNotExist:
         return Response(
             {'error': 'Account not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
     
-    balance = request.data.get('balance')
-    if balance is None:
+    # 'format' is reserved by DRF for renderer selection, hence 'output'
+    output = request.query_params.get('output', 'csv')
+    if output not in exports.FORMATS:
         return Response(
-            {'error': 'Balance is required'},
+            {'error': 'Unsupported export format'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    content_type, stream = exports.FORMATS[output]
+    response = StreamingHttpResponse(
+        stream(sharding.transactions(account_id)),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="transactions-{account_id}.{output}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replicas.replica_reads
+def get_balance_as_of(request):
+    """Get the user's balance at a past date (end of day) or moment"""
+    try:
+        account_id = _account_id(request)
+    except Account.DoesNotExist:
+        return Response(
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    at = request.query_params.get('at', '')
+    try:
+        if len(at) == 10:
+            day = date.fromisoformat(at)
+            balance = rollups.opening_balance(account_id, day + timedelta(days=1))
+        else:
+            moment = datetime.fromisoformat(at)
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            balance = rollups.balance_as_of(account_id, moment)
+    except ValueError:
+        return Response(
+            {'error': 'Expected a date or ISO 8601 timestamp in "at"'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'at': at,
+        'balance': str(balance)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replicas.replica_reads
+def get_account_analytics(request):
+    """Get the user's inflow, outflow, spend and balances by month or day"""
+    try:
+        account_id = _account_id(request)
+    except Account.DoesNotExist:
+        return Response(
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    interval = request.query_params.get('interval', 'month')
+    today = timezone.localdate()
     try:
-        balance = float(balance)
-        if balance < 0:
+        if interval == 'month':
+            until = statements.month_bounds(request.query_params.get('until', f'{today:%Y-%m}'))[0]
+            default_since = until.replace(year=until.year - 1) + timedelta(days=31)
+            since = statements.month_bounds(request.query_params.get('since', f'{default_since:%Y-%m}'))[0]
+            count = (until.year - since.year) * 12 + until.month - since.month + 1
+            limit = analytics.MAX_MONTHS
+        elif interval == 'day':
+            until = date.fromisoformat(request.query_params.get('until', today.isoformat()))
+            default_since = until - timedelta(days=29)
+            since = date.fromisoformat(request.query_params.get('since', default_since.isoformat()))
+            count = (until - since).days + 1
+            limit = analytics.MAX_DAYS
+        else:
             return Response(
-                {'error': 'Balance cannot be negative'},
+                {'error': 'Expected interval "month" or "day"'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-    except (ValueError, TypeError):
+    except ValueError:
         return Response(
-            {'error': 'Invalid balance'},
+            {'error': 'Expected since and until as YYYY-MM for months or YYYY-MM-DD for days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not 0 < count <= limit:
+        return Response(
+            {'error': f'Expected since on or before until, at most {limit} {interval}s apart'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    account.balance = balance
-    account.save()
-    
-    serializer = AccountSerializer(account)
+    buckets = analytics.months if interval == 'month' else analytics.days
     return Response({
-        'message': 'Balance updated successfully',
-        'account': serializer.data
+        'interval': interval,
+        'buckets': buckets(account_id, since, until)
     })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_transaction_history(request):
-    """Get user's transaction history (placeholder for future implementation)"""
-    # This is a placeholder - you can implement transaction tracking later
-    return Response({
-        'message': 'Transaction history feature coming soon',
-        'transactions': []
-    })
+def download_statement(request):
+    """Stream the user's statement for one month as CSV or PDF"""
+    try:
+        account = sharding.get_account(_account_id(request))
+    except Account.DoesNotExist:
+        return Response(
+            {'error': 'Account not found'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    output = request.query_params.get('output', 'csv')
+    if output not in statements.FORMATS:
+        return Response(
+            {'error': 'Unsupported statement format'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    month = request.query_params.get('month', '')
+    try:
+        start, end = statements.month_bounds(month)
+    except ValueError:
+        return Response(
+            {'error': 'Expected month as YYYY-MM'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    content_type, stream = statements.FORMATS[output]
+    response = StreamingHttpResponse(
+        stream(statements.Statement(account, start, end)),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="statement-{account.account_number}-{month}.{output}"'
+    return response
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -233,4 +502,18 @@ def health_check(request):
     return Response({
         'status': 'healthy',
         'message': 'NeoBank API is running'
-    })
\ No newline at end of file
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_metrics(request):
+    """Expose request metrics in the Prometheus text format"""
+    if request.META.get('REMOTE_ADDR') not in metrics.get_config()['ALLOWED_IPS']:
+        return Response(
+            {'error': 'Forbidden'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
\ No newline at end of file
@@ -0,0 +1,108 @@
+# server/benchmarks/admin_search.py
+"""
+Admin account list pages with the stock ModelAdmin behaviour and with api.admin's.
+
+Run from the server directory:
+
+    python -m benchmarks.admin_search [--accounts 200000]
+
+Seeds users with accounts, runs ANALYZE, then times what each list page
+costs the database: the row count behind the paginator, and a search for
+a surname with its first page. The stock admin counts every row and
+searches with icontains over all fields; api.admin reads the planner's
+estimate and searches by prefix on indexed columns, counting at most
+COUNT_LIMIT matches.
+"""
+import argparse
+import os
+import random
+import time
+
+import django
+
+from .api_load import percentile
+from .database import temporary_database
+
+SURNAMES = ['Smith', 'Hoxha', 'Rossi', 'Novak', 'Berisha', 'Kelmendi', 'Dervishi', 'Garcia', 'Muller', 'Kovac']
+
+
+def seed(accounts):
+    from django.db import connection
+
+    from api import identifiers
+    from api.models import User, Account
+
+    rng = random.Random(0)
+    for start in range(0, accounts, 5000):
+        count = min(5000, accounts - start)
+        users = User.objects.bulk_create([
+            User(email=f'user{start + i}@example.com', username=f'user{start + i}',
+                 first_name=f'First{rng.randrange(5000)}', last_name=f'{rng.choice(SURNAMES)}{rng.randrange(1000)}')
+            for i in range(count)
+        ], batch_size=1000)
+        Account.objects.bulk_create([
+            Account(user=user, account_number=identifiers.next_account_number()) for user in users
+        ], batch_size=1000)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def timed(function, calls):
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 50) * 1000
+
+
+def run(accounts=200000, calls=20):
+    from django.db.models import Q
+
+    from api import admin, search
+    from api.models import Account
+
+    started = time.perf_counter()
+    seed(accounts)
+    print(f"Seeded {accounts} users and accounts in {time.perf_counter() - started:.1f}s")
+
+    listing = Account.objects.select_related('user').order_by('account_number')
+    term = 'Kelmendi12'
+    stock_search = listing.filter(
+        Q(account_number__icontains=term) | Q(user__email__icontains=term)
+        | Q(user__first_name__icontains=term) | Q(user__last_name__icontains=term)
+    )
+    prefix_search = search.accounts(listing, term)
+
+    def page(queryset, count):
+        count(queryset)
+        list(queryset[:50])
+
+    results = {
+        'stock list': timed(lambda: page(listing, lambda qs: qs.count()), calls),
+        'api.admin list': timed(lambda: page(listing, lambda qs: admin.EstimatedCountPaginator(qs, 50).count), calls),
+        'stock search': timed(lambda: page(stock_search, lambda qs: qs.count()), calls),
+        'api.admin search': timed(
+            lambda: page(prefix_search, lambda qs: admin.EstimatedCountPaginator(qs, 50).count), calls
+        ),
+    }
+    for label, ms in results.items():
+        print(f"{label:>16}: p50 {ms:.2f} ms")
+    print(f"{prefix_search.count()} of {accounts} accounts match '{term}'")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--calls', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.accounts, args.calls)
+
+
+if __name__ == '__main__':
+    main()
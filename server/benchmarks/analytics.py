@@ -0,0 +1,127 @@
+# server/benchmarks/analytics.py
+"""
+Analytics responses from the monthly summaries against aggregating the ledger per request.
+
+Run from the server directory:
+
+    python -m benchmarks.analytics [--rows 1000 10000 100000] [--calls 50]
+
+Seeds one account per size with that many ledger rows spread over two
+years, rebuilds the summaries with `manage.py rebuild_summaries`, then
+times a year of month buckets both ways. The ledger aggregate only finds
+inflow, outflow and spend; average balances would cost it more.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+import django
+
+from .api_load import percentile
+from .database import temporary_database
+
+ROW_COUNTS = [1000, 10000, 100000]
+START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def seed(rows, number):
+    from api import identifiers, money
+    from api.models import User, Account, Transaction
+
+    rng = random.Random(number)
+    user = User.objects.create_user(
+        email=f'bench{number}@example.com', first_name='Bench', last_name=str(number), password=None
+    )
+    account = Account.objects.create(user=user, account_number=identifiers.next_account_number())
+    balance, entries = 0, []
+    step = timedelta(days=730) / rows
+    for index in range(rows):
+        amount = rng.randint(1, 100_000) if balance < 50_000 or rng.random() < 0.5 else -rng.randint(1, balance)
+        balance += amount
+        entries.append(Transaction(
+            account=account, transaction_type=Transaction.DEPOSIT if amount > 0 else Transaction.WITHDRAWAL,
+            amount=money.to_decimal(amount), balance_after=money.to_decimal(balance),
+            created_at=START + step * index,
+        ))
+    Transaction.objects.bulk_create(entries, batch_size=5000)
+    Account.objects.filter(pk=account.pk).update(balance=balance)
+    return account.pk
+
+
+def scan(account_id, since, until):
+    """What a response costs without summaries: a GROUP BY over the range of the ledger"""
+    from django.db.models import Q, Sum
+    from django.db.models.functions import TruncMonth
+
+    from api import rollups
+    from api.models import Transaction
+
+    return list(
+        Transaction.objects.filter(
+            account_id=account_id,
+            created_at__gte=rollups.day_start(since),
+            created_at__lt=rollups.day_start(until + timedelta(days=31)),
+        )
+        .annotate(month=TruncMonth('created_at'))
+        .values('month')
+        .annotate(
+            inflow=Sum('amount', filter=Q(amount__gt=0)),
+            outflow=Sum('amount', filter=Q(amount__lt=0)),
+            spend=Sum('amount', filter=Q(transaction_type__in=rollups.SPEND_TYPES)),
+        )
+        .order_by('month')
+    )
+
+
+def timed(function, calls):
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 50) * 1000
+
+
+def run(row_counts=ROW_COUNTS, calls=50):
+    from django.core.management import call_command
+
+    from api import analytics
+
+    accounts = [seed(rows, number) for number, rows in enumerate(row_counts)]
+    out = StringIO()
+    call_command('rebuild_summaries', stdout=out)
+    print(out.getvalue().strip(), f'({sum(row_counts)} ledger rows)')
+
+    since, until = date(2025, 1, 1), date(2025, 12, 1)
+    results = []
+    for rows, account_id in zip(row_counts, accounts):
+        result = {
+            'rows': rows,
+            'summaries_ms': timed(lambda: analytics.months(account_id, since, until), calls),
+            'ledger_ms': timed(lambda: scan(account_id, since, until), calls),
+        }
+        results.append(result)
+        print(
+            f"{rows:>7} rows: summaries p50 {result['summaries_ms']:.2f} ms, "
+            f"ledger aggregate p50 {result['ledger_ms']:.2f} ms"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=ROW_COUNTS, help='Ledger rows per account')
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.rows, args.calls)
+
+
+if __name__ == '__main__':
+    main()
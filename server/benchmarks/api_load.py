@@ -0,0 +1,265 @@
+# server/benchmarks/api_load.py
+"""
+Latency, throughput and queries per request for the main API operations.
+
+Operations run through Django's test client in-process ("client" mode)
+and/or over HTTP against a real local server ("server" mode), from a
+configurable number of threads. Use `manage.py bench` to run it.
+"""
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+OPERATIONS = ['register', 'login', 'account', 'deposit', 'withdraw']
+MODES = ['client', 'server']
+PASSWORD = 's3cure-Passw0rd'
+
+
+class QueryCounter:
+    """Counts queries on every connection, including server threads"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(self._on_connection, weak=False)
+        for connection in connections.all(initialized_only=True):
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        connection_created.disconnect(self._on_connection)
+        for connection in connections.all(initialized_only=True):
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def _on_connection(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class ClientTransport:
+    """Sends requests through django.test.Client, one client per thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        from django.test import Client
+
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if method == 'GET':
+            response = client.get(path, **headers)
+        else:
+            response = client.post(path, body, content_type='application/json', **headers)
+        return response.status_code, response.content
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """Sends HTTP requests to a local threaded WSGI server"""
+
+    def __init__(self):
+        from django.conf import settings
+        from django.test.testcases import LiveServerThread
+
+        # setup_test_environment() leaves only 'testserver' allowed
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'localhost']
+        self.thread = LiveServerThread('localhost', static_handler=_passthrough, port=0)
+        self.thread.daemon = True
+        self.thread.start()
+        self.thread.is_ready.wait()
+        if self.thread.error:
+            raise self.thread.error
+        self.base_url = f'http://localhost:{self.thread.port}'
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def close(self):
+        self.thread.terminate()
+
+
+def _passthrough(handler):
+    return handler
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Scenario:
+    """Prepares users and tokens and builds the request for each operation"""
+
+    def __init__(self, transport, users):
+        self.transport = transport
+        self.users = users
+        self._serial = 0
+        self._lock = threading.Lock()
+
+    def next_serial(self):
+        with self._lock:
+            self._serial += 1
+            return self._serial
+
+    @classmethod
+    def prepare(cls, transport, count):
+        from api import ledger
+        from api.authentication import tokens_for_user
+        from api.models import User, Account
+
+        users = []
+        for _ in range(count):
+            serial = time.time_ns()
+            user = User.objects.create_user(
+                email=f'load{serial}@example.com', first_name='Load', last_name='Test', password=PASSWORD
+            )
+            account = Account.objects.create(user=user)
+            ledger.deposit(account.pk, 100_000_000)
+            users.append({'email': user.email, 'token': tokens_for_user(user)['access']})
+        return cls(transport, users)
+
+    def call(self, operation, worker):
+        user = self.users[worker % len(self.users)]
+        if operation == 'register':
+            serial = self.next_serial()
+            return self.transport.request('POST', '/api/auth/register/', {
+                'email': f'bench-{time.time_ns()}-{serial}@example.com',
+                'first_name': 'Bench',
+                'last_name': 'User',
+                'password': PASSWORD,
+                'password_confirm': PASSWORD,
+            })
+        if operation == 'login':
+            return self.transport.request('POST', '/api/auth/login/', {
+                'email': user['email'], 'password': PASSWORD,
+            })
+        if operation == 'account':
+            return self.transport.request('GET', '/api/account/', token=user['token'])
+        if operation == 'deposit':
+            return self.transport.request('POST', '/api/account/deposit/', {'amount': '1.00'}, token=user['token'])
+        if operation == 'withdraw':
+            return self.transport.request('POST', '/api/account/withdraw/', {'amount': '1.00'}, token=user['token'])
+        raise ValueError(f'unknown operation {operation!r}')
+
+
+def run_operation(scenario, operation, concurrency, requests):
+    """Send `requests` calls per thread from `concurrency` threads"""
+    from django.db import connections
+
+    counter = QueryCounter()
+    counter.install()
+
+    def work(worker):
+        latencies, errors = [], 0
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                status, _ = scenario.call(operation, worker)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+        finally:
+            connections.close_all()
+        return latencies, errors
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            outcomes = list(executor.map(work, range(concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        counter.uninstall()
+
+    latencies = sorted(sample for samples, _ in outcomes for sample in samples)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': sum(errors for _, errors in outcomes),
+        'rps': total / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_request': counter.count / total,
+    }
+
+
+def run(modes=MODES, operations=OPERATIONS, concurrency=4, requests=50):
+    """Run every operation in every mode and return the results document"""
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    # All load comes from one IP and a few users; keep every scope checked,
+    # so throttling overhead is measured, but with room for the whole run
+    config = getattr(settings, 'THROTTLING', {})
+    rates = {scope: '1000000/s' for scope in config.get('RATES', {})}
+    with override_settings(THROTTLING={**config, 'RATES': rates}):
+        return _run(modes, operations, concurrency, requests)
+
+
+def _run(modes, operations, concurrency, requests):
+    results = {}
+    for mode in modes:
+        transport = ClientTransport() if mode == 'client' else ServerTransport()
+        try:
+            scenario = Scenario.prepare(transport, concurrency)
+            results[mode] = {
+                operation: run_operation(scenario, operation, concurrency, requests)
+                for operation in operations
+            }
+        finally:
+            transport.close()
+    return {
+        'concurrency': concurrency,
+        'requests_per_thread': requests,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Yield (mode, operation, metric, before, after, change) rows and whether
+    each regressed by more than threshold percent.
+    """
+    for mode, operations in current['results'].items():
+        for operation, metrics in operations.items():
+            before = baseline.get('results', {}).get(mode, {}).get(operation)
+            if not before:
+                continue
+            for metric, higher_is_better in [('rps', True), ('p95_ms', False), ('queries_per_request', False)]:
+                if not before[metric]:
+                    continue
+                change = (metrics[metric] - before[metric]) / before[metric] * 100
+                regressed = -change > threshold if higher_is_better else change > threshold
+                yield mode, operation, metric, before[metric], metrics[metric], change, regressed
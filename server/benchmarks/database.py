@@ -0,0 +1,27 @@
+# server/benchmarks/database.py
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def temporary_database(aliases=(DEFAULT_DB_ALIAS,)):
+    """
+    Run a benchmark against freshly migrated throwaway databases, default
+    and any other aliases given, such as account shards.
+
+    They use the configured TEST databases, so benchmarks never write to
+    the real ones.
+    """
+    setup_test_environment()
+    created = []
+    try:
+        for alias in aliases:
+            connection = connections[alias]
+            created.append((connection, connection.creation.create_test_db(verbosity=0, autoclobber=True)))
+        yield
+    finally:
+        for connection, old_name in reversed(created):
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,102 @@
+# server/benchmarks/database_profile.py
+"""
+Deposits and balance reads per second under the configured database profile.
+
+Run from the server directory, once per profile to compare them:
+
+    python -m benchmarks.database_profile [--writers 4] [--readers 4]
+    DJANGO_SQLITE_TUNING=0 python -m benchmarks.database_profile
+
+Writer threads post deposits while reader threads page through history
+and read balances, so the run shows how well readers and the writer
+coexist. Reads are counted over the same wall-clock window as writes.
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+from .database import temporary_database
+
+
+def run(writers=4, readers=4, deposits=200, accounts=8):
+    from django.db import connection, connections
+
+    from api import ledger
+    from api.models import User, Account, Transaction
+    from api.pagination import keyset_page
+
+    pool = []
+    for i in range(accounts):
+        user = User.objects.create_user(
+            email=f'bench{i}@example.com', first_name='Bench', last_name=str(i), password=None
+        )
+        pool.append(Account.objects.create(user=user).pk)
+    writing = threading.Event()
+    writing.set()
+
+    def write(worker):
+        try:
+            for i in range(deposits):
+                ledger.deposit(pool[(worker + i) % accounts], 100)
+        finally:
+            connections.close_all()
+        return deposits
+
+    def read(worker):
+        reads = 0
+        try:
+            while writing.is_set():
+                account_id = pool[(worker + reads) % accounts]
+                Account.objects.values_list('balance', flat=True).get(pk=account_id)
+                keyset_page(Transaction.objects.filter(account_id=account_id), limit=20)
+                reads += 1
+        finally:
+            connections.close_all()
+        return reads
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(writers + readers) as executor:
+        reading = [executor.submit(read, worker) for worker in range(readers)]
+        written = sum(executor.map(write, range(writers)))
+        elapsed = time.perf_counter() - started
+        writing.clear()
+        reads = sum(future.result() for future in reading)
+
+    journal_mode = None
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+    result = {
+        'vendor': connection.vendor,
+        'journal_mode': journal_mode,
+        'deposits_per_sec': written / elapsed,
+        'reads_per_sec': reads / elapsed,
+    }
+    print(
+        f"{connection.vendor} ({journal_mode or 'server'}), {writers} writers, {readers} readers: "
+        f"{result['deposits_per_sec']:.0f} deposits/sec, {result['reads_per_sec']:.0f} reads/sec"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--deposits', type=int, default=200, help='Deposits per writer')
+    parser.add_argument('--accounts', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.writers, args.readers, args.deposits, args.accounts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# server/benchmarks/group_commit.py
+"""
+Deposits and commits per second with and without ledger group commit.
+
+Run from the server directory:
+
+    python -m benchmarks.group_commit [--threads 16] [--windows 0 0.001 0.005 0.02]
+
+Each thread posts deposits to its own account, as under a payroll burst.
+The direct path commits once per deposit; with batching enabled, one
+commit covers every deposit queued during the window.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+from .api_load import QueryCounter, percentile
+from .database import temporary_database
+
+WINDOWS = [0, 0.001, 0.005, 0.02]
+
+
+class CommitCounter(QueryCounter):
+    """Counts ledger INSERTs; both paths write exactly one per commit"""
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith('INSERT INTO "api_transaction"'):
+            with self._lock:
+                self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _post(pool, deposits):
+    from django.db import connections
+
+    from api import ledger
+
+    def work(account_id):
+        latencies = []
+        try:
+            for _ in range(deposits):
+                started = time.perf_counter()
+                ledger.deposit(account_id, 100)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(pool)) as executor:
+        latencies = sorted(sample for samples in executor.map(work, pool) for sample in samples)
+    return latencies, time.perf_counter() - started
+
+
+def run(threads=16, deposits=50, windows=WINDOWS, max_batch=100):
+    from django.test.utils import override_settings
+
+    from api import batching
+    from api.models import User, Account, Transaction
+
+    pool = []
+    for i in range(threads):
+        user = User.objects.create_user(
+            email=f'bench{i}@example.com', first_name='Bench', last_name=str(i), password=None
+        )
+        pool.append(Account.objects.create(user=user).pk)
+
+    results = []
+    for window in [None, *windows]:
+        config = {'ENABLED': window is not None, 'WINDOW': window or 0, 'MAX_BATCH': max_batch}
+        commits = CommitCounter()
+        commits.install()
+        try:
+            with override_settings(LEDGER_BATCHING=config):
+                latencies, elapsed = _post(pool, deposits)
+                # Stop the writer thread so the next window starts a fresh one
+                batching.reset()
+        finally:
+            commits.uninstall()
+
+        posted = len(latencies)
+        label = 'direct' if window is None else f'window {window * 1000:g} ms'
+        result = {
+            'mode': label,
+            'deposits_per_sec': posted / elapsed,
+            'commits_per_sec': commits.count / elapsed,
+            'deposits_per_commit': posted / commits.count,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+        results.append(result)
+        print(
+            f"{label:>16}: {result['deposits_per_sec']:6.0f} deposits/sec, "
+            f"{result['commits_per_sec']:5.0f} commits/sec, "
+            f"{result['deposits_per_commit']:5.1f} deposits/commit, "
+            f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+        )
+
+    expected = len(results) * threads * deposits
+    assert Transaction.objects.count() == expected, 'lost or duplicated ledger rows'
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--deposits', type=int, default=50, help='Deposits per thread')
+    parser.add_argument('--windows', type=float, nargs='+', default=WINDOWS, help='Batch windows in seconds')
+    parser.add_argument('--max-batch', type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.threads, args.deposits, args.windows, args.max_batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# server/benchmarks/money.py
+"""
+Amount parsing and balance arithmetic before and after the money module.
+
+Run from the server directory:
+
+    python -m benchmarks.money [--amounts 100000] [--batch-size 100]
+
+"float" is the old view path: float(), the sign check, then quantizing
+through Decimal(str()). "decimal" is the old transfer path. Both are
+compared with money.parse_amount() per value and money.parse_amounts()
+per transfer batch, on the same decimal strings clients send. The run
+fails if any path disagrees on an amount.
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+CENT = Decimal('0.01')
+
+
+def old_float(value):
+    amount = float(value)
+    if amount <= 0:
+        raise ValueError('Amount must be positive')
+    return Decimal(str(amount)).quantize(CENT)
+
+
+def old_decimal(value):
+    amount = Decimal(str(value)).quantize(CENT)
+    if amount <= 0:
+        raise ValueError('Amount must be positive')
+    return amount
+
+
+def timed(work, repeat):
+    """Best of `repeat` runs of work(), and its output"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = work()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def report(name, amounts, elapsed):
+    print(f"{name:<14} {amounts} amounts: {elapsed * 1000:7.1f} ms, {elapsed / amounts * 1e9:6.0f} ns each")
+
+
+def run(amounts=100000, batch_size=100, repeat=5, seed=1):
+    from api import money
+
+    rng = random.Random(seed)
+    values = [f'{rng.randint(0, 99999)}.{rng.randint(1, 99):02d}' for _ in range(amounts)]
+    batches = [values[i:i + batch_size] for i in range(0, amounts, batch_size)]
+
+    cases = {
+        'float': lambda: [old_float(value) for value in values],
+        'decimal': lambda: [old_decimal(value) for value in values],
+        'parse_amount': lambda: [money.parse_amount(value) for value in values],
+        'parse_amounts': lambda: [amount for batch in batches for amount in money.parse_amounts(batch)],
+    }
+    results, outputs = {}, {}
+    for name, parse in cases.items():
+        results[name], outputs[name] = timed(parse, repeat)
+        report(name, amounts, results[name])
+    expected = outputs['parse_amount']
+    for name, output in outputs.items():
+        if [money.to_minor(amount) if isinstance(amount, Decimal) else amount for amount in output] != expected:
+            raise AssertionError(f'{name}: amounts differ')
+
+    # Applying the parsed amounts to a running balance
+    for name, parsed, zero in [('Decimal sum', outputs['decimal'], Decimal('0.00')), ('int sum', expected, 0)]:
+        results[name], _ = timed(lambda: sum(parsed, zero), repeat)
+        report(name, amounts, results[name])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--amounts', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=100, help='Amounts per transfer batch')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per path; the best is reported')
+    args = parser.parse_args()
+    run(args.amounts, args.batch_size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# server/benchmarks/password_hashing.py
+"""
+Logins per second per core for each password hashing policy.
+
+Run from the server directory:
+
+    python -m benchmarks.password_hashing [--seconds 3]
+
+Each hasher verifies a correct password on one thread for the given time,
+which is the CPU cost of one successful login.
+"""
+import argparse
+import os
+import time
+
+import django
+
+HASHERS = [
+    ('pbkdf2_sha256 (Django default)', 'django.contrib.auth.hashers.PBKDF2PasswordHasher'),
+    ('scrypt (tuned policy)', 'api.hashers.TunedScryptPasswordHasher'),
+    ('argon2 (tuned policy)', 'api.hashers.TunedArgon2PasswordHasher'),
+]
+
+
+def measure(hasher, seconds):
+    encoded = hasher.encode('s3cure-Passw0rd', hasher.salt())
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        hasher.verify('s3cure-Passw0rd', encoded)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def run(seconds=3.0):
+    from django.utils.module_loading import import_string
+
+    results = {}
+    for label, path in HASHERS:
+        try:
+            hasher = import_string(path)()
+            if hasher.library:
+                hasher._load_library()
+        except ValueError:
+            print(f"{label:<32} skipped (library not installed)")
+            continue
+        results[label] = measure(hasher, seconds)
+        print(f"{label:<32} {results[label]:8.1f} logins/sec/core")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    run(args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# server/benchmarks/reconciliation.py
+"""
+Ledger rows verified per second by `manage.py reconcile`.
+
+Run from the server directory:
+
+    python -m benchmarks.reconciliation [--accounts 2000] [--rows 100]
+
+Seeds accounts with `--rows` ledger entries each, then reconciles them
+with every available method, inline and across worker processes.
+"""
+import argparse
+import os
+import random
+import time
+from io import StringIO
+
+import django
+
+from .database import temporary_database
+
+
+def seed(accounts, rows):
+    from api import identifiers, money
+    from api.models import User, Account, Transaction
+
+    rng = random.Random(0)
+    for start in range(0, accounts, 500):
+        count = min(500, accounts - start)
+        users = User.objects.bulk_create([
+            User(email=f'bench{start + i}@example.com', username=f'bench{start + i}',
+                 first_name='Bench', last_name=str(start + i))
+            for i in range(count)
+        ])
+        created = Account.objects.bulk_create([
+            Account(user=user, account_number=identifiers.next_account_number()) for user in users
+        ])
+        entries = []
+        for account in created:
+            balance = 0
+            for _ in range(rows):
+                amount = rng.randint(1, 100_000)
+                balance += amount
+                entries.append(Transaction(
+                    account=account, transaction_type=Transaction.DEPOSIT,
+                    amount=money.to_decimal(amount), balance_after=money.to_decimal(balance),
+                ))
+            account.balance = balance
+        Transaction.objects.bulk_create(entries, batch_size=5000)
+        Account.objects.bulk_update(created, ['balance'], batch_size=500)
+
+
+def run(accounts=2000, rows=100, workers=(1, 2)):
+    from django.core.management import call_command
+
+    from api import reconciliation
+
+    started = time.perf_counter()
+    seed(accounts, rows)
+    print(f"Seeded {accounts} accounts x {rows} rows in {time.perf_counter() - started:.1f}s")
+    results = []
+    for method in reconciliation.METHODS:
+        for count in workers:
+            out = StringIO()
+            call_command('reconcile', method=method, workers=count, stdout=out)
+            summary = out.getvalue().splitlines()[0]
+            print(summary)
+            results.append(summary)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=100, help='Ledger rows per account')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2])
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.accounts, args.rows, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# server/benchmarks/serializers.py
+"""
+DRF serializers and JSONRenderer against the precompiled serializers and the
+configured renderer, on the account, profile and login payloads.
+
+Run from the server directory:
+
+    python -m benchmarks.serializers [--objects 10000]
+
+Objects are built in memory, so no database is needed. Token minting is
+the same in both paths and is left out; the login payload carries a fixed
+token pair. The run fails if the two paths produce different bytes.
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import timedelta
+
+import django
+
+
+def build(count):
+    from django.utils import timezone
+
+    from api.models import User, Account
+
+    now = timezone.now()
+    accounts = []
+    for i in range(count):
+        user = User(
+            id=uuid.uuid4(), email=f'user{i}@example.com', first_name='Jane', last_name=f'Doe {i}',
+            date_joined=now - timedelta(seconds=i),
+        )
+        accounts.append(Account(
+            id=uuid.uuid4(), user=user, balance=i * 1234567 // 7, account_number=f'NB{i:010d}',
+            created_at=now - timedelta(seconds=i),
+        ))
+    return accounts
+
+
+def timed(label, payloads, render):
+    started = time.perf_counter()
+    output = [render(payload()) for payload in payloads]
+    elapsed = time.perf_counter() - started
+    return label, elapsed, output
+
+
+def run(count=10000):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.settings import api_settings
+
+    from api.fast_serializers import account_payload, user_payload
+    from api.serializers import AccountSerializer, UserSerializer
+
+    accounts = build(count)
+    tokens = {'refresh': 'r' * 200, 'access': 'a' * 200}
+    drf = JSONRenderer().render
+    fast = api_settings.DEFAULT_RENDERER_CLASSES[0]().render
+    cases = {
+        'account': (
+            [lambda a=a: AccountSerializer(a).data for a in accounts],
+            [lambda a=a: account_payload(a) for a in accounts],
+        ),
+        'profile': (
+            [lambda a=a: UserSerializer(a.user).data for a in accounts],
+            [lambda a=a: user_payload(a.user) for a in accounts],
+        ),
+        'login': (
+            [lambda a=a: {'message': 'Login successful', 'user': UserSerializer(a.user).data, 'tokens': tokens}
+             for a in accounts],
+            [lambda a=a: {'message': 'Login successful', 'user': user_payload(a.user), 'tokens': tokens}
+             for a in accounts],
+        ),
+    }
+    results = {}
+    for name, (before, after) in cases.items():
+        _, slow_time, slow_output = timed(name, before, drf)
+        _, fast_time, fast_output = timed(name, after, fast)
+        if slow_output != fast_output:
+            raise AssertionError(f'{name}: outputs differ')
+        results[name] = (slow_time, fast_time)
+        print(
+            f"{name:<8} {count} objects: DRF {slow_time * 1000:7.1f} ms, "
+            f"compiled {fast_time * 1000:6.1f} ms ({slow_time / fast_time:.1f}x)"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--objects', type=int, default=10000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    run(args.objects)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# server/benchmarks/sharding.py
+"""
+Deposits per second with every account on one database and spread over shards.
+
+Run from the server directory:
+
+    python -m benchmarks.sharding [--threads 16] [--shards 0 2 4]
+
+Each thread posts deposits to its own account. SQLite takes one writer
+per database file, so with one database every commit queues behind the
+others; with accounts sharded, commits to different shards go ahead side
+by side. The shards here are SQLite files on one machine, so this shows
+the write lock being split, not what separate database servers add.
+"""
+import argparse
+import os
+from collections import Counter
+
+import django
+
+from .api_load import percentile
+from .database import temporary_database
+from .group_commit import _post
+
+SHARD_COUNTS = [0, 2, 4]
+
+
+def run(threads=16, deposits=50, shard_counts=SHARD_COUNTS):
+    from django.test.utils import override_settings
+
+    from api import sharding
+    from api.models import User, Account, Transaction
+
+    results = []
+    for count in shard_counts:
+        with override_settings(ACCOUNT_SHARDING={'SHARDS': [f'shard_{index}' for index in range(count)]}):
+            pool = []
+            for i in range(threads):
+                user = User.objects.create_user(
+                    email=f'bench{count}-{i}@example.com', first_name='Bench', last_name=str(i), password=None
+                )
+                account = Account(user=user)
+                account.save()
+                pool.append(account.pk)
+            latencies, elapsed = _post(pool, deposits)
+            spread = Counter(sharding.locate(account_id) for account_id in pool)
+
+        label = f'{count} shards' if count else 'default only'
+        result = {
+            'layout': label,
+            'deposits_per_sec': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'accounts_per_database': dict(sorted(spread.items())),
+        }
+        results.append(result)
+        print(
+            f"{label:>13}: {result['deposits_per_sec']:6.0f} deposits/sec, "
+            f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+            f"accounts {' '.join(f'{db}={n}' for db, n in result['accounts_per_database'].items())}"
+        )
+
+    aliases = ['default', *(f'shard_{index}' for index in range(max(shard_counts)))]
+    posted = sum(Transaction.objects.using(alias).count() for alias in aliases)
+    assert posted == len(shard_counts) * threads * deposits, 'lost or duplicated ledger rows'
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--deposits', type=int, default=50, help='Deposits per thread')
+    parser.add_argument(
+        '--shards', type=int, nargs='+', default=SHARD_COUNTS, help='Shard counts to compare; 0 is default only'
+    )
+    args = parser.parse_args()
+
+    # Defines the shard_N databases; each run picks its layout itself
+    os.environ.setdefault('DJANGO_ACCOUNT_SHARDS', str(max(args.shards)))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database(['default', *(f'shard_{index}' for index in range(max(args.shards)))]):
+        run(args.threads, args.deposits, args.shards)
+
+
+if __name__ == '__main__':
+    main()
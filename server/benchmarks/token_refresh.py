@@ -0,0 +1,85 @@
+# server/benchmarks/token_refresh.py
+"""
+Refresh token rotation: simplejwt's TokenRefreshSerializer against
+api.tokens.rotate(), with a populated blacklist.
+
+Run from the server directory:
+
+    python -m benchmarks.token_refresh [--blacklisted 50000] [--refreshes 300]
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import timedelta
+
+import django
+
+from .database import temporary_database
+
+
+def seed_blacklist(count, user):
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    expires = timezone.now() + timedelta(days=30)
+    for start in range(0, count, 5000):
+        outstanding = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=user, jti=uuid.uuid4().hex, token='', expires_at=expires)
+            for _ in range(min(5000, count - start))
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in outstanding])
+
+
+def run(blacklisted=50000, refreshes=300):
+    from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
+    from api import tokens
+    from api.authentication import tokens_for_user
+    from api.models import User, Account
+    from benchmarks.api_load import QueryCounter
+
+    user = User.objects.create_user(email='bench@example.com', first_name='Bench', last_name='User', password=None)
+    Account.objects.create(user=user)
+    seed_blacklist(blacklisted, user)
+    tokens.blacklist.rebuild()
+
+    def simplejwt(raw):
+        serializer = TokenRefreshSerializer(data={'refresh': raw})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    results = {}
+    for label, rotate in [('simplejwt', simplejwt), ('fast path', tokens.rotate)]:
+        raw = tokens_for_user(user)['refresh']
+        counter = QueryCounter()
+        counter.install()
+        started = time.perf_counter()
+        try:
+            for _ in range(refreshes):
+                raw = rotate(raw)['refresh']
+        finally:
+            counter.uninstall()
+        elapsed = time.perf_counter() - started
+        results[label] = (refreshes / elapsed, counter.count / refreshes)
+        print(
+            f"{label:<10} {refreshes / elapsed:6.0f} refreshes/sec, "
+            f"{counter.count / refreshes:.1f} queries each ({blacklisted} blacklisted tokens)"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blacklisted', type=int, default=50000)
+    parser.add_argument('--refreshes', type=int, default=300)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.blacklisted, args.refreshes)
+
+
+if __name__ == '__main__':
+    main()
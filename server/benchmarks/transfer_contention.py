@@ -0,0 +1,92 @@
+# server/benchmarks/transfer_contention.py
+"""
+Throughput of batch transfers when many threads hit the same accounts.
+
+Run from the server directory:
+
+    python -m benchmarks.transfer_contention [--threads 8] [--accounts 10]
+
+Every thread sends batches between randomly chosen accounts from a small
+pool, so batches constantly overlap and contend for the same row locks.
+The run fails if money was created or lost.
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+from .database import temporary_database
+
+
+def run(threads=8, accounts=10, batches=50, batch_size=5):
+    from django.db import connections
+    from django.db.models import Sum
+
+    from api import transfers
+    from api.models import User, Account
+
+    pool = []
+    for i in range(accounts):
+        user = User.objects.create_user(
+            email=f'bench{i}@example.com', first_name='Bench', last_name=str(i), password=None
+        )
+        pool.append(Account.objects.create(user=user, balance=100_000_000))
+    numbers = [account.account_number for account in pool]
+    opening = Account.objects.aggregate(total=Sum('balance'))['total']
+
+    def work(seed):
+        rng = random.Random(seed)
+        completed = 0
+        try:
+            for _ in range(batches):
+                source = rng.choice(pool)
+                items = [
+                    {'to_account': rng.choice(numbers), 'amount': f'{rng.randint(1, 100)}.00'}
+                    for _ in range(batch_size)
+                ]
+                results, _ = transfers.execute(source.pk, items)
+                completed += sum(result['status'] == transfers.COMPLETED for result in results)
+        finally:
+            connections.close_all()
+        return completed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        completed = sum(executor.map(work, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    closing = Account.objects.aggregate(total=Sum('balance'))['total']
+    if closing != opening:
+        raise AssertionError(f'money not conserved: {opening} -> {closing}')
+
+    result = {
+        'threads': threads,
+        'batches_per_sec': threads * batches / elapsed,
+        'transfers_per_sec': completed / elapsed,
+    }
+    print(
+        f"{threads} threads, {accounts} accounts: "
+        f"{result['batches_per_sec']:.0f} batches/sec, {result['transfers_per_sec']:.0f} transfers/sec"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--batches', type=int, default=50, help='Batches per thread')
+    parser.add_argument('--batch-size', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    django.setup()
+    with temporary_database():
+        run(args.threads, args.accounts, args.batches, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,15 @@ ASGI config for server project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+To serve the read endpoints (health, profile, account, transaction history)
+from async-native views, run under uvicorn with DJANGO_ASYNC_VIEWS=1:
+
+    DJANGO_ASYNC_VIEWS=1 uvicorn server.asgi:application --workers 4
+
+Each worker then holds many concurrent slow clients such as dashboard
+long-polls on one event loop instead of one thread per connection. Write
+endpoints keep running as sync DRF views in Django's thread pool.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
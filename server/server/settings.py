@@ -1,4 +1,6 @@
 # server/server/settings.py
+import copy
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -29,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'api.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -39,6 +43,24 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request metrics served at /api/metrics/; slow requests are logged with
+# their SQL to the 'api.slow_requests' logger
+METRICS = {
+    'SLOW_REQUEST_THRESHOLD': 1.0,
+    'MAX_CAPTURED_QUERIES': 50,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Balance change events behind /api/account/events/. The default broker only
+# reaches streams in the same process; 'api.events.UnixSocketBroker' fans
+# events out to every worker on the host
+BALANCE_EVENTS = {
+    'BACKEND': 'api.events.LocalBroker',
+    'OPTIONS': {},
+    'KEEPALIVE_INTERVAL': 15,
+    'STREAM_TIMEOUT': 300,
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'api.User'
 
@@ -71,22 +93,215 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'server.wsgi.application'
 
-# Database
-DATABASES = {
+# Serve health, profile, account, balance events and transaction history
+# from the async views in api.async_views; only worthwhile under ASGI (see
+# server/asgi.py)
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
+
+# Database. The profile comes from the environment: DJANGO_DB_ENGINE picks
+# sqlite (default) or postgresql, and the other DJANGO_DB_* variables tune it
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'webbank'),
+            'USER': os.environ.get('DJANGO_DB_USER', 'webbank'),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DJANGO_DB_PORT', '5432'),
+            # Reused connections are checked before each request
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('DJANGO_DB_POOL', '1') == '1':
+        # psycopg3 connection pool, shared by the threads of a worker.
+        # Django requires CONN_MAX_AGE to stay 0 when pooling
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX', 20)),
+                'timeout': int(os.environ.get('DJANGO_DB_POOL_TIMEOUT', 10)),
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # SQLite ignores select_for_update(); taking the write lock at BEGIN
+            # makes read-then-write transactions queue instead of failing with
+            # "database is locked" when they try to upgrade
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('DJANGO_DB_BUSY_TIMEOUT', 20)),
+            },
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # A file-backed test database lets concurrency tests open real
+            # connections from several threads
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+# Account sharding, see api.sharding. DJANGO_ACCOUNT_SHARDS=N adds databases
+# shard_0..shard_N-1 next to default, named after it, and spreads accounts
+# and their ledgers across them; users and everything else stay on
+# default. Run `manage.py migrate --database shard_N` for each. After
+# changing N, list the old aliases in DJANGO_ACCOUNT_PREVIOUS_SHARDS
+# (comma separated, "default" when there were none) until
+# `manage.py rebalance_shards` has run. server.test_settings always
+# defines two shards for the sharding tests, which switch them on themselves
+def _shard_database(index):
+    shard = copy.deepcopy(DATABASES['default'])
+    if DB_ENGINE == 'postgresql':
+        shard['NAME'] = f"{shard['NAME']}_shard_{index}"
+    else:
+        name = Path(shard['NAME'])
+        shard['NAME'] = name.with_name(f'{name.stem}_shard_{index}{name.suffix}')
+        shard['TEST'] = {'NAME': BASE_DIR / f'test_db_shard_{index}.sqlite3'}
+    return shard
+
+
+ACCOUNT_SHARD_COUNT = int(os.environ.get('DJANGO_ACCOUNT_SHARDS', 0))
+DATABASES.update({f'shard_{index}': _shard_database(index) for index in range(ACCOUNT_SHARD_COUNT)})
+
+ACCOUNT_SHARDING = {
+    'SHARDS': [f'shard_{index}' for index in range(ACCOUNT_SHARD_COUNT)],
+    'PREVIOUS_SHARDS': [alias for alias in os.environ.get('DJANGO_ACCOUNT_PREVIOUS_SHARDS', '').split(',') if alias],
+}
+
+# Read replicas for GET endpoints, see api.replicas. With SQLite,
+# DJANGO_READ_REPLICAS=N adds databases replica_0..replica_N-1, files that
+# `manage.py sync_replicas` keeps refreshed as copies of default; with
+# PostgreSQL, DJANGO_DB_REPLICA_HOSTS lists the hosts of streaming
+# replicas of default, which `manage.py sync_replicas --interval 1` only
+# stamps the lag heartbeat for. server.test_settings defines one replica
+# for the replica tests, which switch it on themselves
+def _replica_database(index, host=None):
+    replica = copy.deepcopy(DATABASES['default'])
+    if DB_ENGINE == 'postgresql':
+        replica['HOST'] = host or replica['HOST']
+        replica['TEST'] = {'MIRROR': 'default'}
+    else:
+        name = Path(replica['NAME'])
+        replica['NAME'] = name.with_name(f'{name.stem}_replica_{index}{name.suffix}')
+        replica['TEST'] = {'NAME': BASE_DIR / f'test_db_replica_{index}.sqlite3'}
+    return replica
+
+
+if DB_ENGINE == 'postgresql':
+    REPLICA_HOSTS = [host for host in os.environ.get('DJANGO_DB_REPLICA_HOSTS', '').split(',') if host]
+else:
+    REPLICA_HOSTS = [None] * int(os.environ.get('DJANGO_READ_REPLICAS', 0))
+DATABASES.update({f'replica_{index}': _replica_database(index, host) for index, host in enumerate(REPLICA_HOSTS)})
+
+READ_REPLICAS = {
+    'REPLICAS': {'default': [f'replica_{index}' for index in range(len(REPLICA_HOSTS))]} if REPLICA_HOSTS else {},
+    # Seconds a user's reads stay on the primary after they write
+    'STICKY_SECONDS': float(os.environ.get('DJANGO_READ_STICKY_SECONDS', 5)),
+    'MAX_LAG': float(os.environ.get('DJANGO_READ_MAX_LAG', 2)),
+    'CHECK_INTERVAL': 1,
+}
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter', 'api.sharding.AccountShardRouter']
+
+# Applied to every new SQLite connection by api.db.apply_sqlite_pragmas. WAL
+# lets readers run alongside the single writer, and synchronous=NORMAL only
+# syncs at checkpoints, which is durable against crashes of the process
+# though not of the OS. Set DJANGO_SQLITE_TUNING=0 for SQLite's defaults
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+} if os.environ.get('DJANGO_SQLITE_TUNING', '1') == '1' else {}
+
+# Cache. Per process unless DJANGO_REDIS_URL names a Redis server every
+# worker shares (needs the redis package)
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['DJANGO_REDIS_URL'],
+    }
+
+# Pre-rendered GET /api/account/ responses, invalidated on every posting;
+# must be shared between workers in production. A process-local cache like
+# the default never hears of postings made by other workers, so snapshots in
+# it are kept for a second at most (api.snapshots.PROCESS_LOCAL_TTL)
+ACCOUNT_SNAPSHOT_CACHE = 'default'
+ACCOUNT_SNAPSHOT_TTL = 300
+
+# Users revoked on deactivation; must be shared between workers in production.
+# With a process-local cache like the default, every authenticated request
+# checks is_active in the database instead (see api.authentication.is_revoked),
+# so claims-only authentication saves no query until DJANGO_REDIS_URL is set
+REVOKED_USERS_CACHE = 'default'
 
 # REST Framework Configuration
+# orjson renders the same bytes as DRF's JSONRenderer several times faster
+try:
+    import orjson  # noqa: F401
+    JSON_RENDERER = 'api.renderers.ORJSONRenderer'
+except ImportError:
+    JSON_RENDERER = 'rest_framework.renderers.JSONRenderer'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        JSON_RENDERER,
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonThrottle',
+        'api.throttling.UserThrottle',
+    ],
+}
+
+# Token-bucket rates per scope for api.throttling. Each worker keeps its own
+# buckets; use 'api.throttling.CacheBucketStore' with a cache shared by all
+# workers (e.g. Redis) to enforce them across processes
+THROTTLING = {
+    'BACKEND': 'api.throttling.LocMemBucketStore',
+    'OPTIONS': {'max_entries': 100000},
+    'RATES': {
+        'anon': '120/min',
+        'user': '600/min',
+        # Every login attempt costs a password hash
+        'login': '10/min',
+        'login_email': '5/min',
+        'register': '20/hour',
+        'money': '60/min',
+    },
+}
+
+# Idempotency-Key handling for money-movement endpoints. Swap BACKEND for
+# 'api.idempotency.CacheStore' to share stored responses between workers;
+# its cache must add() atomically (Redis, Memcached), which FileBasedCache
+# does not, or two workers can both claim a key
+IDEMPOTENCY = {
+    'BACKEND': 'api.idempotency.LocMemStore',
+    'OPTIONS': {'max_entries': 10000},
+    'TTL': 24 * 60 * 60,
+    'WAIT_TIMEOUT': 10,
+    'LOCK_TTL': 60,
 }
 
 # JWT Configuration
@@ -122,6 +337,48 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Group commit for deposits and withdrawals, see api.batching. Each worker
+# process batches its own postings, so it helps most with threaded servers
+LEDGER_BATCHING = {
+    'ENABLED': os.environ.get('DJANGO_LEDGER_BATCHING') == '1',
+    'WINDOW': float(os.environ.get('DJANGO_LEDGER_BATCH_WINDOW', '0.005')),
+    'MAX_BATCH': 100,
+    'TIMEOUT': 10,
+}
+
+# Bloom filter in front of the refresh token blacklist, see api.tokens.
+# CACHE must be shared by all workers
+TOKEN_BLACKLIST = {
+    'CAPACITY': 1_000_000,
+    'ERROR_RATE': 0.001,
+    'REBUILD_INTERVAL': 60,
+    'CACHE': 'default',
+}
+
+# Password hashing. Argon2 is preferred when argon2-cffi is installed and
+# scrypt otherwise; PBKDF2 stays listed so existing hashes still verify and
+# are upgraded to the preferred hasher on the next successful login
+try:
+    import argon2  # noqa: F401
+    PASSWORD_HASHERS = [
+        'api.hashers.TunedArgon2PasswordHasher',
+        'api.hashers.TunedScryptPasswordHasher',
+    ]
+except ImportError:
+    PASSWORD_HASHERS = [
+        'api.hashers.TunedScryptPasswordHasher',
+    ]
+PASSWORD_HASHERS += [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# Cost parameters and login hashing pool size, see api.hashers.DEFAULT_POLICY
+PASSWORD_HASH_POLICY = {
+    'WORKERS': 2,
+    'BACKLOG': 16,
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
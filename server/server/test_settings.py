@@ -0,0 +1,16 @@
+# server/server/test_settings.py
+"""
+Settings for the test suite: server.settings plus two account shards and
+one read replica, which the sharding and replica tests switch on
+themselves. `manage.py test` uses this module; otherwise pass
+--settings=server.test_settings (or --ds to pytest-django).
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, _replica_database, _shard_database
+
+DATABASES = {
+    'default': DATABASES['default'],
+    **{f'shard_{index}': _shard_database(index) for index in range(2)},
+    **{f'replica_{index}': _replica_database(index) for index in range(1)},
+    **DATABASES,
+}